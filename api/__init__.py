@@ -52,6 +52,20 @@ def create_app():
             os.environ["DRIVE_LIST_KEY"] = bar_app.config.get("DRIVE_LIST_KEY")
         if bar_app.config.get("DRIVE_LIST_FILE"):
             os.environ["DRIVE_LIST_FILE"] = bar_app.config.get("DRIVE_LIST_FILE")
+        if bar_app.config.get("EXPRESSION_STORE_PATH"):
+            os.environ["EXPRESSION_STORE_PATH"] = bar_app.config.get(
+                "EXPRESSION_STORE_PATH"
+            )
+        if bar_app.config.get("COMPRESSED_STORE_PATH"):
+            os.environ["COMPRESSED_STORE_PATH"] = bar_app.config.get(
+                "COMPRESSED_STORE_PATH"
+            )
+        if bar_app.config.get("CROMWELL_URL"):
+            os.environ["CROMWELL_URL"] = bar_app.config.get("CROMWELL_URL")
+        if bar_app.config.get("USER_FILES_ACCEL_PREFIX"):
+            os.environ["USER_FILES_ACCEL_PREFIX"] = bar_app.config.get(
+                "USER_FILES_ACCEL_PREFIX"
+            )
     else:
         # The localhost
         bar_app.config.from_pyfile(
@@ -75,6 +89,20 @@ def create_app():
             os.environ["DRIVE_LIST_KEY"] = bar_app.config.get("DRIVE_LIST_KEY")
         if bar_app.config.get("DRIVE_LIST_FILE"):
             os.environ["DRIVE_LIST_FILE"] = bar_app.config.get("DRIVE_LIST_FILE")
+        if bar_app.config.get("EXPRESSION_STORE_PATH"):
+            os.environ["EXPRESSION_STORE_PATH"] = bar_app.config.get(
+                "EXPRESSION_STORE_PATH"
+            )
+        if bar_app.config.get("COMPRESSED_STORE_PATH"):
+            os.environ["COMPRESSED_STORE_PATH"] = bar_app.config.get(
+                "COMPRESSED_STORE_PATH"
+            )
+        if bar_app.config.get("CROMWELL_URL"):
+            os.environ["CROMWELL_URL"] = bar_app.config.get("CROMWELL_URL")
+        if bar_app.config.get("USER_FILES_ACCEL_PREFIX"):
+            os.environ["USER_FILES_ACCEL_PREFIX"] = bar_app.config.get(
+                "USER_FILES_ACCEL_PREFIX"
+            )
         if bar_app.config.get("PHENIX"):
             os.environ["PHENIX"] = bar_app.config.get("PHENIX")
         if bar_app.config.get("PHENIX_VERSION"):
@@ -124,6 +152,7 @@ def create_app():
     from api.resources.interactions import itrns
     from api.resources.gene_localizations import loc
     from api.resources.efp_image import efp_image
+    from api.resources.gene_dossier import gene_dossier
 
     bar_api.add_namespace(gene_information)
     bar_api.add_namespace(rnaseq_gene_expression)
@@ -137,6 +166,7 @@ def create_app():
     bar_api.add_namespace(itrns)
     bar_api.add_namespace(loc)
     bar_api.add_namespace(efp_image)
+    bar_api.add_namespace(gene_dossier)
     bar_api.init_app(bar_app)
     return bar_app
 
@@ -6,6 +6,7 @@ class SingleCell(db.Model):
     __tablename__ = "sample_data"
     __table_args__ = (
         db.Index("data_probeset_id", "data_probeset_id", "data_bot_id", "data_signal"),
+        db.Index("data_bot_id", "data_bot_id", "data_signal"),
     )
 
     proj_id = db.Column(db.String(5), nullable=False)
@@ -15,3 +16,16 @@ class SingleCell(db.Model):
         db.Float, server_default=db.FetchedValue(), primary_key=True
     )
     data_bot_id = db.Column(db.String(32), nullable=False, primary_key=True)
+
+
+class SingleCellClusterAggregate(db.Model):
+    __bind_key__ = "single_cell"
+    __tablename__ = "cluster_aggregate"
+
+    data_probeset_id = db.Column(db.String(24), nullable=False, primary_key=True)
+    cluster = db.Column(db.String(32), nullable=False, primary_key=True)
+    mean = db.Column(db.Float, nullable=False)
+    sd = db.Column(db.Float, nullable=True)
+    n = db.Column(db.Integer, nullable=False)
+    min = db.Column(db.Float, nullable=False)
+    max = db.Column(db.Float, nullable=False)
@@ -28,3 +28,27 @@ class Users(db.Model):
     status = db.Column(db.String(32), index=True)
     date_added = db.Column(db.Date, nullable=False)
     uses_left = db.Column(db.Integer, index=True, default=25)
+
+
+class TableCatalog(db.Model):
+    __bind_key__ = "summarization"
+    __tablename__ = "table_catalog"
+    table_id = db.Column(db.String(64), primary_key=True)
+    row_count = db.Column(db.BigInteger, nullable=False, default=0)
+    last_modified = db.Column(db.DateTime, nullable=False)
+
+
+class TableCatalogGene(db.Model):
+    __bind_key__ = "summarization"
+    __tablename__ = "table_catalog_gene"
+    table_id = db.Column(db.String(64), primary_key=True)
+    gene = db.Column(db.String(32), primary_key=True)
+    position = db.Column(db.Integer, nullable=False)
+
+
+class TableCatalogSample(db.Model):
+    __bind_key__ = "summarization"
+    __tablename__ = "table_catalog_sample"
+    table_id = db.Column(db.String(64), primary_key=True)
+    sample = db.Column(db.String(64), primary_key=True)
+    position = db.Column(db.Integer, nullable=False)
@@ -1,20 +1,21 @@
 from api import summarization_db as db
 from api.models.summarization import Users, Requests
+from api.utils.api_key_cache import ApiKeyCache, REVOKED_STATUS
 from api.utils.bar_utils import BARUtils
+from api.utils.summarization_loader import SummarizationLoader
+from api.utils.usage_meter import UsageMeter
+from api.resources.summarization_gene_expression import (
+    SummarizationGeneExpressionUtils,
+)
 from flask import request
 from flask_restx import Namespace, Resource
 from datetime import datetime
 from sqlalchemy.exc import SQLAlchemyError
-from sqlalchemy.types import String, Float
 import os
 import uuid
 import requests
 import pandas
 from cryptography.fernet import Fernet
-from smtplib import SMTP_SSL
-from ssl import create_default_context
-from email.mime.multipart import MIMEMultipart
-from email.mime.text import MIMEText
 
 CAPTCHA_KEY_FILE = "/home/bpereira/data/bar.summarization/key"
 
@@ -61,31 +62,12 @@ class ApiManagerUtils:
             with open(os.environ.get("ADMIN_EMAIL"), "r") as f:
                 for line in f:
                     recipient = line
-            port = 465
-            key = os.environ.get("EMAIL_PASS_KEY")
-            cipher_suite = Fernet(key)
-            with open(os.environ.get("EMAIL_PASS_FILE"), "rb") as f:
-                for line in f:
-                    encrypted_key = line
-            uncipher_text = cipher_suite.decrypt(encrypted_key)
-            password = bytes(uncipher_text).decode("utf-8")
-            context = create_default_context()
-            smtp_server = "smtp.gmail.com"
-            sender_email = "bar.summarization@gmail.com"
             subject = "[Bio-Analytic Resource] New API key request"
             text = """\
                 There is a new API key request.
                 You can approve or reject it at http://bar.utoronto.ca/~bpereira/webservices/bar-request-manager/build/index.html
             """
-            m_text = MIMEText(text, _subtype="plain", _charset="UTF-8")
-            msg = MIMEMultipart()
-            msg["From"] = sender_email
-            msg["To"] = recipient
-            msg["Subject"] = subject
-            msg.attach(m_text)
-            with SMTP_SSL(smtp_server, port, context=context) as server:
-                server.login("bar.summarization@gmail.com", password)
-                server.sendmail(sender_email, recipient, msg.as_string())
+            BARUtils.send_email(recipient, subject, text)
 
 
 @api_manager.route("/validate_admin_password", methods=["POST"], doc=False)
@@ -106,18 +88,20 @@ class ApiManagerValidateKey(Resource):
     def post(self):
         """Verify if an API key provided by the user exists in the database"""
         if request.method == "POST":
-            tbl = Users()
             json = request.get_json()
             key = json["key"]
             try:
-                row = tbl.query.filter_by(api_key=key).first()
+                user = ApiKeyCache.get(key)
             except SQLAlchemyError:
                 return BARUtils.error_exit("Internal server error"), 500
 
-            if row is None:
+            if user is None:
                 return BARUtils.error_exit("API key not found"), 404
+            elif user["status"] == REVOKED_STATUS:
+                return BARUtils.error_exit("API key revoked"), 401
             else:
-                if row.uses_left > 0:
+                # Keys without a quota have NULL uses left
+                if user["uses_left"] is not None and user["uses_left"] > 0:
                     return BARUtils.success_exit(True)
                 else:
                     return BARUtils.error_exit("API key expired"), 401
@@ -233,28 +217,46 @@ class ApiManagerApproveRequest(Resource):
                     for row in rows
                 ]
                 df = pandas.DataFrame.from_records([values[0]])
-                values_df = pandas.DataFrame(columns=["Gene", "Sample", "Value"])
                 con = db.get_engine(bind="summarization")
                 try:
                     df.to_sql("users", con, if_exists="append", index=False)
-                    values_df.to_sql(
-                        key,
-                        con,
-                        index_label="index",
-                        dtype={
-                            values_df.index.name: String(42),
-                            "Gene": String(32),
-                            "Sample": String(32),
-                            "Value": Float,
-                        },
-                        if_exists="append",
-                        index=True,
-                    )
+                    with con.begin() as transaction:
+                        SummarizationLoader.create_user_table(transaction, key)
                     el = table.query.filter_by(email=email).one()
                     db.session.delete(el)
                     db.session.commit()
                 except SQLAlchemyError:
                     return BARUtils.error_exit("Internal server error"), 500
+                SummarizationGeneExpressionUtils.invalidate_table(key)
+                ApiKeyCache.publish_invalidation(key)
                 return BARUtils.success_exit(key)
             else:
                 return BARUtils.error_exit("Forbidden"), 403
+
+
+@api_manager.route("/revoke_api_key", methods=["POST"], doc=False)
+class ApiManagerRevokeKey(Resource):
+    def post(self):
+        """Revoke an API key. It is rejected by all workers right away."""
+        if request.method == "POST":
+            response_json = request.get_json()
+            password = response_json["password"]
+            if ApiManagerUtils.check_admin_pass(password):
+                key = response_json["key"]
+                try:
+                    user = Users.query.filter_by(api_key=key).first()
+                    if user is None:
+                        return BARUtils.error_exit("API key not found"), 404
+
+                    # Uses not written yet would be subtracted from the revoked quota later
+                    UsageMeter.discard(key)
+                    user.status = REVOKED_STATUS
+                    user.uses_left = 0
+                    db.session.commit()
+                except SQLAlchemyError:
+                    return BARUtils.error_exit("Internal server error"), 500
+                UsageMeter.reset(key)
+                ApiKeyCache.publish_invalidation(key)
+                return BARUtils.success_exit(True)
+            else:
+                return BARUtils.error_exit("Forbidden"), 403
@@ -1,5 +1,6 @@
 from flask_restx import Namespace, Resource
 from markupsafe import escape
+from sqlalchemy import or_
 from sqlalchemy.exc import OperationalError
 from api.models.eplant_poplar import GeneAnnotation as eplant_poplar_annotation
 from api.models.eplant_tomato import GeneAnnotation as eplant_tomato_annotation
@@ -94,3 +95,47 @@ class GeneAnnotation(Resource):
         else:
             # return first 10 matches
             return {"status": "success", "query": query, "result": res[:10]}
+
+
+@gene_annotation.route("/<string:species>/<string:gene_id>")
+class GeneAnnotationLookup(Resource):
+    @gene_annotation.param("species", _in="path", default="arabidopsis")
+    @gene_annotation.param("gene_id", _in="path", default="At1g01020")
+    def get(self, species="", gene_id=""):
+        """
+        Endpoint returns the annotation of a given gene. For poplar and tomato, the annotations of its isoforms are returned.
+        """
+        species = escape(species)
+        gene_id = escape(gene_id)
+
+        try:
+            if species == "arabidopsis":
+                if not BARUtils.is_arabidopsis_gene_valid(gene_id):
+                    return BARUtils.error_exit("Invalid gene id"), 400
+                rows = AgiAnnotation.query.filter_by(agi=gene_id).all()
+                res = [{"gene": i.agi, "annotation": i.annotation} for i in rows]
+            elif species in ["poplar", "tomato"]:
+                if species == "poplar":
+                    if not BARUtils.is_poplar_gene_valid(gene_id):
+                        return BARUtils.error_exit("Invalid gene id"), 400
+                    gene_id = BARUtils.format_poplar(gene_id)
+                    db = eplant_poplar_annotation
+                else:
+                    if not BARUtils.is_tomato_gene_valid(gene_id, False):
+                        return BARUtils.error_exit("Invalid gene id"), 400
+                    db = eplant_tomato_annotation
+
+                # Annotations are stored by isoform, for example Potri.001G000500.1
+                rows = db.query.filter(
+                    or_(db.gene == gene_id, db.gene.like(gene_id + ".%"))
+                ).all()
+                res = [{"gene": i.gene, "annotation": i.annotation} for i in rows]
+            else:
+                return BARUtils.error_exit("No data for the given species")
+        except OperationalError:
+            return BARUtils.error_exit("An internal error has occurred"), 500
+
+        if len(res) > 0:
+            return BARUtils.success_exit(res)
+        else:
+            return BARUtils.error_exit("There are no data found for the given gene")
@@ -0,0 +1,163 @@
+import threading
+from concurrent.futures import ThreadPoolExecutor, wait
+from flask import current_app, request
+from flask_restx import Namespace, Resource
+from markupsafe import escape
+from api.resources.gene_information import GeneAlias, GeneIsoforms
+from api.resources.gene_annotation import GeneAnnotationLookup
+from api.resources.gene_localizations import Localizations
+from api.resources.interactions import Interactions
+from api.resources.snps import GeneNameAlias
+from api.resources.thalemine import ThaleMineGeneRIFs
+from api.utils.bar_utils import BARUtils
+
+gene_dossier = Namespace(
+    "Gene Dossier",
+    description="All information about a gene in a single request",
+    path="/gene_dossier",
+)
+
+# Maximum number of section lookups running at the same time across all requests
+DOSSIER_MAX_WORKERS = 16
+
+# Default and maximum time (in seconds) a section is given before it is reported as timed out
+DOSSIER_SECTION_TIMEOUT = 5
+DOSSIER_MAX_SECTION_TIMEOUT = 30
+
+# Section name: (resource, path of the original end point, keyword arguments, species)
+DOSSIER_SECTIONS = {
+    "gene_alias": (
+        GeneAlias,
+        "/gene_information/gene_alias/{species}/{gene_id}",
+        lambda species, gene_id: {"species": species, "gene_id": gene_id},
+        ["arabidopsis"],
+    ),
+    "gene_isoforms": (
+        GeneIsoforms,
+        "/gene_information/gene_isoforms/{species}/{gene_id}",
+        lambda species, gene_id: {"species": species, "gene_id": gene_id},
+        ["arabidopsis", "poplar", "tomato"],
+    ),
+    "gene_annotation": (
+        GeneAnnotationLookup,
+        "/gene_annotation/{species}/{gene_id}",
+        lambda species, gene_id: {"species": species, "gene_id": gene_id},
+        ["arabidopsis", "poplar", "tomato"],
+    ),
+    "loc": (
+        Localizations,
+        "/loc/{species}/{gene_id}",
+        lambda species, gene_id: {"species": species, "query_gene": gene_id},
+        ["rice"],
+    ),
+    "interactions": (
+        Interactions,
+        "/interactions/{species}/{gene_id}",
+        lambda species, gene_id: {"species": species, "query_gene": gene_id},
+        ["rice"],
+    ),
+    "snps": (
+        GeneNameAlias,
+        "/snps/{species}/{gene_id}",
+        lambda species, gene_id: {"species": species, "gene_id": gene_id},
+        ["poplar", "tomato"],
+    ),
+    "gene_rifs": (
+        ThaleMineGeneRIFs,
+        "/thalemine/gene_rifs/{gene_id}",
+        lambda species, gene_id: {"gene_id": gene_id},
+        ["arabidopsis"],
+    ),
+}
+
+executor = ThreadPoolExecutor(max_workers=DOSSIER_MAX_WORKERS)
+
+# Sections that are running or waiting for a worker. Sections that time out keep their
+# worker until they finish, so new sections are refused instead of queued behind them.
+section_slots = threading.BoundedSemaphore(DOSSIER_MAX_WORKERS)
+
+
+class GeneDossierUtils:
+    @staticmethod
+    def run_section(app, section, species, gene_id):
+        """Run the end point of one section in its own request context
+        :param app: Flask app object
+        :param section: name of the section in DOSSIER_SECTIONS
+        :param species: name of species
+        :param gene_id: gene id
+        :return: JSON output of the end point
+        """
+        resource, path, get_kwargs, _ = DOSSIER_SECTIONS[section]
+
+        # The request context is needed by the cache and by the database sessions
+        with app.test_request_context(path.format(species=species, gene_id=gene_id)):
+            try:
+                result = resource().get(**get_kwargs(species, gene_id))
+            except Exception:
+                return BARUtils.error_exit("An internal error has occurred")
+
+        # End points return either the output or a tuple of output and status code
+        if isinstance(result, tuple):
+            result = result[0]
+
+        return result
+
+    @staticmethod
+    def get_dossier(species, gene_id, timeout=DOSSIER_SECTION_TIMEOUT):
+        """Run all the sections available for a species concurrently
+        :param species: name of species
+        :param gene_id: gene id
+        :param timeout: time budget of each section in seconds
+        :return: dict of section name and section output
+        """
+        app = current_app._get_current_object()
+        futures = {}
+
+        busy = []
+        for section, (_, _, _, section_species) in DOSSIER_SECTIONS.items():
+            if species not in section_species:
+                continue
+            if not section_slots.acquire(blocking=False):
+                busy.append(section)
+                continue
+            futures[section] = executor.submit(
+                GeneDossierUtils.run_section, app, section, species, gene_id
+            )
+            futures[section].add_done_callback(lambda _: section_slots.release())
+
+        # All sections run at the same time, so they all share the same budget
+        wait(futures.values(), timeout=timeout)
+
+        dossier = {section: BARUtils.error_exit("Server busy") for section in busy}
+        for section, future in futures.items():
+            if future.done():
+                dossier[section] = future.result()
+            else:
+                # The lookup keeps running in the background, but we do not wait for it
+                future.cancel()
+                dossier[section] = BARUtils.error_exit("Section timed out")
+
+        return dossier
+
+
+@gene_dossier.route("/<string:species>/<string:gene_id>")
+class GeneDossier(Resource):
+    @gene_dossier.param("species", _in="path", default="arabidopsis")
+    @gene_dossier.param("gene_id", _in="path", default="At1g01020")
+    @gene_dossier.param("timeout", _in="query", default=DOSSIER_SECTION_TIMEOUT)
+    def get(self, species="", gene_id=""):
+        """This end point returns all the available gene information in a single request.
+        Sections that do not finish within the timeout are returned as errors."""
+        species = escape(species.lower())
+        gene_id = escape(gene_id)
+        timeout = request.args.get("timeout", str(DOSSIER_SECTION_TIMEOUT))
+
+        if not any(species in section[3] for section in DOSSIER_SECTIONS.values()):
+            return BARUtils.error_exit("Invalid species"), 400
+
+        if not BARUtils.is_integer(timeout) or int(timeout) < 1:
+            return BARUtils.error_exit("Invalid timeout"), 400
+        timeout = min(int(timeout), DOSSIER_MAX_SECTION_TIMEOUT)
+
+        dossier = GeneDossierUtils.get_dossier(species, gene_id, timeout)
+        return BARUtils.success_exit(dossier)
@@ -1,10 +1,21 @@
-import re
+import math
+import pandas
 from flask_restx import Namespace, Resource, fields
 from flask import request
-from sqlalchemy.exc import OperationalError
-from api.models.single_cell import SingleCell
+from sqlalchemy.exc import OperationalError, SQLAlchemyError
+from api import single_cell_db as db
 from api.utils.bar_utils import BARUtils
-from marshmallow import Schema, ValidationError, fields as marshmallow_fields
+from api.utils.expression_matrix import ExpressionMatrix, CORRELATION_METHODS
+from api.utils.expression_store import ExpressionStore
+from api.utils.payload_utils import PayloadUtils
+from api.utils.rnaseq_databases import RNASEQ_DATABASES
+from api.utils.single_cell_utils import SingleCellUtils
+from marshmallow import (
+    Schema,
+    ValidationError,
+    fields as marshmallow_fields,
+    validate,
+)
 from markupsafe import escape
 
 rnaseq_gene_expression = Namespace(
@@ -31,6 +42,41 @@ gene_expression_request_fields = rnaseq_gene_expression.model(
     },
 )
 
+gene_expression_matrix_request_fields = rnaseq_gene_expression.model(
+    "GeneExpressionMatrix",
+    {
+        "species": fields.String(required=True, example="arabidopsis"),
+        "database": fields.String(required=True, example="single_cell"),
+        "genes": fields.List(
+            required=True,
+            example=["At1g01010", "At1g01020"],
+            cls_or_instance=fields.String,
+        ),
+        "sample_ids": fields.List(
+            example=[
+                "cluster0_WT1.ExprMean",
+                "cluster0_WT2.ExprMean",
+                "cluster0_WT3.ExprMean",
+            ],
+            cls_or_instance=fields.String,
+        ),
+    },
+)
+
+# Maximum number of genes in one matrix request
+MAX_MATRIX_GENES = 1000
+
+# Default and maximum number of co-expressed genes returned
+COEXPRESSION_DEFAULT_TOP_N = 25
+COEXPRESSION_MAX_TOP_N = 1000
+
+# Default and maximum number of genes in one page of ranked genes
+TOP_GENES_DEFAULT_LIMIT = 50
+TOP_GENES_MAX_LIMIT = 1000
+
+# Maximum number of ranked genes skipped, so deep pages do not scan the whole sample
+TOP_GENES_MAX_OFFSET = 100000
+
 
 # Validation is done in a different way to keep things simple
 class RNASeqSchema(Schema):
@@ -40,7 +86,34 @@ class RNASeqSchema(Schema):
     sample_ids = marshmallow_fields.List(cls_or_instance=marshmallow_fields.String)
 
 
+class RNASeqMatrixSchema(Schema):
+    species = marshmallow_fields.String(required=True)
+    database = marshmallow_fields.String(required=True)
+    genes = marshmallow_fields.List(
+        marshmallow_fields.String, required=True, validate=validate.Length(min=1)
+    )
+    sample_ids = marshmallow_fields.List(cls_or_instance=marshmallow_fields.String)
+
+
+class ClusterAggregateRebuildSchema(Schema):
+    proj_ids = marshmallow_fields.List(cls_or_instance=marshmallow_fields.String)
+
+
 class RNASeqUtils:
+    @staticmethod
+    def get_known_samples(database, sample_ids):
+        """Validate sample ids and check them against the sample catalog of the database
+        :param database: RNASeqDatabase
+        :param sample_ids: sample ids in the data_bot_id column
+        :return: sample ids that are in the database, or None if a sample id is invalid
+        """
+        for sample_id in sample_ids:
+            if not database.is_valid_sample(sample_id):
+                return None
+
+        samples = database.get_samples()
+        return [sample_id for sample_id in sample_ids if sample_id in samples]
+
     @staticmethod
     def get_data(species, database, gene_id, sample_ids=None):
         """This function is used to query the database for gene expression
@@ -61,18 +134,47 @@ class RNASeqUtils:
         else:
             return {"success": False, "error": "Invalid species", "error_code": 400}
 
-        # Set model
-        if database == "single_cell":
-            database = SingleCell()
-            # Example: cluster0_WT1.ExprMean
-            sample_regex = re.compile(r"^\D+\d+_WT\d+.ExprMean$", re.I)
-        else:
+        # Set database
+        database = RNASEQ_DATABASES.get(database)
+        if database is None:
             return {"success": False, "error": "Invalid database", "error_code": 400}
+        model = database.model
+
+        # Validate all samples
+        requested = len(sample_ids) > 0
+        try:
+            sample_ids = RNASeqUtils.get_known_samples(database, sample_ids)
+        except OperationalError:
+            return {
+                "success": False,
+                "error": "An internal error has occurred",
+                "error_code": 500,
+            }
+        if sample_ids is None:
+            return {"success": False, "error": "Invalid sample id", "error_code": 400}
+
+        # None of the requested samples are in the database
+        if requested and len(sample_ids) == 0:
+            return {"success": True, "data": data}
+
+        # Read the gene row from the memory-mapped store if the database is exported
+        matrix = ExpressionStore.load(
+            ExpressionStore.get_root(), database.get_store_name()
+        )
+        if matrix is not None:
+            row = matrix.get_row(gene_id)
+            if row is not None:
+                wanted = set(sample_ids)
+                for sample_id, value in zip(matrix.samples, row):
+                    if (len(wanted) == 0 or sample_id in wanted) and value == value:
+                        # Shortest float32 repr, so values match the database
+                        data[sample_id] = float(str(value))
+            return {"success": True, "data": data}
 
         # Now query the database
-        if len(sample_ids) == 0 or sample_ids is None:
+        if len(sample_ids) == 0:
             try:
-                rows = database.query.filter_by(data_probeset_id=gene_id).all()
+                rows = model.query.filter_by(data_probeset_id=gene_id).all()
             except OperationalError:
                 return {
                     "success": False,
@@ -84,20 +186,11 @@ class RNASeqUtils:
                 for row in rows:
                     data[row.data_bot_id] = row.data_signal
         else:
-            # Validate all samples
-            for sample_id in sample_ids:
-                if not sample_regex.search(sample_id):
-                    return {
-                        "success": False,
-                        "error": "Invalid sample id",
-                        "error_code": 400,
-                    }
-
             try:
                 # This optimizes query of MySQL in operator.
-                rows = database.query.filter(
-                    SingleCell.data_probeset_id == gene_id,
-                    SingleCell.data_bot_id.in_(sample_ids),
+                rows = model.query.filter(
+                    model.data_probeset_id == gene_id,
+                    model.data_bot_id.in_(sample_ids),
                 ).all()
             except OperationalError:
                 return {
@@ -112,6 +205,279 @@ class RNASeqUtils:
 
         return {"success": True, "data": data}
 
+    @staticmethod
+    def get_matrix(species, database, genes, sample_ids=None):
+        """This function is used to query the database for a gene x sample expression matrix
+        :param species: name of species
+        :param database: name of BAR database
+        :param genes: gene ids in the data_probeset column
+        :param sample_ids: sample ids in the data_bot_id column. All samples if empty.
+        :return: dict with gene and sample axes and a list of rows of values
+        """
+        if sample_ids is None:
+            sample_ids = []
+
+        # Set species and check gene ID format
+        if species == "arabidopsis":
+            for gene_id in genes:
+                if not BARUtils.is_arabidopsis_gene_valid(gene_id):
+                    return {
+                        "success": False,
+                        "error": "Invalid gene id",
+                        "error_code": 400,
+                    }
+        else:
+            return {"success": False, "error": "Invalid species", "error_code": 400}
+
+        if len(genes) > MAX_MATRIX_GENES:
+            return {"success": False, "error": "Too many genes", "error_code": 400}
+
+        # Set database
+        database = RNASEQ_DATABASES.get(database)
+        if database is None:
+            return {"success": False, "error": "Invalid database", "error_code": 400}
+        model = database.model
+
+        # Validate all samples
+        try:
+            known_samples = RNASeqUtils.get_known_samples(database, sample_ids)
+        except OperationalError:
+            return {
+                "success": False,
+                "error": "An internal error has occurred",
+                "error_code": 500,
+            }
+        if known_samples is None:
+            return {"success": False, "error": "Invalid sample id", "error_code": 400}
+
+        # None of the requested samples are in the database
+        if len(sample_ids) > 0 and len(known_samples) == 0:
+            return {"success": True, "data": {}}
+
+        # Gene IDs are stored in upper case. Remove duplicates but keep the order.
+        genes = list(dict.fromkeys(gene_id.upper() for gene_id in genes))
+
+        # A single query for all genes. Only the indexed columns are selected.
+        query = model.query.with_entities(
+            model.data_probeset_id, model.data_bot_id, model.data_signal
+        ).filter(model.data_probeset_id.in_(genes))
+        if len(known_samples) > 0:
+            query = query.filter(model.data_bot_id.in_(known_samples))
+
+        try:
+            rows = query.all()
+        except OperationalError:
+            return {
+                "success": False,
+                "error": "An internal error has occurred",
+                "error_code": 500,
+            }
+
+        # Requested samples keep their order, otherwise samples are listed as found
+        if len(sample_ids) > 0:
+            samples = list(dict.fromkeys(sample_ids))
+        else:
+            samples = list(dict.fromkeys(row.data_bot_id for row in rows))
+
+        gene_index = {gene_id: i for i, gene_id in enumerate(genes)}
+        sample_index = {sample_id: i for i, sample_id in enumerate(samples)}
+        values = [[None] * len(samples) for _ in genes]
+        found = False
+        for row in rows:
+            i = gene_index.get(row.data_probeset_id.upper())
+            j = sample_index.get(row.data_bot_id)
+            if i is not None and j is not None:
+                values[i][j] = row.data_signal
+                found = True
+
+        if not found:
+            return {"success": True, "data": {}}
+
+        return {
+            "success": True,
+            "data": {"genes": genes, "samples": samples, "values": values},
+        }
+
+    @staticmethod
+    def get_top_genes(species, database, sample_id, limit, offset=0, min_signal=None):
+        """This function is used to query the genes with the highest expression in a sample
+        :param species: name of species
+        :param database: name of BAR database
+        :param sample_id: sample id in the data_bot_id column
+        :param limit: number of genes to return
+        :param offset: number of genes to skip
+        :param min_signal: only return genes with at least this expression
+        :return: dict with ranked genes and their values
+        """
+        if species != "arabidopsis":
+            return {"success": False, "error": "Invalid species", "error_code": 400}
+
+        # Set database
+        database = RNASEQ_DATABASES.get(database)
+        if database is None:
+            return {"success": False, "error": "Invalid database", "error_code": 400}
+        model = database.model
+
+        try:
+            known_samples = RNASeqUtils.get_known_samples(database, [sample_id])
+        except OperationalError:
+            return {
+                "success": False,
+                "error": "An internal error has occurred",
+                "error_code": 500,
+            }
+        if known_samples is None:
+            return {"success": False, "error": "Invalid sample id", "error_code": 400}
+        if len(known_samples) == 0:
+            return {"success": True, "data": {}}
+
+        # This is served by the (data_bot_id, data_signal) index without a sort
+        query = model.query.with_entities(
+            model.data_probeset_id, model.data_signal
+        ).filter(model.data_bot_id == sample_id)
+        if min_signal is not None:
+            query = query.filter(model.data_signal >= min_signal)
+
+        try:
+            rows = (
+                query.order_by(model.data_signal.desc())
+                .limit(limit)
+                .offset(offset)
+                .all()
+            )
+        except OperationalError:
+            return {
+                "success": False,
+                "error": "An internal error has occurred",
+                "error_code": 500,
+            }
+
+        if len(rows) == 0:
+            return {"success": True, "data": {}}
+
+        return {
+            "success": True,
+            "data": {
+                "sample_id": sample_id,
+                "offset": offset,
+                "genes": [row.data_probeset_id for row in rows],
+                "values": [row.data_signal for row in rows],
+            },
+        }
+
+    @staticmethod
+    def load_matrix(database):
+        """This function loads a whole database as a gene x sample matrix
+        :param database: SQLAlchemy model of the database
+        :return: ExpressionMatrix
+        """
+        df = pandas.read_sql(
+            database.query.with_entities(
+                database.data_probeset_id, database.data_bot_id, database.data_signal
+            ).statement,
+            db.get_engine(bind=database.__bind_key__),
+        )
+        return ExpressionMatrix.from_long_dataframe(
+            df, "data_probeset_id", "data_bot_id", "data_signal"
+        )
+
+    @staticmethod
+    def get_coexpression(species, database, gene_id, method, top_n):
+        """This function is used to find the genes most correlated with a gene across all samples
+        :param species: name of species
+        :param database: name of BAR database
+        :param gene_id: gene id in the data_probeset column
+        :param method: pearson or spearman
+        :param top_n: number of genes to return
+        :return: dict with correlated genes and their correlations
+        """
+        # Set species and check gene ID format
+        if species == "arabidopsis":
+            if not BARUtils.is_arabidopsis_gene_valid(gene_id):
+                return {"success": False, "error": "Invalid gene id", "error_code": 400}
+        else:
+            return {"success": False, "error": "Invalid species", "error_code": 400}
+
+        # Set database
+        database = RNASEQ_DATABASES.get(database)
+        if database is None:
+            return {"success": False, "error": "Invalid database", "error_code": 400}
+
+        if method not in CORRELATION_METHODS:
+            return {"success": False, "error": "Invalid method", "error_code": 400}
+
+        try:
+            matrix = ExpressionStore.load(
+                ExpressionStore.get_root(), database.get_store_name()
+            ) or ExpressionMatrix.get_cached(
+                database.get_store_name(),
+                lambda: RNASeqUtils.load_matrix(database.model),
+            )
+        except OperationalError:
+            return {
+                "success": False,
+                "error": "An internal error has occurred",
+                "error_code": 500,
+            }
+
+        correlated = matrix.correlate(gene_id, method, top_n)
+        if correlated is None:
+            return {"success": True, "data": {}}
+
+        return {
+            "success": True,
+            "data": {
+                "gene": gene_id.upper(),
+                "method": method,
+                "genes": [gene for gene, _ in correlated],
+                "values": [value for _, value in correlated],
+            },
+        }
+
+    @staticmethod
+    def get_cluster_aggregates(species, database, gene_id):
+        """This function is used to query the precomputed per cluster statistics of a gene
+        :param species: name of species
+        :param database: name of BAR database
+        :param gene_id: gene id in the data_probeset column
+        :return: dict of cluster and its mean, sd, n, min and max
+        """
+        data = {}
+
+        # Set species and check gene ID format
+        if species == "arabidopsis":
+            if not BARUtils.is_arabidopsis_gene_valid(gene_id):
+                return {"success": False, "error": "Invalid gene id", "error_code": 400}
+        else:
+            return {"success": False, "error": "Invalid species", "error_code": 400}
+
+        # Only databases with samples grouped by clusters have aggregates
+        database = RNASEQ_DATABASES.get(database)
+        if database is None or database.aggregate_model is None:
+            return {"success": False, "error": "Invalid database", "error_code": 400}
+
+        try:
+            rows = database.aggregate_model.query.filter_by(
+                data_probeset_id=gene_id
+            ).all()
+        except OperationalError:
+            return {
+                "success": False,
+                "error": "An internal error has occurred",
+                "error_code": 500,
+            }
+
+        for row in rows:
+            data[row.cluster] = {
+                "mean": row.mean,
+                "sd": row.sd,
+                "n": row.n,
+                "min": row.min,
+                "max": row.max,
+            }
+
+        return {"success": True, "data": data}
+
 
 @rnaseq_gene_expression.route("/")
 class PostRNASeqExpression(Resource):
@@ -133,6 +499,102 @@ class PostRNASeqExpression(Resource):
 
         results = RNASeqUtils.get_data(species, database, gene_id, sample_ids)
 
+        if results["success"]:
+            # Return results if there are data
+            if len(results["data"]) > 0:
+                mimetype = PayloadUtils.get_binary_mimetype()
+                if mimetype:
+                    return PayloadUtils.gene_response(
+                        gene_id, results["data"], mimetype
+                    )
+                return BARUtils.success_exit(results["data"])
+            else:
+                return BARUtils.error_exit("There are no data found for the given gene")
+        else:
+            return BARUtils.error_exit(results["error"]), results["error_code"]
+
+
+@rnaseq_gene_expression.route(
+    "/top_genes/<string:species>/<string:database>/<string:sample_id>"
+)
+class GetRNASeqTopGenes(Resource):
+    @rnaseq_gene_expression.param("species", _in="path", default="arabidopsis")
+    @rnaseq_gene_expression.param("database", _in="path", default="single_cell")
+    @rnaseq_gene_expression.param(
+        "sample_id", _in="path", default="cluster3_WT2.ExprMean"
+    )
+    @rnaseq_gene_expression.param("limit", _in="query", default=TOP_GENES_DEFAULT_LIMIT)
+    @rnaseq_gene_expression.param("offset", _in="query", default=0)
+    @rnaseq_gene_expression.param("min_signal", _in="query", default="")
+    def get(self, species="", database="", sample_id=""):
+        """This end point returns the genes with the highest expression in a sample, ranked by expression"""
+        # Variables
+        species = escape(species)
+        database = escape(database)
+        sample_id = escape(sample_id)
+        limit = request.args.get("limit", str(TOP_GENES_DEFAULT_LIMIT))
+        offset = request.args.get("offset", "0")
+        min_signal = request.args.get("min_signal")
+
+        if not BARUtils.is_integer(limit) or not BARUtils.is_integer(offset):
+            return BARUtils.error_exit("Invalid limit or offset"), 400
+        limit = min(int(limit), TOP_GENES_MAX_LIMIT)
+        offset = int(offset)
+        if offset > TOP_GENES_MAX_OFFSET:
+            return BARUtils.error_exit("Invalid limit or offset"), 400
+
+        if min_signal is not None:
+            try:
+                min_signal = float(min_signal)
+            except ValueError:
+                return BARUtils.error_exit("Invalid minimum signal"), 400
+            if not math.isfinite(min_signal):
+                return BARUtils.error_exit("Invalid minimum signal"), 400
+
+        results = RNASeqUtils.get_top_genes(
+            species, database, sample_id, limit, offset, min_signal
+        )
+
+        if results["success"]:
+            # Return results if there are data
+            if len(results["data"]) > 0:
+                return BARUtils.success_exit(results["data"])
+            else:
+                return BARUtils.error_exit(
+                    "There are no data found for the given sample"
+                )
+        else:
+            return BARUtils.error_exit(results["error"]), results["error_code"]
+
+
+@rnaseq_gene_expression.route(
+    "/coexpression/<string:species>/<string:database>/<string:gene_id>"
+)
+class GetRNASeqCoexpression(Resource):
+    @rnaseq_gene_expression.param("species", _in="path", default="arabidopsis")
+    @rnaseq_gene_expression.param("database", _in="path", default="single_cell")
+    @rnaseq_gene_expression.param("gene_id", _in="path", default="At1g01010")
+    @rnaseq_gene_expression.param("method", _in="query", default="pearson")
+    @rnaseq_gene_expression.param(
+        "top_n", _in="query", default=COEXPRESSION_DEFAULT_TOP_N
+    )
+    def get(self, species="", database="", gene_id=""):
+        """This end point returns the genes most correlated with a gene across all samples"""
+        # Variables
+        species = escape(species)
+        database = escape(database)
+        gene_id = escape(gene_id)
+        method = request.args.get("method", "pearson")
+        top_n = request.args.get("top_n", str(COEXPRESSION_DEFAULT_TOP_N))
+
+        if not BARUtils.is_integer(top_n):
+            return BARUtils.error_exit("Invalid number of genes"), 400
+        top_n = min(int(top_n), COEXPRESSION_MAX_TOP_N)
+
+        results = RNASeqUtils.get_coexpression(
+            species, database, gene_id, method, top_n
+        )
+
         if results["success"]:
             # Return results if there are data
             if len(results["data"]) > 0:
@@ -143,6 +605,126 @@ class PostRNASeqExpression(Resource):
             return BARUtils.error_exit(results["error"]), results["error_code"]
 
 
+@rnaseq_gene_expression.route("/cluster_aggregates/rebuild", doc=False)
+class RebuildRNASeqClusterAggregates(Resource):
+    def post(self):
+        """This end point rebuilds the single cell cluster aggregates.
+        Pass the ids of newly loaded projects to only rebuild their genes."""
+        if request.remote_addr != "127.0.0.1":
+            return BARUtils.error_exit("Forbidden"), 403
+
+        json_data = request.get_json(silent=True) or {}
+
+        # Validate json
+        try:
+            json_data = ClusterAggregateRebuildSchema().load(json_data)
+        except ValidationError as err:
+            return BARUtils.error_exit(err.messages), 400
+
+        try:
+            genes = SingleCellUtils.rebuild_cluster_aggregates(
+                json_data.get("proj_ids")
+            )
+        except SQLAlchemyError:
+            return BARUtils.error_exit("An internal error has occurred"), 500
+
+        # New projects can add samples
+        RNASEQ_DATABASES["single_cell"].invalidate_samples()
+
+        return BARUtils.success_exit(genes)
+
+
+@rnaseq_gene_expression.route("/store/export/<string:database>", doc=False)
+class ExportRNASeqStore(Resource):
+    @rnaseq_gene_expression.param("database", _in="path", default="single_cell")
+    def post(self, database=""):
+        """This end point exports a database to the shared memory-mapped expression store"""
+        if request.remote_addr != "127.0.0.1":
+            return BARUtils.error_exit("Forbidden"), 403
+
+        database = RNASEQ_DATABASES.get(escape(database))
+        if database is None:
+            return BARUtils.error_exit("Invalid database"), 400
+
+        root = ExpressionStore.get_root()
+        if root is None:
+            return BARUtils.error_exit("Expression store is not configured"), 500
+
+        try:
+            matrix = RNASeqUtils.load_matrix(database.model)
+        except SQLAlchemyError:
+            return BARUtils.error_exit("An internal error has occurred"), 500
+        version = ExpressionStore.export(root, database.get_store_name(), matrix)
+        return BARUtils.success_exit(version)
+
+
+@rnaseq_gene_expression.route(
+    "/cluster_aggregates/<string:species>/<string:database>/<string:gene_id>"
+)
+class GetRNASeqClusterAggregates(Resource):
+    @rnaseq_gene_expression.param("species", _in="path", default="arabidopsis")
+    @rnaseq_gene_expression.param("database", _in="path", default="single_cell")
+    @rnaseq_gene_expression.param("gene_id", _in="path", default="At1g01010")
+    def get(self, species="", database="", gene_id=""):
+        """This end point returns the mean, sd, n, min and max of each cluster for a gene"""
+        # Variables
+        species = escape(species)
+        database = escape(database)
+        gene_id = escape(gene_id)
+
+        results = RNASeqUtils.get_cluster_aggregates(species, database, gene_id)
+
+        if results["success"]:
+            # Return results if there are data
+            if len(results["data"]) > 0:
+                return BARUtils.success_exit(results["data"])
+            else:
+                return BARUtils.error_exit("There are no data found for the given gene")
+        else:
+            return BARUtils.error_exit(results["error"]), results["error_code"]
+
+
+@rnaseq_gene_expression.route("/matrix")
+class PostRNASeqExpressionMatrix(Resource):
+    @rnaseq_gene_expression.expect(gene_expression_matrix_request_fields)
+    def post(self):
+        """This end point returns a gene x sample expression matrix for multiple genes and samples.
+        The gene and sample axes are listed once and values are returned as one row per gene."""
+        json_data = request.get_json()
+
+        # Validate json
+        try:
+            json_data = RNASeqMatrixSchema().load(json_data)
+        except ValidationError as err:
+            return BARUtils.error_exit(err.messages), 400
+
+        species = json_data["species"]
+        database = json_data["database"]
+        genes = json_data["genes"]
+        sample_ids = json_data.get("sample_ids")
+
+        results = RNASeqUtils.get_matrix(species, database, genes, sample_ids)
+
+        if results["success"]:
+            # Return results if there are data
+            if len(results["data"]) > 0:
+                mimetype = PayloadUtils.get_binary_mimetype()
+                if mimetype:
+                    return PayloadUtils.matrix_response(
+                        results["data"]["genes"],
+                        results["data"]["samples"],
+                        results["data"]["values"],
+                        mimetype,
+                    )
+                return BARUtils.success_exit(results["data"])
+            else:
+                return BARUtils.error_exit(
+                    "There are no data found for the given genes"
+                )
+        else:
+            return BARUtils.error_exit(results["error"]), results["error_code"]
+
+
 @rnaseq_gene_expression.route("/<string:species>/<string:database>/<string:gene_id>")
 class GetRNASeqGeneExpression(Resource):
     @rnaseq_gene_expression.param("species", _in="path", default="arabidopsis")
@@ -160,6 +742,11 @@ class GetRNASeqGeneExpression(Resource):
         if results["success"]:
             # Return results if there are data
             if len(results["data"]) > 0:
+                mimetype = PayloadUtils.get_binary_mimetype()
+                if mimetype:
+                    return PayloadUtils.gene_response(
+                        gene_id, results["data"], mimetype
+                    )
                 return BARUtils.success_exit(results["data"])
             else:
                 return BARUtils.error_exit("There are no data found for the given gene")
@@ -190,6 +777,11 @@ class GetRNASeqGeneExpressionSample(Resource):
         if results["success"]:
             # Return results if there are data
             if len(results["data"]) > 0:
+                mimetype = PayloadUtils.get_binary_mimetype()
+                if mimetype:
+                    return PayloadUtils.gene_response(
+                        gene_id, results["data"], mimetype
+                    )
                 return BARUtils.success_exit(results["data"])
             else:
                 return BARUtils.error_exit("There are no data found for the given gene")
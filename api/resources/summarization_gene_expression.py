@@ -1,41 +1,195 @@
+import gzip
+import mimetypes
 import requests
-import json as jsonlib
-import tempfile
 import os
 import re
+import threading
 import pandas
+from collections import OrderedDict
 from api import summarization_db as db
 from api import limiter
-from flask import request, send_file
+from flask import current_app, request, send_file
+from urllib.parse import quote
 from werkzeug.utils import secure_filename
 from api.utils.bar_utils import BARUtils
-from flask_restx import Namespace, Resource
-from sqlalchemy.exc import SQLAlchemyError
-from sqlalchemy.inspection import inspect
+from api.utils.payload_utils import PayloadUtils
+from api.utils.summarization_loader import SummarizationLoader
+from api.utils.table_catalog import TableCatalogUtils
+from api.utils.api_key_cache import ApiKeyCache
+from api.utils.usage_meter import UsageMeter
+from api.utils.expression_matrix import ExpressionMatrix, CORRELATION_METHODS
+from api.utils.expression_store import ExpressionStore
+from api.utils.compressed_store import CompressedStore
+from api.utils.gene_index import GeneIndex
+from api.utils.cromwell_queue import CromwellQueue
+from api.utils.drive_client import DriveClient
+from api.utils.chunked_upload import ChunkedUpload
+from api.utils.upload_content import UploadContent
+from api.utils.kallisto_converter import KallistoConverter
+from api.utils.user_file_store import UserFileStore
+from flask_restx import Namespace, Resource, fields
+from marshmallow import (
+    Schema,
+    ValidationError,
+    fields as marshmallow_fields,
+    validate,
+)
+from sqlalchemy.exc import NoSuchTableError, SQLAlchemyError
 from scour.scour import scourString
-from cryptography.fernet import Fernet
 
 
 DATA_FOLDER = "/home/bpereira/data/summarization-data"
+USER_DATA_FOLDER = "/DATA/users/www-data/"
 # DATA_FOLDER = '/windir/c/Users/Bruno/Documents/SummarizationCache'
 SUMMARIZATION_FILES_PATH = "/home/barapps/cromwell/summarization"
-CROMWELL_URL = "http://localhost:3020"
 GTF_DICT = {
     "Hsapiens": "./data/hg38.ensGene.gtf",
     "Athaliana": "./data/Araport11_GFF3_genes_transposons.201606.gtf",
     "Mmusculus": "./data/GCF_000001635.27_GRCm39_genomic.gtf",
 }
 
+# Default and maximum number of co-expressed genes returned
+COEXPRESSION_DEFAULT_TOP_N = 25
+COEXPRESSION_MAX_TOP_N = 1000
+
+# Default and maximum number of differentially expressed genes returned
+DIFFERENTIAL_DEFAULT_TOP_N = 50
+DIFFERENTIAL_MAX_TOP_N = 5000
+
+# Maximum number of reflected tables kept in memory
+TABLE_CACHE_SIZE = 256
+
+# Maximum number of differential expression results kept in memory
+DIFFERENTIAL_CACHE_SIZE = 64
+
+# Maximum number of genes in one matrix request
+MAX_MATRIX_GENES = 1000
+
+# Kallisto files up to this size are converted and loaded in the request instead of by Cromwell
+NATIVE_CONVERSION_MAX_BYTES = 64 * 1024 * 1024
+
+# Name of the output of Kallisto, which is written in a folder per sample
+KALLISTO_OUTPUT_NAME = "abundance"
+
+# Email sent when an upload is inserted without the workflow, which sends its own
+UPLOAD_EMAIL_SUBJECT = "[Bio-Analytic Resource] Your data are ready"
+UPLOAD_EMAIL_TEXT = """\
+Your file {name} was processed and added to your BAR summarization data.
+"""
+
+# Default and maximum number of genes found by find_gene
+FIND_GENE_DEFAULT_LIMIT = 50
+FIND_GENE_MAX_LIMIT = 1000
+
 summarization_gene_expression = Namespace(
     "Summarization Gene Expression",
     description="Gene Expression data from the BAR's summarization procedure",
     path="/summarization_gene_expression",
 )
 
+matrix_request_fields = summarization_gene_expression.model(
+    "SummarizationMatrix",
+    {
+        "genes": fields.List(
+            required=True,
+            example=["At1g01010", "At1g01020"],
+            cls_or_instance=fields.String,
+        ),
+        "samples": fields.List(
+            example=["sample1", "sample2"], cls_or_instance=fields.String
+        ),
+    },
+)
+
+differential_request_fields = summarization_gene_expression.model(
+    "SummarizationDifferential",
+    {
+        "group1": fields.List(
+            required=True,
+            example=["sample1", "sample2"],
+            cls_or_instance=fields.String,
+        ),
+        "group2": fields.List(
+            required=True,
+            example=["sample3", "sample4"],
+            cls_or_instance=fields.String,
+        ),
+        "top_n": fields.Integer(example=DIFFERENTIAL_DEFAULT_TOP_N),
+    },
+)
+
+upload_request_fields = summarization_gene_expression.model(
+    "SummarizationUpload",
+    {
+        "filename": fields.String(required=True, example="abundance.tsv"),
+        "size": fields.Integer(required=True, example=1048576),
+        "type": fields.String(required=True, example="tsv"),
+        "overwrite": fields.Boolean(example=False),
+        "email": fields.String(example="user@example.com"),
+        "sample": fields.String(example="sample1"),
+    },
+)
+
+
+class SummarizationUploadSchema(Schema):
+    """Request of a resumable upload"""
+
+    filename = marshmallow_fields.String(
+        required=True, validate=validate.Length(min=1, max=255)
+    )
+    size = marshmallow_fields.Integer(required=True)
+    type = marshmallow_fields.String(
+        required=True, validate=validate.OneOf(["tsv", "csv"])
+    )
+    overwrite = marshmallow_fields.Boolean()
+    email = marshmallow_fields.String()
+    sample = marshmallow_fields.String(validate=validate.Length(min=1, max=64))
+
+
+class SummarizationMatrixSchema(Schema):
+    genes = marshmallow_fields.List(
+        marshmallow_fields.String,
+        required=True,
+        validate=validate.Length(min=1, max=MAX_MATRIX_GENES),
+    )
+    samples = marshmallow_fields.List(cls_or_instance=marshmallow_fields.String)
+
+
+class SummarizationDifferentialSchema(Schema):
+    """Request of a comparison of two groups of samples"""
+
+    group1 = marshmallow_fields.List(
+        marshmallow_fields.String, required=True, validate=validate.Length(min=2)
+    )
+    group2 = marshmallow_fields.List(
+        marshmallow_fields.String, required=True, validate=validate.Length(min=2)
+    )
+    top_n = marshmallow_fields.Integer(
+        validate=validate.Range(min=1, max=DIFFERENTIAL_MAX_TOP_N)
+    )
+
 
 class SummarizationGeneExpressionUtils:
+    # Reflected tables of this process, least recently used first
+    tables = OrderedDict()
+    tables_lock = threading.Lock()
+
+    # Differential expression results of this process, least recently used first:
+    # (table_id, table version, group1, group2): results
+    differential = OrderedDict()
+    differential_lock = threading.Lock()
+
     @staticmethod
     def get_table_object(table_name):
+        """Gets a reflected table. Tables are reflected once and kept in an LRU cache.
+        :param table_name: The name of the table
+        """
+        with SummarizationGeneExpressionUtils.tables_lock:
+            table_object = SummarizationGeneExpressionUtils.tables.get(table_name)
+            if table_object is not None:
+                SummarizationGeneExpressionUtils.tables.move_to_end(table_name)
+                return table_object
+
         metadata = db.MetaData()
         table_object = db.Table(
             table_name,
@@ -43,8 +197,364 @@ class SummarizationGeneExpressionUtils:
             autoload=True,
             autoload_with=db.get_engine(bind="summarization"),
         )
+
+        with SummarizationGeneExpressionUtils.tables_lock:
+            SummarizationGeneExpressionUtils.tables[table_name] = table_object
+            if len(SummarizationGeneExpressionUtils.tables) > TABLE_CACHE_SIZE:
+                SummarizationGeneExpressionUtils.tables.popitem(last=False)
         return table_object
 
+    @staticmethod
+    def invalidate_differential(table_id):
+        """Removes the differential expression results of a table, after it is dropped
+        :param table_id: The name of the user table
+        """
+        with SummarizationGeneExpressionUtils.differential_lock:
+            for cache_key in list(SummarizationGeneExpressionUtils.differential):
+                if cache_key[0] == table_id:
+                    del SummarizationGeneExpressionUtils.differential[cache_key]
+
+    @staticmethod
+    def invalidate_table(table_name):
+        """Removes a table from the reflected table cache, after it is created, changed or dropped
+        :param table_name: The name of the table
+        """
+        with SummarizationGeneExpressionUtils.tables_lock:
+            SummarizationGeneExpressionUtils.tables.pop(table_name, None)
+
+    @staticmethod
+    def load_matrix(table_id):
+        """Loads a user table as a gene x sample matrix, with genes and samples in catalog order
+        :param table_id: The name of the user table
+        :return: ExpressionMatrix, or None if the table does not exist
+        """
+        genes = TableCatalogUtils.get_genes(table_id)
+        samples = TableCatalogUtils.get_samples(table_id)
+        if genes is None or samples is None:
+            return None
+        tbl = SummarizationGeneExpressionUtils.get_table_object(table_id)
+        con = db.get_engine(bind="summarization")
+        df = pandas.read_sql(db.select([tbl.c.Gene, tbl.c.Sample, tbl.c.Value]), con)
+        df["Sample"] = df["Sample"].astype(str)
+        wide = df.pivot_table(index="Gene", columns="Sample", values="Value")
+        wide = wide.reindex(index=genes, columns=samples)
+        return ExpressionMatrix(wide.index, wide.columns, wide.to_numpy())
+
+    @staticmethod
+    def load_compressed(table_id):
+        """Gets the compressed matrix file of a user table
+        :param table_id: The name of the user table
+        :return: CompressedMatrix, or None if the table is not in the compressed store
+        """
+        if not SummarizationGeneExpressionUtils.is_valid(table_id):
+            return None
+        return CompressedStore.load(CompressedStore.get_root(), table_id)
+
+    @staticmethod
+    def load_genes(table_id):
+        """Loads the distinct genes of a user table from the compressed store or the table catalog
+        :param table_id: The name of the user table
+        """
+        matrix = SummarizationGeneExpressionUtils.load_compressed(table_id)
+        if matrix is not None:
+            return matrix.genes
+        return TableCatalogUtils.get_genes(table_id) or []
+
+    @staticmethod
+    def get_matrix(table_id, genes, samples=None):
+        """Gets a gene x sample matrix from a user table with one query
+        :param table_id: The name of the user table
+        :param genes: List of genes
+        :param samples: List of samples. All samples if empty.
+        :return: dict with gene and sample axes and a list of rows of values, or None if there are no data
+        """
+        if samples is None:
+            samples = []
+
+        # Remove duplicates but keep the order
+        genes = list(dict.fromkeys(gene.upper() for gene in genes))
+        samples = list(dict.fromkeys(samples))
+
+        tbl = SummarizationGeneExpressionUtils.get_table_object(table_id)
+        con = db.get_engine(bind="summarization")
+        query = db.select([tbl.c.Gene, tbl.c.Sample, tbl.c.Value]).where(
+            tbl.c.Gene.in_(genes)
+        )
+        if len(samples) > 0:
+            query = query.where(tbl.c.Sample.in_(samples))
+        rows = con.execute(query).fetchall()
+        if len(rows) == 0:
+            return None
+
+        # Requested samples keep their order, otherwise samples are listed as found
+        if len(samples) == 0:
+            samples = list(dict.fromkeys(str(row.Sample) for row in rows))
+
+        gene_index = {gene: i for i, gene in enumerate(genes)}
+        sample_index = {sample: i for i, sample in enumerate(samples)}
+        values = [[None] * len(samples) for _ in genes]
+        for row in rows:
+            i = gene_index.get(row.Gene.upper())
+            j = sample_index.get(str(row.Sample))
+            # NULL values stay None, like the NaN of missing values in load_matrix
+            if i is not None and j is not None and row.Value is not None:
+                values[i][j] = float(row.Value)
+
+        return {"genes": genes, "samples": samples, "values": values}
+
+    @staticmethod
+    def get_matrix_object(table_id):
+        """Gets the ExpressionMatrix of a user table from the shared store, or from the process cache.
+        Cached matrices are loaded again once the catalog shows a later change, so inserts and drops
+        in other processes are seen.
+        :param table_id: The name of the user table
+        :return: ExpressionMatrix, or None if the table does not exist
+        """
+        name = "summarization_" + table_id
+        matrix = ExpressionStore.load(ExpressionStore.get_root(), name)
+        if matrix is not None:
+            return matrix
+        catalog = TableCatalogUtils.get_table(table_id)
+        if catalog is None:
+            return None
+        return ExpressionMatrix.get_cached(
+            name,
+            lambda: SummarizationGeneExpressionUtils.load_matrix(table_id),
+            catalog.last_modified.timestamp(),
+        )
+
+    @staticmethod
+    def get_differential(table_id, group1, group2):
+        """Compares two groups of samples of a user table across all genes.
+        Results are kept per version of the table, so they are computed again after an insert.
+        :param table_id: The name of the user table
+        :param group1: list of samples
+        :param group2: list of samples
+        :return: list from ExpressionMatrix.compare, or None if the table does not exist
+        """
+        name = "summarization_" + table_id
+        root = ExpressionStore.get_root()
+        version = ExpressionStore.get_version(root, name)
+        if version is None:
+            catalog = TableCatalogUtils.get_table(table_id)
+            if catalog is None:
+                return None
+            version = catalog.last_modified.isoformat()
+
+        cache_key = (table_id, version, tuple(group1), tuple(group2))
+        with SummarizationGeneExpressionUtils.differential_lock:
+            results = SummarizationGeneExpressionUtils.differential.get(cache_key)
+            if results is not None:
+                SummarizationGeneExpressionUtils.differential.move_to_end(cache_key)
+                return results
+
+        matrix = SummarizationGeneExpressionUtils.get_matrix_object(table_id)
+        if matrix is None:
+            return None
+        samples = set(matrix.samples)
+        if any(sample not in samples for sample in group1 + group2):
+            raise ValueError("Sample not found")
+        results = matrix.compare(group1, group2)
+
+        with SummarizationGeneExpressionUtils.differential_lock:
+            SummarizationGeneExpressionUtils.differential[cache_key] = results
+            if (
+                len(SummarizationGeneExpressionUtils.differential)
+                > DIFFERENTIAL_CACHE_SIZE
+            ):
+                SummarizationGeneExpressionUtils.differential.popitem(last=False)
+        return results
+
+    @staticmethod
+    def get_user_dir(key):
+        """Gets the directory of a user's files
+        :param key: The user's API key
+        """
+        return os.path.join(USER_DATA_FOLDER, secure_filename(key))
+
+    @staticmethod
+    def get_file_dir(key):
+        """Gets the directory of the files saved by a user
+        :param key: API key
+        :return: path
+        """
+        return os.path.join(DATA_FOLDER, secure_filename(key))
+
+    @staticmethod
+    def get_upload(key, upload_id):
+        """Gets an unfinished upload of a user
+        :param key: The user's API key
+        :param upload_id: The upload ID
+        :return: dict of the upload, or None if it does not exist
+        """
+        if not SummarizationGeneExpressionUtils.is_valid(upload_id):
+            return None
+        return ChunkedUpload.load(
+            SummarizationGeneExpressionUtils.get_user_dir(key), upload_id
+        )
+
+    @staticmethod
+    def insert_csv(table_id, csv, overwrite):
+        """Loads a CSV file into a user table and refreshes the caches and stores of the table
+        :param table_id: The name of the user table
+        :param csv: path or file object of the CSV file
+        :param overwrite: replace or append
+        """
+        con = db.get_engine(bind="summarization")
+        if overwrite == "replace":
+            stats = SummarizationLoader.replace_csv(con, table_id, csv)
+        else:
+            # Add tables from before the catalog, so their row count is known
+            TableCatalogUtils.get_table(table_id)
+            with con.begin() as transaction:
+                # New rows continue the index of the table. The catalog row stays locked
+                # until the rows are committed, so concurrent appends do not reuse indexes.
+                start_index = TableCatalogUtils.lock(transaction, table_id)
+                stats = SummarizationLoader.load_csv(
+                    transaction, table_id, csv, start_index
+                )
+        current_app.logger.info(
+            "Loaded %s: %s rows, %s genes, %s samples in %ss (%s rows/s)",
+            table_id,
+            stats["rows"],
+            stats["genes"],
+            stats["samples"],
+            stats["seconds"],
+            stats["rows_per_second"],
+        )
+        SummarizationGeneExpressionUtils.invalidate_table(table_id)
+        ExpressionMatrix.invalidate("summarization_" + table_id)
+
+        # Publish the new data if the table is in the shared stores. Tables are added to the
+        # stores by their export endpoints, as writing them loads the whole table in memory.
+        root = ExpressionStore.get_root()
+        compressed_root = CompressedStore.get_root()
+        compressed = compressed_root is not None and os.path.exists(
+            CompressedStore.get_path(compressed_root, table_id)
+        )
+        exported = ExpressionStore.get_version(root, "summarization_" + table_id)
+        if compressed or exported:
+            matrix = SummarizationGeneExpressionUtils.load_matrix(table_id)
+            if compressed:
+                CompressedStore.write(compressed_root, table_id, matrix)
+            if exported:
+                ExpressionStore.export(root, "summarization_" + table_id, matrix)
+
+        GeneIndex.build(
+            "summarization_" + table_id,
+            SummarizationGeneExpressionUtils.load_genes(table_id),
+        )
+
+    @staticmethod
+    def get_upload_name(upload_type, filename, sample=None):
+        """Gets the file name an upload is given to the workflow under. Kallisto files are named
+        after their sample, as the sample name is taken from the file name.
+        :param upload_type: tsv for Kallisto output or csv for expression data
+        :param filename: The name of the file sent by the client, which may include folders
+        :param sample: The sample name sent with a Kallisto file, if any
+        :return: secure file name, or an empty string
+        """
+        parts = [secure_filename(part) for part in re.split(r"[/\\]", filename or "")]
+        parts = [part for part in parts if part]
+        if upload_type != "tsv":
+            return parts[-1] if parts else ""
+
+        if sample:
+            name = secure_filename(sample)
+        elif parts:
+            name = os.path.splitext(parts[-1])[0]
+            # Kallisto output is named after the folder of the sample
+            if name == KALLISTO_OUTPUT_NAME and len(parts) > 1:
+                name = parts[-2]
+        else:
+            name = ""
+        return name + ".tsv" if name else ""
+
+    @staticmethod
+    def send_upload_email(email, name):
+        """Emails the user that an upload was inserted, in the background
+        :param email: The user's email address
+        :param name: The name of the uploaded file
+        """
+        if not os.environ.get("BAR") or not email:
+            return
+        logger = current_app.logger
+
+        def send():
+            try:
+                BARUtils.send_email(
+                    email, UPLOAD_EMAIL_SUBJECT, UPLOAD_EMAIL_TEXT.format(name=name)
+                )
+            except Exception:
+                # The data are inserted, so the upload does not fail
+                logger.exception("Could not send the upload email to %s", email)
+
+        threading.Thread(target=send, daemon=True).start()
+
+    @staticmethod
+    def queue_upload(upload_type, key, path, overwrite, email, digest, name):
+        """Queues the workflow that converts and inserts an uploaded file.
+        If the same content is already in the user's table, the job that inserted it is returned.
+        Small Kallisto files are converted and inserted at once.
+        :param upload_type: tsv for Kallisto output or csv for expression data
+        :param key: The user's API key
+        :param path: The path of the uploaded file
+        :param overwrite: replace or append
+        :param email: The user's email address
+        :param digest: The SHA-256 of the file
+        :param name: The name of the file from get_upload_name, used as the sample name of Kallisto files
+        :return: job ID
+        """
+        job_id = UploadContent.get_processed(key, digest, upload_type, overwrite)
+        if job_id is not None:
+            return job_id
+        if not name:
+            name = digest + "." + upload_type
+
+        if (
+            upload_type == "tsv"
+            and os.path.getsize(path) <= NATIVE_CONVERSION_MAX_BYTES
+            and SummarizationGeneExpressionUtils.is_valid(key)
+        ):
+            try:
+                csv = KallistoConverter.to_csv(path, os.path.splitext(name)[0])
+            except ValueError:
+                # Files that are not plain Kallisto output are left to the workflow
+                csv = None
+            if csv is not None:
+                SummarizationGeneExpressionUtils.insert_csv(key, csv, overwrite)
+                job_id = CromwellQueue.record_finished("Succeeded")
+                UploadContent.record(key, digest, upload_type, overwrite, job_id)
+                SummarizationGeneExpressionUtils.send_upload_email(email, name)
+                return job_id
+
+        # Workflows name the samples after the file
+        path = UploadContent.link(path, name)
+        if upload_type == "tsv":
+            inputs = {
+                "tsvUpload.insertDataScript": "./insertData.py",
+                "tsvUpload.conversionScript": "./kallistoToRpkm.R",
+                "tsvUpload.id": key,
+                "tsvUpload.tsv": path,
+                "tsvUpload.overwrite": overwrite,
+                "tsvUpload.email": email,
+            }
+            workflow = "tsvUpload.wdl"
+        else:
+            inputs = {
+                "csvUpload.insertDataScript": "./insertData.py",
+                "csvUpload.id": key,
+                "csvUpload.csv": path,
+                "csvUpload.overwrite": overwrite,
+                "csvUpload.email": email,
+            }
+            workflow = "csvUpload.wdl"
+        job_id = CromwellQueue.enqueue(
+            os.path.join(SUMMARIZATION_FILES_PATH, workflow), inputs
+        )
+        UploadContent.record(key, digest, upload_type, overwrite, job_id)
+        return job_id
+
     @staticmethod
     def is_valid(string):
         """Checks if a given string only contains alphanumeric characters
@@ -57,47 +567,26 @@ class SummarizationGeneExpressionUtils:
 
     @staticmethod
     def validate_api_key(key):
-        """Checks if a given API key is in the Users database
+        """Checks if a given API key is in the Users database, is not revoked and has uses left
         :param key: The API key to be checked
         """
-        tbl = SummarizationGeneExpressionUtils.get_table_object("users")
-        con = db.get_engine(bind="summarization")
         try:
-            row = con.execute(
-                db.select([tbl.c.uses_left]).where(tbl.c.api_key == key)
-            ).first()
+            return ApiKeyCache.is_valid(key)
         except SQLAlchemyError as e:
             error = str(e.__dict__["orig"])
             return error
-        if row is None:
-            return False
-        else:
-            if row.uses_left > 0:
-                return True
-            else:
-                return False
 
     @staticmethod
     def decrement_uses(key):
-        """Subtracts 1 from the uses_left column of the user whose key matches the given string
+        """Subtracts 1 from the uses left of the user whose key matches the given string.
+        Unknown, revoked and exhausted keys are rejected from the key cache.
         :param key: The user's API key
         """
-        if SummarizationGeneExpressionUtils.validate_api_key(key):
-            tbl = SummarizationGeneExpressionUtils.get_table_object("users")
-            con = db.get_engine(bind="summarization")
-            try:
-                con.execute(
-                    db.update(tbl)
-                    .where(tbl.c.api_key == key)
-                    .values(uses_left=(tbl.c.uses_left - 1))
-                )
-                db.session.commit()
-            except SQLAlchemyError as e:
-                error = str(e.__dict__["orig"])
-                return error
-            return True
-        else:
+        if SummarizationGeneExpressionUtils.validate_api_key(key) is not True:
             return False
+        used = UsageMeter.consume(key)
+        ApiKeyCache.record_use(key, used)
+        return used
 
 
 @summarization_gene_expression.route("/summarize", methods=["POST"])
@@ -139,39 +628,25 @@ class SummarizationGeneExpressionSummarize(Resource):
                     "geneSummarization.csvEmail": csvEmail,
                     "geneSummarization.overwrite": overwrite,
                 }
-                # Send request to Cromwell
-                path = os.path.join(SUMMARIZATION_FILES_PATH, "rpkm.wdl")
-                file = tempfile.TemporaryFile(mode="w+")
-                file.write(jsonlib.dumps(inputs))
-                file.seek(0)
-                files = {
-                    "workflowSource": ("rpkm.wdl", open(path, "rb")),
-                    "workflowInputs": ("rpkm_inputs.json", file.read()),
-                }
-                id_and_status = requests.post(
-                    CROMWELL_URL + "/api/workflows/v1", files=files
-                )
-                id_and_status = id_and_status.json()
-                file.close()
-                gkey = os.environ.get("DRIVE_LIST_KEY")
-                cipher_suite = Fernet(gkey)
-                with open(os.environ.get("DRIVE_LIST_FILE"), "rb") as f:
-                    for line in f:
-                        encrypted_key = line
-                uncipher_text = cipher_suite.decrypt(encrypted_key)
-                plain_text_gkey = bytes(uncipher_text).decode("utf-8")
-                r = requests.get(
-                    "https://www.googleapis.com/drive/v3/files?corpora=user&includeItemsFromAllDrives=true&q=%27"
-                    + json["folderId"]
-                    + "%27%20in%20parents&supportsAllDrives=true&key="
-                    + plain_text_gkey
-                )
+                # List the folder first, so no job is queued if Drive cannot be reached
+                try:
+                    files = DriveClient.get_client().list_files(json["folderId"])
+                    fs = [x["name"] for x in files if ".bam" in x["name"]]
+                except requests.HTTPError as e:
+                    fs = e.response.status_code
+                except requests.RequestException:
+                    return BARUtils.error_exit("Drive is not available"), 503
+                # Queue the workflow for Cromwell
+                try:
+                    job_id = CromwellQueue.enqueue(
+                        os.path.join(SUMMARIZATION_FILES_PATH, "rpkm.wdl"), inputs
+                    )
+                except requests.RequestException:
+                    return BARUtils.error_exit("Workflow server is not available"), 503
+                if overwrite == "replace":
+                    UploadContent.forget(key)
                 # Return ID for future accessing
-                if r.status_code == 200:
-                    fs = [x["name"] for x in r.json()["files"] if ".bam" in x["name"]]
-                else:
-                    fs = r.status_code
-                return BARUtils.success_exit((id_and_status["id"], fs)), 200
+                return BARUtils.success_exit((job_id, fs)), 200
             else:
                 return BARUtils.error_exit("Invalid API key")
 
@@ -182,15 +657,15 @@ class SummarizationGeneExpressionSummarize(Resource):
 class SummarizationGeneExpressionProgress(Resource):
     @summarization_gene_expression.param("job_id", _in="path", default="")
     def get(self, job_id):
-        """Get progress of a job given its ID"""
+        """Get progress of a job given its ID. Status is refreshed from Cromwell in the background."""
         if request.method == "GET":
-            progress = requests.get(
-                CROMWELL_URL + "/api/workflows/v1/" + job_id + "/status"
-            )
-            if progress.status_code == 200:
-                return BARUtils.success_exit(progress.status), 200
-            else:
-                return BARUtils.error_exit(progress.status_code)
+            try:
+                status = CromwellQueue.get_status(job_id)
+            except requests.RequestException:
+                return BARUtils.error_exit("Workflow server is not available"), 503
+            if status is None:
+                return BARUtils.error_exit("Job not found"), 404
+            return BARUtils.success_exit(status), 200
 
 
 @summarization_gene_expression.route("/user", methods=["GET"], doc=False)
@@ -230,7 +705,9 @@ class SummarizationGeneExpressionTsvUpload(Resource):
                 return BARUtils.error_exit("No file attached"), 400
             file = request.files["file"]
             if file:
-                filename = secure_filename(file.filename)
+                filename = SummarizationGeneExpressionUtils.get_upload_name(
+                    "tsv", file.filename, request.form.get("sample")
+                )
                 key = request.headers.get("X-Api-Key")
                 overwrite = request.form.get("overwrite")
                 email = request.form.get("email")
@@ -239,38 +716,24 @@ class SummarizationGeneExpressionTsvUpload(Resource):
                 else:
                     overwrite = "append"
                 # Create folder for user data if it doesn't exist
-                dirName = os.path.join("/DATA/users/www-data/", secure_filename(key))
+                dirName = SummarizationGeneExpressionUtils.get_user_dir(key)
                 if not os.path.exists(dirName):
                     os.makedirs(dirName)
-                file.save(os.path.join(dirName, secure_filename(filename)))
+                # The file is hashed while it is written
+                digest, path = UploadContent.save_stream(dirName, file.stream, "tsv")
                 if SummarizationGeneExpressionUtils.decrement_uses(key):
-                    inputs = (
-                        """
-                            {
-                            "tsvUpload.insertDataScript": "./insertData.py",
-                            "tsvUpload.conversionScript": "./kallistoToRpkm.R",
-                            "tsvUpload.id": """
-                        + key
-                        + """,
-                            "tsvUpload.tsv": """
-                        + os.path.join(dirName, secure_filename(filename))
-                        + """,
-                            "tsvUpload.overwrite": """
-                        + overwrite
-                        + """,
-                            "tsvUpload.email": """
-                        + email
-                        + """
-                            }
-                            """
-                    )
-                    path = os.path.join(SUMMARIZATION_FILES_PATH, "tsvUpload.wdl")
-                    files = {
-                        "workflowSource": ("tsvUpload.wdl", open(path, "rb")),
-                        "workflowInputs": ("rpkm_inputs.json", inputs),
-                    }
-                    requests.post(CROMWELL_URL + "/api/workflows/v1", files=files)
-                    return BARUtils.success_exit(key)
+                    try:
+                        job_id = SummarizationGeneExpressionUtils.queue_upload(
+                            "tsv", key, path, overwrite, email, digest, filename
+                        )
+                    except requests.RequestException:
+                        return (
+                            BARUtils.error_exit("Workflow server is not available"),
+                            503,
+                        )
+                    except SQLAlchemyError:
+                        return BARUtils.error_exit("Internal server error"), 500
+                    return BARUtils.success_exit(job_id)
                 else:
                     return BARUtils.error_exit("Invalid API key")
 
@@ -286,7 +749,9 @@ class SummarizationGeneExpressionCsvUpload(Resource):
                 return BARUtils.error_exit("No file attached"), 400
             file = request.files["file"]
             if file:
-                filename = secure_filename(file.filename)
+                filename = SummarizationGeneExpressionUtils.get_upload_name(
+                    "csv", file.filename
+                )
                 key = request.headers.get("X-Api-Key")
                 overwrite = request.form.get("overwrite")
                 email = request.form.get("email")
@@ -294,45 +759,175 @@ class SummarizationGeneExpressionCsvUpload(Resource):
                     overwrite = "replace"
                 else:
                     overwrite = "append"
-                dirName = os.path.join("/DATA/users/www-data/", secure_filename(key))
+                dirName = SummarizationGeneExpressionUtils.get_user_dir(key)
                 if not os.path.exists(dirName):
                     os.makedirs(dirName)
-                file.save(os.path.join(dirName, secure_filename(filename)))
+                # The file is hashed while it is written
+                digest, path = UploadContent.save_stream(dirName, file.stream, "csv")
                 if SummarizationGeneExpressionUtils.decrement_uses(key):
-                    inputs = (
-                        """
-                            {
-                            "csvUpload.insertDataScript": "./insertData.py",
-                            "csvUpload.id": """
-                        + key
-                        + """,
-                            "csvUpload.csv": """
-                        + os.path.join(dirName, filename)
-                        + """,
-                            "csvUpload.overwrite": """
-                        + overwrite
-                        + """,
-                            "csvUpload.email": """
-                        + email
-                        + """
-                            }
-                            """
-                    )
-                    path = os.path.join(SUMMARIZATION_FILES_PATH, "csvUpload.wdl")
-                    files = {
-                        "workflowSource": ("csvUpload.wdl", open(path, "rb")),
-                        "workflowInputs": ("rpkm_inputs.json", inputs),
-                    }
-                    requests.post(CROMWELL_URL + "/api/workflows/v1", files=files)
-                    return BARUtils.success_exit(key)
+                    try:
+                        job_id = SummarizationGeneExpressionUtils.queue_upload(
+                            "csv", key, path, overwrite, email, digest, filename
+                        )
+                    except requests.RequestException:
+                        return (
+                            BARUtils.error_exit("Workflow server is not available"),
+                            503,
+                        )
+                    except SQLAlchemyError:
+                        return BARUtils.error_exit("Internal server error"), 500
+                    return BARUtils.success_exit(job_id)
                 else:
                     return BARUtils.error_exit("Invalid API key")
 
 
+@summarization_gene_expression.route("/upload", methods=["POST"], doc=False)
+class SummarizationGeneExpressionUploadInitiate(Resource):
+    decorators = [limiter.limit("1/minute")]
+
+    @summarization_gene_expression.expect(upload_request_fields)
+    def post(self):
+        """Starts a resumable upload of a TSV or CSV file. The file is then sent in chunks of chunk_size bytes."""
+        key = request.headers.get("X-Api-Key")
+        if SummarizationGeneExpressionUtils.validate_api_key(key) is not True:
+            return BARUtils.error_exit("Invalid API key")
+        try:
+            json_data = SummarizationUploadSchema().load(request.get_json())
+        except ValidationError as err:
+            return BARUtils.error_exit(err.messages), 400
+
+        options = {
+            "type": json_data["type"],
+            "overwrite": "replace" if json_data.get("overwrite") else "append",
+            "email": json_data.get("email"),
+            "name": SummarizationGeneExpressionUtils.get_upload_name(
+                json_data["type"], json_data["filename"], json_data.get("sample")
+            ),
+        }
+        try:
+            upload = ChunkedUpload.initiate(
+                SummarizationGeneExpressionUtils.get_user_dir(key),
+                secure_filename(json_data["filename"]),
+                json_data["size"],
+                options,
+            )
+        except ValueError as e:
+            return BARUtils.error_exit(str(e)), 400
+        return BARUtils.success_exit(
+            {
+                "upload_id": upload["upload_id"],
+                "chunk_size": upload["chunk_size"],
+                "chunks": upload["chunks"],
+            }
+        )
+
+
+@summarization_gene_expression.route(
+    "/upload/<string:upload_id>", methods=["GET"], doc=False
+)
+class SummarizationGeneExpressionUploadStatus(Resource):
+    @summarization_gene_expression.param("upload_id", _in="path", default="")
+    def get(self, upload_id=""):
+        """Returns the chunks of an upload that were received, so an interrupted upload can resume"""
+        key = request.headers.get("X-Api-Key")
+        if SummarizationGeneExpressionUtils.validate_api_key(key) is not True:
+            return BARUtils.error_exit("Invalid API key")
+        upload = SummarizationGeneExpressionUtils.get_upload(key, upload_id)
+        if upload is None:
+            return BARUtils.error_exit("Upload not found"), 404
+
+        user_dir = SummarizationGeneExpressionUtils.get_user_dir(key)
+        received = ChunkedUpload.get_received(user_dir, upload)
+        return BARUtils.success_exit(
+            {
+                "chunk_size": upload["chunk_size"],
+                "chunks": upload["chunks"],
+                "received": received,
+                "missing": sorted(set(range(upload["chunks"])) - set(received)),
+            }
+        )
+
+
+@summarization_gene_expression.route(
+    "/upload/<string:upload_id>/<int:index>", methods=["PUT"], doc=False
+)
+class SummarizationGeneExpressionUploadChunk(Resource):
+    @summarization_gene_expression.param("upload_id", _in="path", default="")
+    @summarization_gene_expression.param("index", _in="path", default=0)
+    def put(self, upload_id="", index=0):
+        """Receives one chunk of an upload as the request body, with its SHA-256 in the X-Chunk-Sha256 header"""
+        key = request.headers.get("X-Api-Key")
+        if SummarizationGeneExpressionUtils.validate_api_key(key) is not True:
+            return BARUtils.error_exit("Invalid API key")
+        upload = SummarizationGeneExpressionUtils.get_upload(key, upload_id)
+        if upload is None:
+            return BARUtils.error_exit("Upload not found"), 404
+
+        try:
+            ChunkedUpload.write_chunk(
+                SummarizationGeneExpressionUtils.get_user_dir(key),
+                upload,
+                index,
+                request.stream,
+                request.headers.get("X-Chunk-Sha256"),
+            )
+        except ValueError as e:
+            return BARUtils.error_exit(str(e)), 400
+        return BARUtils.success_exit(index)
+
+
+@summarization_gene_expression.route(
+    "/upload/<string:upload_id>/complete", methods=["POST"], doc=False
+)
+class SummarizationGeneExpressionUploadComplete(Resource):
+    @summarization_gene_expression.param("upload_id", _in="path", default="")
+    def post(self, upload_id=""):
+        """Finishes an upload once all chunks are received and queues it for conversion and insertion"""
+        key = request.headers.get("X-Api-Key")
+        if SummarizationGeneExpressionUtils.validate_api_key(key) is not True:
+            return BARUtils.error_exit("Invalid API key")
+        upload = SummarizationGeneExpressionUtils.get_upload(key, upload_id)
+        if upload is None:
+            return BARUtils.error_exit("Upload not found"), 404
+
+        user_dir = SummarizationGeneExpressionUtils.get_user_dir(key)
+        options = upload["options"]
+        # The file is moved under a generated name, as the name of the upload may be empty
+        # or the name of a directory. The name of the upload is kept in its options.
+        target = os.path.join(user_dir, "." + upload["upload_id"] + ".tmp")
+        try:
+            chunk_digests = ChunkedUpload.complete(user_dir, upload, target)
+        except ValueError as e:
+            return BARUtils.error_exit(str(e)), 400
+        # The chunks were hashed as they were received, so the file is not read again
+        digest = UploadContent.get_digest(chunk_digests)
+        path = UploadContent.save_file(user_dir, target, options["type"], digest)
+
+        if SummarizationGeneExpressionUtils.decrement_uses(key):
+            try:
+                job_id = SummarizationGeneExpressionUtils.queue_upload(
+                    options["type"],
+                    key,
+                    path,
+                    options["overwrite"],
+                    options["email"],
+                    digest,
+                    options.get("name", upload["filename"]),
+                )
+            except requests.RequestException:
+                return BARUtils.error_exit("Workflow server is not available"), 503
+            except SQLAlchemyError:
+                return BARUtils.error_exit("Internal server error"), 500
+            return BARUtils.success_exit(job_id)
+        else:
+            return BARUtils.error_exit("Invalid API key")
+
+
 @summarization_gene_expression.route("/insert", methods=["POST"], doc=False)
 class SummarizationGeneExpressionInsert(Resource):
     def post(self):
-        """This function adds a CSV's data to the database. This is only called by the Cromwell server after receiving the user's file."""
+        """This function adds a CSV's data to the database. This is only called by the Cromwell server after receiving the user's file.
+        With overwrite set to replace, the table is replaced atomically. Otherwise the data are appended."""
         if request.remote_addr != "127.0.0.1":
             return BARUtils.error_exit("Forbidden"), 403
         if request.method == "POST":
@@ -340,12 +935,15 @@ class SummarizationGeneExpressionInsert(Resource):
             if SummarizationGeneExpressionUtils.decrement_uses(key):
                 csv = request.get_json()["csv"]
                 db_id = request.get_json()["uid"]
-                df = pandas.read_csv(csv)
+                overwrite = request.get_json().get("overwrite", "append")
                 db_id = db_id.split(".")[0]
-                df = df.melt(id_vars=["Gene"], var_name="Sample", value_name="Value")
                 db_id = db_id.split("/")[len(db_id.split("/")) - 1]
-                con = db.get_engine(bind="summarization")
-                df.to_sql(db_id, con, if_exists="append", index=True)
+                if not SummarizationGeneExpressionUtils.is_valid(db_id):
+                    return BARUtils.error_exit("Invalid table ID"), 400
+
+                if overwrite not in ["replace", "append"]:
+                    return BARUtils.error_exit("Invalid overwrite mode"), 400
+                SummarizationGeneExpressionUtils.insert_csv(db_id, csv, overwrite)
                 return BARUtils.success_exit("Success")
             else:
                 return BARUtils.error_exit("Invalid API key")
@@ -368,6 +966,18 @@ class SummarizationGeneExpressionValue(Resource):
         else:
             key = request.headers.get("X-Api-Key")
             if SummarizationGeneExpressionUtils.decrement_uses(key):
+                # Tables in the compressed store are read one gene row at a time
+                matrix = SummarizationGeneExpressionUtils.load_compressed(table_id)
+                if matrix is not None:
+                    if sample == "":
+                        values = matrix.get_values(gene)
+                        mimetype = PayloadUtils.get_binary_mimetype()
+                        if mimetype and len(values) > 0:
+                            return PayloadUtils.gene_response(gene, values, mimetype)
+                    else:
+                        values = list(matrix.get_values(gene, sample).values())
+                    return BARUtils.success_exit(values)
+
                 con = db.get_engine(bind="summarization")
                 tbl = SummarizationGeneExpressionUtils.get_table_object(table_id)
                 if sample == "":
@@ -380,6 +990,9 @@ class SummarizationGeneExpressionValue(Resource):
                         return BARUtils.error_exit("Internal server error"), 500
                     for row in rows:
                         values.update({str(row.Sample): float(row.Value)})
+                    mimetype = PayloadUtils.get_binary_mimetype()
+                    if mimetype and len(values) > 0:
+                        return PayloadUtils.gene_response(gene, values, mimetype)
                 else:
                     values = []
                     try:
@@ -396,19 +1009,204 @@ class SummarizationGeneExpressionValue(Resource):
                 return BARUtils.error_exit("Invalid API key")
 
 
+@summarization_gene_expression.route("/matrix/<string:table_id>", methods=["POST"])
+class SummarizationGeneExpressionMatrix(Resource):
+    @summarization_gene_expression.param("table_id", _in="path", default="test")
+    @summarization_gene_expression.expect(matrix_request_fields)
+    def post(self, table_id=""):
+        """Returns a gene x sample matrix for lists of genes and samples. One request uses one API key use."""
+        if not SummarizationGeneExpressionUtils.is_valid(table_id):
+            return BARUtils.error_exit("Invalid table ID"), 400
+
+        try:
+            json_data = SummarizationMatrixSchema().load(request.get_json())
+        except ValidationError as err:
+            return BARUtils.error_exit(err.messages), 400
+        for gene in json_data["genes"]:
+            if not BARUtils.is_arabidopsis_gene_valid(gene):
+                return BARUtils.error_exit("Invalid gene ID"), 400
+
+        key = request.headers.get("X-Api-Key")
+        if SummarizationGeneExpressionUtils.decrement_uses(key):
+            try:
+                matrix = SummarizationGeneExpressionUtils.get_matrix(
+                    table_id, json_data["genes"], json_data.get("samples")
+                )
+            except SQLAlchemyError:
+                return BARUtils.error_exit("Internal server error"), 500
+            if matrix is None:
+                return BARUtils.error_exit(
+                    "There are no data found for the given genes"
+                )
+
+            mimetype = PayloadUtils.get_binary_mimetype()
+            if mimetype:
+                return PayloadUtils.matrix_response(
+                    matrix["genes"], matrix["samples"], matrix["values"], mimetype
+                )
+            return BARUtils.success_exit(matrix)
+        else:
+            return BARUtils.error_exit("Invalid API key")
+
+
+@summarization_gene_expression.route(
+    "/coexpression/<string:table_id>/<string:gene>", methods=["GET"]
+)
+class SummarizationGeneExpressionCoexpression(Resource):
+    @summarization_gene_expression.param("table_id", _in="path", default="test")
+    @summarization_gene_expression.param("gene", _in="path", default="At1g01010")
+    @summarization_gene_expression.param("method", _in="query", default="pearson")
+    @summarization_gene_expression.param(
+        "top_n", _in="query", default=COEXPRESSION_DEFAULT_TOP_N
+    )
+    def get(self, table_id="", gene=""):
+        """Returns the genes most correlated with a given gene across all samples of the table"""
+        method = request.args.get("method", "pearson")
+        top_n = request.args.get("top_n", str(COEXPRESSION_DEFAULT_TOP_N))
+        if not SummarizationGeneExpressionUtils.is_valid(table_id):
+            return BARUtils.error_exit("Invalid table ID"), 400
+        if method not in CORRELATION_METHODS:
+            return BARUtils.error_exit("Invalid method"), 400
+        if not BARUtils.is_integer(top_n):
+            return BARUtils.error_exit("Invalid number of genes"), 400
+        top_n = min(int(top_n), COEXPRESSION_MAX_TOP_N)
+
+        key = request.headers.get("X-Api-Key")
+        if SummarizationGeneExpressionUtils.decrement_uses(key):
+            try:
+                matrix = SummarizationGeneExpressionUtils.get_matrix_object(table_id)
+            except SQLAlchemyError:
+                return BARUtils.error_exit("Internal server error"), 500
+            if matrix is None:
+                return BARUtils.error_exit("Table not found"), 404
+            correlated = matrix.correlate(gene, method, top_n)
+            if correlated is None:
+                return BARUtils.error_exit("Gene not found"), 404
+            return BARUtils.success_exit(
+                {
+                    "gene": gene.upper(),
+                    "method": method,
+                    "genes": [row[0] for row in correlated],
+                    "values": [row[1] for row in correlated],
+                }
+            )
+        else:
+            return BARUtils.error_exit("Invalid API key")
+
+
+@summarization_gene_expression.route(
+    "/differential/<string:table_id>", methods=["POST"]
+)
+class SummarizationGeneExpressionDifferential(Resource):
+    @summarization_gene_expression.param("table_id", _in="path", default="test")
+    @summarization_gene_expression.expect(differential_request_fields)
+    def post(self, table_id=""):
+        """Returns the genes that differ most between two groups of samples, by Welch's t-test.
+        Fold changes are log2((mean1 + 1) / (mean2 + 1)). One request uses one API key use."""
+        if not SummarizationGeneExpressionUtils.is_valid(table_id):
+            return BARUtils.error_exit("Invalid table ID"), 400
+
+        try:
+            json_data = SummarizationDifferentialSchema().load(request.get_json())
+        except ValidationError as err:
+            return BARUtils.error_exit(err.messages), 400
+        group1 = list(dict.fromkeys(json_data["group1"]))
+        group2 = list(dict.fromkeys(json_data["group2"]))
+        if set(group1) & set(group2):
+            return BARUtils.error_exit("Groups must not share samples"), 400
+        top_n = json_data.get("top_n", DIFFERENTIAL_DEFAULT_TOP_N)
+
+        key = request.headers.get("X-Api-Key")
+        if SummarizationGeneExpressionUtils.decrement_uses(key):
+            try:
+                results = SummarizationGeneExpressionUtils.get_differential(
+                    table_id, group1, group2
+                )
+            except SQLAlchemyError:
+                return BARUtils.error_exit("Internal server error"), 500
+            except ValueError as e:
+                return BARUtils.error_exit(str(e)), 400
+            if results is None:
+                return BARUtils.error_exit("Table not found"), 404
+
+            results = results[:top_n]
+            return BARUtils.success_exit(
+                {
+                    "genes": [row[0] for row in results],
+                    "mean1": [row[1] for row in results],
+                    "mean2": [row[2] for row in results],
+                    "log2_fold_change": [row[3] for row in results],
+                    "t": [row[4] for row in results],
+                    "df": [row[5] for row in results],
+                }
+            )
+        else:
+            return BARUtils.error_exit("Invalid API key")
+
+
+@summarization_gene_expression.route("/store/export/<string:table_id>", doc=False)
+class SummarizationGeneExpressionStoreExport(Resource):
+    @summarization_gene_expression.param("table_id", _in="path", default="test")
+    def post(self, table_id=""):
+        """Exports the table to the shared memory-mapped expression store"""
+        if request.remote_addr != "127.0.0.1":
+            return BARUtils.error_exit("Forbidden"), 403
+        if not SummarizationGeneExpressionUtils.is_valid(table_id):
+            return BARUtils.error_exit("Invalid table ID"), 400
+        root = ExpressionStore.get_root()
+        if root is None:
+            return BARUtils.error_exit("Expression store is not configured"), 500
+
+        try:
+            matrix = SummarizationGeneExpressionUtils.load_matrix(table_id)
+        except SQLAlchemyError:
+            return BARUtils.error_exit("Internal server error"), 500
+        if matrix is None:
+            return BARUtils.error_exit("Table not found"), 404
+        version = ExpressionStore.export(root, "summarization_" + table_id, matrix)
+        return BARUtils.success_exit(version)
+
+
+@summarization_gene_expression.route("/compressed/export/<string:table_id>", doc=False)
+class SummarizationGeneExpressionCompressedExport(Resource):
+    @summarization_gene_expression.param("table_id", _in="path", default="test")
+    def post(self, table_id=""):
+        """Writes the table to the compressed store. Reads of the table then use the compressed file."""
+        if request.remote_addr != "127.0.0.1":
+            return BARUtils.error_exit("Forbidden"), 403
+        if not SummarizationGeneExpressionUtils.is_valid(table_id):
+            return BARUtils.error_exit("Invalid table ID"), 400
+        root = CompressedStore.get_root()
+        if root is None:
+            return BARUtils.error_exit("Compressed store is not configured"), 500
+
+        try:
+            matrix = SummarizationGeneExpressionUtils.load_matrix(table_id)
+        except SQLAlchemyError:
+            return BARUtils.error_exit("Internal server error"), 500
+        if matrix is None:
+            return BARUtils.error_exit("Table not found"), 404
+        size = CompressedStore.write(root, table_id, matrix)
+        GeneIndex.invalidate("summarization_" + table_id)
+        return BARUtils.success_exit({"bytes": size})
+
+
 @summarization_gene_expression.route("/samples/<string:table_id>")
 class SummarizationGeneExpressionSamples(Resource):
     @summarization_gene_expression.param("table_id", _in="path", default="test")
     def get(self, table_id=""):
         """Returns the list of samples in the table with the given ID"""
-        con = db.get_engine(bind="summarization")
-        tbl = SummarizationGeneExpressionUtils.get_table_object(table_id)
-        values = []
+        if not SummarizationGeneExpressionUtils.is_valid(table_id):
+            return BARUtils.error_exit("Invalid table ID"), 400
+        matrix = SummarizationGeneExpressionUtils.load_compressed(table_id)
+        if matrix is not None:
+            return BARUtils.success_exit(matrix.samples)
         try:
-            rows = con.execute(db.select([tbl.c.Sample]).distinct())
+            values = TableCatalogUtils.get_samples(table_id)
         except SQLAlchemyError:
             return BARUtils.error_exit("Internal server error"), 500
-        [values.append(row.Sample) for row in rows]
+        if values is None:
+            return BARUtils.error_exit("Table not found"), 404
         return BARUtils.success_exit(values)
 
 
@@ -418,15 +1216,18 @@ class SummarizationGeneExpressionGenes(Resource):
     def get(self, table_id=""):
         """Returns the list of genes in the table with the given ID"""
         key = request.headers.get("x-api-key")
+        if not SummarizationGeneExpressionUtils.is_valid(table_id):
+            return BARUtils.error_exit("Invalid table ID"), 400
         if SummarizationGeneExpressionUtils.decrement_uses(key):
-            con = db.get_engine(bind="summarization")
-            tbl = SummarizationGeneExpressionUtils.get_table_object(table_id)
-            values = []
+            matrix = SummarizationGeneExpressionUtils.load_compressed(table_id)
+            if matrix is not None:
+                return BARUtils.success_exit(matrix.genes)
             try:
-                rows = con.execute(db.select([tbl.c.Gene]).distinct())
+                values = TableCatalogUtils.get_genes(table_id)
             except SQLAlchemyError:
                 return BARUtils.error_exit("Internal server error"), 500
-            [values.append(row.Gene) for row in rows]
+            if values is None:
+                return BARUtils.error_exit("Table not found"), 404
             return BARUtils.success_exit(values)
         else:
             return BARUtils.error_exit("Invalid API key")
@@ -438,21 +1239,32 @@ class SummarizationGeneExpressionGenes(Resource):
 class SummarizationGeneExpressionFindGene(Resource):
     @summarization_gene_expression.param("table_id", _in="path", default="test")
     @summarization_gene_expression.param("user_string", _in="path", default="AT1G")
+    @summarization_gene_expression.param(
+        "limit", _in="query", default=FIND_GENE_DEFAULT_LIMIT
+    )
     def get(self, table_id="", user_string=""):
-        """Returns all genes that contain a given string as part of their name"""
-        con = db.get_engine(bind="summarization")
-        tbl = SummarizationGeneExpressionUtils.get_table_object(table_id)
-        values = []
+        """Returns the genes that contain a given string as part of their name.
+        Exact and prefix matches are listed first."""
+        limit = request.args.get("limit", str(FIND_GENE_DEFAULT_LIMIT))
+        if not SummarizationGeneExpressionUtils.is_valid(table_id):
+            return BARUtils.error_exit("Invalid table ID"), 400
+        if not BARUtils.is_integer(limit) or int(limit) < 1:
+            return BARUtils.error_exit("Invalid limit"), 400
+        limit = min(int(limit), FIND_GENE_MAX_LIMIT)
+
         try:
-            rows = con.execute(
-                db.select([tbl.c.Gene])
-                .where(tbl.c.Gene.contains(user_string))
-                .distinct()
+            # Indexes follow the catalog version, so inserts in other processes are seen
+            catalog = TableCatalogUtils.get_table(table_id)
+            if catalog is None:
+                return BARUtils.success_exit([])
+            index = GeneIndex.get_cached(
+                "summarization_" + table_id,
+                lambda: SummarizationGeneExpressionUtils.load_genes(table_id),
+                catalog.last_modified.timestamp(),
             )
         except SQLAlchemyError:
             return BARUtils.error_exit("Internal server error"), 500
-        [values.append(row.Gene) for row in rows]
-        return BARUtils.success_exit(values)
+        return BARUtils.success_exit(index.search(user_string, limit))
 
 
 @summarization_gene_expression.route("/table_exists/<string:table_id>")
@@ -460,11 +1272,38 @@ class SummarizationGeneExpressionTableExists(Resource):
     @summarization_gene_expression.param("table_id", _in="path", default="test")
     def get(self, table_id=""):
         """Checks if a given table exists"""
-        con = db.get_engine(bind="summarization")
-        if inspect(con).has_table(table_id):
-            return BARUtils.success_exit(True)
-        else:
+        if not SummarizationGeneExpressionUtils.is_valid(table_id):
             return BARUtils.success_exit(False)
+        try:
+            catalog = TableCatalogUtils.get_table(table_id)
+        except SQLAlchemyError:
+            return BARUtils.error_exit("Internal server error"), 500
+        return BARUtils.success_exit(catalog is not None)
+
+
+@summarization_gene_expression.route("/table_info/<string:table_id>")
+class SummarizationGeneExpressionTableInfo(Resource):
+    @summarization_gene_expression.param("table_id", _in="path", default="test")
+    def get(self, table_id=""):
+        """Returns the number of rows, genes and samples of a table and when it was last modified"""
+        if not SummarizationGeneExpressionUtils.is_valid(table_id):
+            return BARUtils.error_exit("Invalid table ID"), 400
+        try:
+            catalog = TableCatalogUtils.get_table(table_id)
+            if catalog is None:
+                return BARUtils.error_exit("Table not found"), 404
+            genes = TableCatalogUtils.get_genes(table_id)
+            samples = TableCatalogUtils.get_samples(table_id)
+        except SQLAlchemyError:
+            return BARUtils.error_exit("Internal server error"), 500
+        return BARUtils.success_exit(
+            {
+                "row_count": catalog.row_count,
+                "gene_count": len(genes),
+                "sample_count": len(samples),
+                "last_modified": catalog.last_modified.isoformat(),
+            }
+        )
 
 
 @summarization_gene_expression.route("/drop_table/<string:table_id>", doc=False)
@@ -474,8 +1313,21 @@ class SummarizationGeneExpressionDropTable(Resource):
         """Drops the table with the given ID"""
         if request.remote_addr != "127.0.0.1":
             return BARUtils.error_exit("Forbidden"), 403
-        tbl = SummarizationGeneExpressionUtils.get_table_object(table_id)
-        tbl.drop()
+        if not SummarizationGeneExpressionUtils.is_valid(table_id):
+            return BARUtils.error_exit("Invalid table ID"), 400
+        try:
+            tbl = SummarizationGeneExpressionUtils.get_table_object(table_id)
+        except NoSuchTableError:
+            return BARUtils.error_exit("Table not found"), 404
+        tbl.drop(bind=db.get_engine(bind="summarization"))
+        SummarizationGeneExpressionUtils.invalidate_table(table_id)
+        TableCatalogUtils.remove(table_id)
+        CompressedStore.remove(CompressedStore.get_root(), table_id)
+        ExpressionStore.remove(ExpressionStore.get_root(), "summarization_" + table_id)
+        ExpressionMatrix.invalidate("summarization_" + table_id)
+        GeneIndex.invalidate("summarization_" + table_id)
+        SummarizationGeneExpressionUtils.invalidate_differential(table_id)
+        UploadContent.forget(table_id)
 
 
 @summarization_gene_expression.route("/save", methods=["POST"], doc=False)
@@ -495,10 +1347,14 @@ class SummarizationGeneExpressionSave(Resource):
                         extension = ".svg"
                     else:
                         return BARUtils.error_exit("Invalid file type"), 400
-                    filename = os.path.join(
-                        DATA_FOLDER, api_key, file.filename + extension
+                    name = file.filename + extension
+                    if not UserFileStore.is_valid_name(name):
+                        return BARUtils.error_exit("Invalid file name"), 400
+                    UserFileStore.save(
+                        SummarizationGeneExpressionUtils.get_file_dir(api_key),
+                        name,
+                        file.stream,
                     )
-                    file.save(filename)
                     return BARUtils.success_exit(True)
                 else:
                     return BARUtils.error_exit("No file attached"), 400
@@ -512,10 +1368,12 @@ class SummarizationGeneExpressionGetFileList(Resource):
         """Returns a list of files stored in the user's folder"""
         if request.method == "POST":
             api_key = request.headers.get("x-api-key")
-            files = []
-            if os.path.exists(os.path.join(DATA_FOLDER, api_key)):
-                for file in os.walk(os.path.join(DATA_FOLDER, api_key)):
-                    files.append(file[2])
+            if api_key is None:
+                return BARUtils.error_exit("Invalid API key"), 403
+            files = UserFileStore.list_files(
+                SummarizationGeneExpressionUtils.get_file_dir(api_key)
+            )
+            if files is not None:
                 return BARUtils.success_exit(files)
             else:
                 return BARUtils.error_exit("No folder found")
@@ -525,14 +1383,60 @@ class SummarizationGeneExpressionGetFileList(Resource):
 class SummarizationGeneExpressionGetFile(Resource):
     @summarization_gene_expression.param("file_id", _in="path", default="test")
     def get(self, file_id):
-        """Returns a specific file stored in the user's folder"""
+        """Returns a specific file stored in the user's folder. Large files are sent gzip-compressed
+        to clients that accept it. Range and conditional requests are supported."""
         if request.method == "GET":
             api_key = request.headers.get("x-api-key")
-            filename = os.path.join(DATA_FOLDER, api_key, file_id)
-            if os.path.isfile(filename):
-                return send_file(filename)
-            else:
+            if api_key is None:
+                return BARUtils.error_exit("Invalid API key"), 403
+            user_dir = SummarizationGeneExpressionUtils.get_file_dir(api_key)
+            entry = UserFileStore.get(user_dir, file_id)
+            path = None if entry is None else os.path.join(user_dir, entry["stored"])
+            if path is None or not os.path.isfile(path):
                 return BARUtils.error_exit("File not found"), 404
+            mimetype = mimetypes.guess_type(file_id)[0] or "application/octet-stream"
+
+            # The web server sends the file, and negotiates the encoding
+            accel_prefix = UserFileStore.get_accel_prefix()
+            if accel_prefix:
+                response = current_app.response_class(mimetype=mimetype)
+                response.headers["X-Accel-Redirect"] = "/".join(
+                    [
+                        accel_prefix.rstrip("/"),
+                        quote(os.path.basename(user_dir)),
+                        quote(file_id),
+                    ]
+                )
+                return response
+
+            if entry["encoding"] != "gzip":
+                return send_file(
+                    path,
+                    mimetype=mimetype,
+                    etag=entry["sha256"],
+                    last_modified=entry["mtime"],
+                    conditional=True,
+                )
+            if request.accept_encodings["gzip"]:
+                response = send_file(
+                    path,
+                    mimetype=mimetype,
+                    etag=entry["sha256"] + "-gzip",
+                    last_modified=entry["mtime"],
+                    conditional=True,
+                )
+                response.headers["Content-Encoding"] = "gzip"
+            else:
+                # Rare clients without gzip get the file decompressed on the fly, without ranges
+                response = send_file(
+                    gzip.open(path, "rb"),
+                    mimetype=mimetype,
+                    etag=entry["sha256"],
+                    last_modified=entry["mtime"],
+                    conditional=True,
+                )
+            response.vary.add("Accept-Encoding")
+            return response
 
 
 @summarization_gene_expression.route("/clean_svg")
@@ -8,6 +8,9 @@ thalemine = Namespace(
     "ThaleMine", description="ThaleMine API client", path="/thalemine"
 )
 
+# Seconds to wait for ThaleMine
+REQUEST_TIMEOUT = 30
+
 # Request header of almost all ThaleMine Requests
 request_headers = {
     "user-agent": "BAR API",
@@ -40,6 +43,7 @@ class ThaleMineGeneRIFs(Resource):
             "https://bar.utoronto.ca/thalemine/service/query/results",
             data=payload,
             headers=request_headers,
+            timeout=REQUEST_TIMEOUT,
         )
 
         return resp.json()
@@ -72,6 +76,7 @@ class ThaleMinePublications(Resource):
             "https://bar.utoronto.ca/thalemine/service/query/results",
             data=payload,
             headers=request_headers,
+            timeout=REQUEST_TIMEOUT,
         )
 
         return resp.json()
@@ -0,0 +1,136 @@
+import os
+import threading
+import time
+import redis.exceptions
+from api.models.summarization import Users
+from api.utils.bar_utils import BARUtils
+from api.utils.usage_meter import UsageMeter
+
+# Cached keys are read again from the database after this many seconds
+API_KEY_CACHE_TTL = 30
+
+# The cache is emptied if it grows beyond this many keys
+API_KEY_CACHE_SIZE = 10000
+
+# Redis channel for keys that are created, changed or revoked. "*" empties all caches.
+INVALIDATION_CHANNEL = "BAR_API_api_key_invalidation"
+
+# Seconds to wait before subscribing again after losing the Redis connection
+LISTENER_RETRY = 30
+
+REVOKED_STATUS = "revoked"
+
+
+class ApiKeyCache:
+    """Per process cache of API key status and uses left.
+    Entries are dropped after API_KEY_CACHE_TTL or when an invalidation is published.
+    """
+
+    # key: (time loaded, None if the key does not exist or dict of status and uses_left)
+    entries = {}
+    entries_lock = threading.Lock()
+    listener_pid = None
+
+    @staticmethod
+    def get(key):
+        """Get the status and uses left of a key
+        :param key: API key
+        :return: dict of status and uses_left, or None if the key does not exist
+        """
+        ApiKeyCache.start_listener()
+
+        entry = ApiKeyCache.entries.get(key)
+        if entry and entry[0] > time.time() - API_KEY_CACHE_TTL:
+            return entry[1]
+
+        row = Users.query.with_entities(Users.status).filter_by(api_key=key).first()
+        if row is None:
+            user = None
+        else:
+            user = {"status": row.status, "uses_left": UsageMeter.get_remaining(key)}
+
+        with ApiKeyCache.entries_lock:
+            if len(ApiKeyCache.entries) >= API_KEY_CACHE_SIZE:
+                ApiKeyCache.entries.clear()
+            ApiKeyCache.entries[key] = (time.time(), user)
+        return user
+
+    @staticmethod
+    def is_valid(key):
+        """Check if a key exists, is not revoked and has uses left
+        :param key: API key
+        :return: bool
+        """
+        if key is None:
+            return False
+        user = ApiKeyCache.get(key)
+        return (
+            user is not None
+            and user["status"] != REVOKED_STATUS
+            and user["uses_left"] is not None
+            and user["uses_left"] > 0
+        )
+
+    @staticmethod
+    def record_use(key, used):
+        """Update the cached uses left after the meter accepted or rejected a use
+        :param key: API key
+        :param used: True if the use was accepted
+        """
+        with ApiKeyCache.entries_lock:
+            entry = ApiKeyCache.entries.get(key)
+            if entry and entry[1] and entry[1]["uses_left"] is not None:
+                user = dict(entry[1])
+                user["uses_left"] = user["uses_left"] - 1 if used else 0
+                ApiKeyCache.entries[key] = (entry[0], user)
+
+    @staticmethod
+    def invalidate(key=None):
+        """Drop a key from the cache of this process
+        :param key: API key, or None to drop all keys
+        """
+        with ApiKeyCache.entries_lock:
+            if key is None:
+                ApiKeyCache.entries.clear()
+            else:
+                ApiKeyCache.entries.pop(key, None)
+
+    @staticmethod
+    def publish_invalidation(key):
+        """Drop a key from the caches of all processes
+        :param key: API key
+        """
+        ApiKeyCache.invalidate(key)
+        try:
+            BARUtils.connect_redis().publish(INVALIDATION_CHANNEL, key)
+        except redis.exceptions.ConnectionError:
+            # Other processes will read the key again after API_KEY_CACHE_TTL
+            pass
+
+    @staticmethod
+    def start_listener():
+        """Start the invalidation listener of this process, once per worker process"""
+        if ApiKeyCache.listener_pid == os.getpid():
+            return
+        with ApiKeyCache.entries_lock:
+            if ApiKeyCache.listener_pid == os.getpid():
+                return
+            ApiKeyCache.listener_pid = os.getpid()
+        threading.Thread(target=ApiKeyCache.listen, daemon=True).start()
+
+    @staticmethod
+    def listen():
+        """Drop keys from the cache as invalidations are published"""
+        while True:
+            try:
+                pubsub = BARUtils.connect_redis().pubsub(ignore_subscribe_messages=True)
+                pubsub.subscribe(INVALIDATION_CHANNEL)
+
+                # Invalidations may have been missed while not subscribed
+                ApiKeyCache.invalidate()
+
+                for message in pubsub.listen():
+                    key = message["data"].decode("utf-8")
+                    ApiKeyCache.invalidate(None if key == "*" else key)
+            except redis.exceptions.ConnectionError:
+                time.sleep(LISTENER_RETRY)
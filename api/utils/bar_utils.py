@@ -1,6 +1,16 @@
 import re
 import redis
 import os
+from cryptography.fernet import Fernet
+from smtplib import SMTP_SSL
+from ssl import create_default_context
+from email.mime.multipart import MIMEMultipart
+from email.mime.text import MIMEText
+
+# Account that BAR notifications are sent from
+SENDER_EMAIL = "bar.summarization@gmail.com"
+SMTP_SERVER = "smtp.gmail.com"
+SMTP_PORT = 465
 
 
 class BARUtils:
@@ -153,3 +163,27 @@ class BARUtils:
         )
 
         return r
+
+    @staticmethod
+    def send_email(recipient, subject, text):
+        """Send a plain text email from the BAR summarization account
+        :param recipient: email address
+        :param subject: subject of the email
+        :param text: body of the email
+        """
+        cipher_suite = Fernet(os.environ.get("EMAIL_PASS_KEY"))
+        with open(os.environ.get("EMAIL_PASS_FILE"), "rb") as f:
+            for line in f:
+                encrypted_key = line
+        password = bytes(cipher_suite.decrypt(encrypted_key)).decode("utf-8")
+
+        msg = MIMEMultipart()
+        msg["From"] = SENDER_EMAIL
+        msg["To"] = recipient
+        msg["Subject"] = subject
+        msg.attach(MIMEText(text, _subtype="plain", _charset="UTF-8"))
+        with SMTP_SSL(
+            SMTP_SERVER, SMTP_PORT, context=create_default_context()
+        ) as server:
+            server.login(SENDER_EMAIL, password)
+            server.sendmail(SENDER_EMAIL, recipient, msg.as_string())
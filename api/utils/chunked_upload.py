@@ -0,0 +1,177 @@
+import hashlib
+import json
+import os
+import shutil
+import time
+import uuid
+
+# Size of each chunk, except the last one
+UPLOAD_CHUNK_SIZE = 8 * 1024 * 1024
+
+# Largest file that can be uploaded
+MAX_UPLOAD_SIZE = 4 * 1024 * 1024 * 1024
+
+# Bytes read from the request at a time
+STREAM_BLOCK_SIZE = 64 * 1024
+
+# Unfinished uploads are removed after this many seconds without a new chunk
+UPLOAD_TTL = 86400
+
+
+class ChunkedUpload:
+    """Resumable uploads in chunks.
+
+    Each upload is kept in <user dir>/.uploads/<upload_id>/ as:
+        upload.json: file name, size, chunk size and upload options
+        data: the file, written in place at the offset of each chunk
+        <index>.done: SHA-256 of each chunk that was received and checked
+    Chunks can be sent in any order, in parallel and again after an interruption.
+    """
+
+    @staticmethod
+    def get_dir(user_dir, upload_id):
+        """Get the directory of an upload
+        :param user_dir: directory of the user's files
+        :param upload_id: upload ID
+        :return: path
+        """
+        return os.path.join(user_dir, ".uploads", upload_id)
+
+    @staticmethod
+    def initiate(user_dir, filename, size, options):
+        """Start an upload
+        :param user_dir: directory of the user's files
+        :param filename: name of the file
+        :param size: size of the file in bytes
+        :param options: dict of options used when the upload is complete
+        :return: dict with the upload ID, chunk size and number of chunks
+        """
+        if size < 1 or size > MAX_UPLOAD_SIZE:
+            raise ValueError("Invalid file size")
+        ChunkedUpload.clean(user_dir)
+
+        upload_id = uuid.uuid4().hex
+        path = ChunkedUpload.get_dir(user_dir, upload_id)
+        os.makedirs(path)
+        upload = {
+            "upload_id": upload_id,
+            "filename": filename,
+            "size": size,
+            "chunk_size": UPLOAD_CHUNK_SIZE,
+            "chunks": (size + UPLOAD_CHUNK_SIZE - 1) // UPLOAD_CHUNK_SIZE,
+            "options": options,
+        }
+        with open(os.path.join(path, "upload.json"), "w") as f:
+            json.dump(upload, f)
+        # Sparse file of the final size, so chunks can be written at their offset
+        with open(os.path.join(path, "data"), "wb") as f:
+            f.truncate(size)
+        return upload
+
+    @staticmethod
+    def load(user_dir, upload_id):
+        """Get an upload
+        :param user_dir: directory of the user's files
+        :param upload_id: upload ID
+        :return: dict of the upload, or None if it does not exist
+        """
+        try:
+            with open(
+                os.path.join(ChunkedUpload.get_dir(user_dir, upload_id), "upload.json")
+            ) as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return None
+
+    @staticmethod
+    def write_chunk(user_dir, upload, index, stream, checksum):
+        """Write a chunk from a stream and check its SHA-256
+        :param user_dir: directory of the user's files
+        :param upload: dict of the upload
+        :param index: chunk index, from 0
+        :param stream: file object of the chunk data
+        :param checksum: hex SHA-256 of the chunk
+        """
+        if index < 0 or index >= upload["chunks"]:
+            raise ValueError("Invalid chunk index")
+        offset = index * upload["chunk_size"]
+        length = min(upload["chunk_size"], upload["size"] - offset)
+        path = ChunkedUpload.get_dir(user_dir, upload["upload_id"])
+        done = os.path.join(path, str(index) + ".done")
+
+        # A chunk sent again is only counted once it is checked again
+        if os.path.exists(done):
+            os.remove(done)
+
+        sha256 = hashlib.sha256()
+        written = 0
+        fd = os.open(os.path.join(path, "data"), os.O_WRONLY)
+        try:
+            while True:
+                block = stream.read(min(STREAM_BLOCK_SIZE, length + 1 - written))
+                if not block:
+                    break
+                written += len(block)
+                if written > length:
+                    break
+                sha256.update(block)
+                os.pwrite(fd, block, offset + written - len(block))
+        finally:
+            os.close(fd)
+
+        if written != length:
+            raise ValueError("Invalid chunk size")
+        if checksum is None or sha256.hexdigest() != checksum.lower():
+            raise ValueError("Checksum mismatch")
+        with open(done + ".tmp", "w") as f:
+            f.write(sha256.hexdigest())
+        os.replace(done + ".tmp", done)
+
+    @staticmethod
+    def get_received(user_dir, upload):
+        """Get the chunks that were received and checked
+        :param user_dir: directory of the user's files
+        :param upload: dict of the upload
+        :return: sorted list of chunk indexes
+        """
+        path = ChunkedUpload.get_dir(user_dir, upload["upload_id"])
+        return sorted(
+            int(name[: -len(".done")])
+            for name in os.listdir(path)
+            if name.endswith(".done")
+        )
+
+    @staticmethod
+    def complete(user_dir, upload, target):
+        """Move a complete upload to its final path
+        :param user_dir: directory of the user's files
+        :param upload: dict of the upload
+        :param target: final path of the file
+        :return: list of the hex SHA-256 of each chunk, in order
+        """
+        if len(ChunkedUpload.get_received(user_dir, upload)) != upload["chunks"]:
+            raise ValueError("Missing chunks")
+        path = ChunkedUpload.get_dir(user_dir, upload["upload_id"])
+        chunk_digests = []
+        for index in range(upload["chunks"]):
+            with open(os.path.join(path, str(index) + ".done")) as f:
+                chunk_digests.append(f.read())
+        os.replace(os.path.join(path, "data"), target)
+        shutil.rmtree(path, ignore_errors=True)
+        return chunk_digests
+
+    @staticmethod
+    def clean(user_dir):
+        """Remove unfinished uploads that have not received a chunk in UPLOAD_TTL
+        :param user_dir: directory of the user's files
+        """
+        uploads = os.path.join(user_dir, ".uploads")
+        if not os.path.isdir(uploads):
+            return
+        for upload_id in os.listdir(uploads):
+            path = os.path.join(uploads, upload_id)
+            try:
+                if os.path.getmtime(path) < time.time() - UPLOAD_TTL:
+                    shutil.rmtree(path, ignore_errors=True)
+            except OSError:
+                pass
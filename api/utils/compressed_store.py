@@ -0,0 +1,205 @@
+import json
+import math
+import os
+import struct
+import threading
+import uuid
+import zlib
+import numpy
+
+# Last bytes of each file: length of the index, then the format name
+MAGIC = b"BARCMX01"
+FOOTER = struct.Struct("<Q8s")
+
+COMPRESSION_LEVEL = 6
+
+
+class CompressedMatrix:
+    """A gene x sample float32 matrix in a compressed file, read one gene row at a time.
+
+    The file is a sequence of compressed gene rows followed by a JSON index of the genes,
+    samples and the offset and length of each row. The bytes of each row are shuffled
+    (all first bytes, then all second bytes...) before compression, which compresses
+    floats much better. Rows that do not get smaller are stored uncompressed.
+    Reading a gene is one index lookup and one read.
+    """
+
+    def __init__(self, path):
+        self.fd = os.open(path, os.O_RDONLY)
+        stat = os.fstat(self.fd)
+        self.inode = stat.st_ino
+        index_length, magic = FOOTER.unpack(
+            os.pread(self.fd, FOOTER.size, stat.st_size - FOOTER.size)
+        )
+        if magic != MAGIC:
+            os.close(self.fd)
+            raise ValueError(path + " is not a compressed matrix")
+        index = json.loads(
+            os.pread(self.fd, index_length, stat.st_size - FOOTER.size - index_length)
+        )
+        self.genes = index["genes"]
+        self.samples = index["samples"]
+        self.offsets = index["offsets"]
+        self.gene_index = {gene.upper(): i for i, gene in enumerate(self.genes)}
+
+    def __del__(self):
+        # Readers may still use a matrix after it is replaced, so files are closed when unused
+        if getattr(self, "fd", None) is not None:
+            os.close(self.fd)
+            self.fd = None
+
+    @staticmethod
+    def compress_row(row):
+        """Compress the values of a gene. Rows that do not compress are stored as they are.
+        :param row: numpy array
+        :return: bytes
+        """
+        shuffled = (
+            numpy.ascontiguousarray(row, dtype="<f4")
+            .view(numpy.uint8)
+            .reshape(-1, 4)
+            .T.tobytes()
+        )
+        data = zlib.compress(shuffled, COMPRESSION_LEVEL)
+        return data if len(data) < len(shuffled) else shuffled
+
+    def decompress_row(self, data):
+        """Decompress the values of a gene
+        :param data: bytes
+        :return: numpy array
+        """
+        if len(data) != 4 * len(self.samples):
+            data = zlib.decompress(data)
+        shuffled = numpy.frombuffer(data, dtype=numpy.uint8)
+        return shuffled.reshape(4, -1).T.copy().view("<f4").ravel()
+
+    def get_row(self, gene):
+        """Get the values of a gene
+        :param gene: gene id
+        :return: numpy array or None if the gene is not in the matrix
+        """
+        i = self.gene_index.get(gene.upper())
+        if i is None:
+            return None
+        offset, length = self.offsets[i]
+        return self.decompress_row(os.pread(self.fd, length, offset))
+
+    def get_values(self, gene, sample=None):
+        """Get the values of a gene by sample, as stored in the database
+        :param gene: gene id
+        :param sample: sample name, or None for all samples
+        :return: dict of sample: value. Samples without a value are left out.
+        """
+        row = self.get_row(gene)
+        if row is None:
+            return {}
+        values = {}
+        for j, value in enumerate(row):
+            if math.isnan(value) or (sample is not None and self.samples[j] != sample):
+                continue
+            # str gives the shortest decimal of the float32, as read from the database
+            values[self.samples[j]] = float(str(value))
+        return values
+
+
+class CompressedStore:
+    """Compressed matrix files of summarization tables, one file per table: <root>/<name>.bcm
+    A new file is written beside the old one and renamed over it, so readers never see a partial file.
+    """
+
+    # Opened files of this process: (root, name): matrix
+    opened = {}
+    opened_lock = threading.Lock()
+
+    @staticmethod
+    def get_root():
+        """Get the store directory from the environment
+        :return: path or None if the store is not configured
+        """
+        return os.environ.get("COMPRESSED_STORE_PATH")
+
+    @staticmethod
+    def get_path(root, name):
+        """Get the file of a table
+        :param root: store directory
+        :param name: table name
+        :return: path
+        """
+        return os.path.join(root, name + ".bcm")
+
+    @staticmethod
+    def write(root, name, matrix):
+        """Write a matrix and make it the live file of a table
+        :param root: store directory
+        :param name: table name
+        :param matrix: ExpressionMatrix
+        :return: size of the file in bytes
+        """
+        path = CompressedStore.get_path(root, name)
+        tmp_path = path + "." + uuid.uuid4().hex[:8] + ".tmp"
+        os.makedirs(root, exist_ok=True)
+
+        offsets = []
+        try:
+            with open(tmp_path, "wb") as f:
+                for row in matrix.values:
+                    data = CompressedMatrix.compress_row(row)
+                    offsets.append([f.tell(), len(data)])
+                    f.write(data)
+                index = json.dumps(
+                    {
+                        "genes": [str(gene) for gene in matrix.genes],
+                        "samples": [str(sample) for sample in matrix.samples],
+                        "offsets": offsets,
+                    }
+                ).encode("utf-8")
+                f.write(index)
+                f.write(FOOTER.pack(len(index), MAGIC))
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(tmp_path, path)
+        except Exception:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            raise
+        return os.path.getsize(path)
+
+    @staticmethod
+    def load(root, name):
+        """Get the live file of a table. The file is opened again after it is replaced.
+        :param root: store directory
+        :param name: table name
+        :return: CompressedMatrix or None if the table is not in the store
+        """
+        if root is None:
+            return None
+        path = CompressedStore.get_path(root, name)
+        try:
+            inode = os.stat(path).st_ino
+        except OSError:
+            return None
+
+        with CompressedStore.opened_lock:
+            matrix = CompressedStore.opened.get((root, name))
+        if matrix and matrix.inode == inode:
+            return matrix
+
+        matrix = CompressedMatrix(path)
+        with CompressedStore.opened_lock:
+            CompressedStore.opened[(root, name)] = matrix
+        return matrix
+
+    @staticmethod
+    def remove(root, name):
+        """Remove the file of a table, after it is dropped
+        :param root: store directory
+        :param name: table name
+        """
+        if root is None:
+            return
+        with CompressedStore.opened_lock:
+            CompressedStore.opened.pop((root, name), None)
+        try:
+            os.remove(CompressedStore.get_path(root, name))
+        except FileNotFoundError:
+            pass
@@ -0,0 +1,359 @@
+import json
+import logging
+import os
+import threading
+import time
+import uuid
+import redis.exceptions
+import requests
+from api.utils.bar_utils import BARUtils
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_CROMWELL_URL = "http://localhost:3020"
+
+# Hash of each job: status, workflow, inputs, attempts, claimed, workflow_id and error
+JOB_KEY_PREFIX = "BAR_API_cromwell_job_"
+
+# List of jobs waiting to be submitted, oldest last
+QUEUE_KEY = "BAR_API_cromwell_queue"
+
+# List of jobs taken by a worker and not yet done
+PROCESSING_KEY = "BAR_API_cromwell_processing"
+
+# Sorted set of jobs waiting to be submitted again, by time of the next attempt
+RETRY_KEY = "BAR_API_cromwell_retry"
+
+# Set of submitted jobs that are not finished
+ACTIVE_KEY = "BAR_API_cromwell_active"
+
+# Set while a worker owns the next status poll
+POLL_LOCK_KEY = "BAR_API_cromwell_poll"
+
+# Status of active jobs is read from Cromwell at most this often (seconds)
+POLL_INTERVAL = 15
+
+# Jobs are forgotten after this many seconds
+JOB_TTL = 7 * 86400
+
+# Submissions are attempted this many times, waiting RETRY_DELAY seconds, doubled after each attempt
+SUBMIT_ATTEMPTS = 5
+RETRY_DELAY = 2
+
+# Seconds to wait for Cromwell
+REQUEST_TIMEOUT = 30
+
+# Jobs taken this many seconds ago and not done are queued again, as their worker has died
+CLAIM_TIMEOUT = 10 * REQUEST_TIMEOUT
+
+# Seconds to wait before connecting again after losing the Redis connection
+WORKER_RETRY = 30
+
+QUEUED_STATUS = "Queued"
+SUBMITTED_STATUS = "Submitted"
+FAILED_STATUS = "Failed"
+FINISHED_STATUSES = {"Succeeded", "Failed", "Aborted"}
+
+# Queue a taken job again if its worker has not finished it in time. Jobs taken just now may
+# not have their claim time yet, so they are given one.
+# KEYS: processing list, queue, job hash. ARGV: job ID, now, claim timeout
+RECOVER_SCRIPT = """
+if redis.call('exists', KEYS[3]) == 0 then
+    redis.call('lrem', KEYS[1], 1, ARGV[1])
+    return 0
+end
+local claimed = redis.call('hget', KEYS[3], 'claimed')
+if not claimed then
+    redis.call('hset', KEYS[3], 'claimed', ARGV[2])
+    return 0
+end
+if tonumber(claimed) > tonumber(ARGV[2]) - tonumber(ARGV[3]) then
+    return 0
+end
+if redis.call('lrem', KEYS[1], 1, ARGV[1]) == 0 then
+    return 0
+end
+redis.call('hdel', KEYS[3], 'claimed')
+redis.call('rpush', KEYS[2], ARGV[1])
+return 1
+"""
+
+
+class CromwellClient:
+    """Client of the Cromwell workflow API"""
+
+    def __init__(self, url=None):
+        if url is None:
+            url = os.environ.get("CROMWELL_URL", DEFAULT_CROMWELL_URL)
+        self.url = url.rstrip("/")
+        self.session = requests.Session()
+
+    def submit(self, workflow_path, inputs):
+        """Submit a workflow
+        :param workflow_path: path of the WDL file
+        :param inputs: dict of workflow inputs
+        :return: Cromwell workflow ID
+        """
+        with open(workflow_path, "rb") as f:
+            files = {
+                "workflowSource": (os.path.basename(workflow_path), f),
+                "workflowInputs": ("inputs.json", json.dumps(inputs)),
+            }
+            response = self.session.post(
+                self.url + "/api/workflows/v1", files=files, timeout=REQUEST_TIMEOUT
+            )
+        response.raise_for_status()
+        return response.json()["id"]
+
+    def get_status(self, workflow_id):
+        """Get the status of a workflow
+        :param workflow_id: Cromwell workflow ID
+        :return: status, for example Running or Succeeded
+        """
+        response = self.session.get(
+            self.url + "/api/workflows/v1/" + workflow_id + "/status",
+            timeout=REQUEST_TIMEOUT,
+        )
+        response.raise_for_status()
+        return response.json()["status"]
+
+
+class CromwellQueue:
+    """Background submission of Cromwell workflows.
+    Jobs are queued in Redis and get an ID at once. A worker thread in each process submits
+    queued jobs, with retries, and one worker per interval copies the status of active jobs
+    from Cromwell, so status requests are answered from Redis.
+    Workers move each job to a processing list while they submit it, and remove it when done,
+    so the jobs of a worker that dies are queued again.
+    If Redis is not available, workflows are submitted once in the request.
+    """
+
+    client = None
+    worker_pid = None
+    worker_lock = threading.Lock()
+
+    @staticmethod
+    def get_client():
+        """Get the Cromwell client of this process
+        :return: CromwellClient
+        """
+        if CromwellQueue.client is None:
+            CromwellQueue.client = CromwellClient()
+        return CromwellQueue.client
+
+    @staticmethod
+    def enqueue(workflow_path, inputs):
+        """Queue a workflow for submission
+        :param workflow_path: path of the WDL file
+        :param inputs: dict of workflow inputs
+        :return: job ID
+        """
+        job_id = str(uuid.uuid4())
+        try:
+            r = BARUtils.connect_redis()
+            key = JOB_KEY_PREFIX + job_id
+            r.hset(
+                key,
+                mapping={
+                    "status": QUEUED_STATUS,
+                    "workflow": workflow_path,
+                    "inputs": json.dumps(inputs),
+                    "attempts": 0,
+                },
+            )
+            r.expire(key, JOB_TTL)
+            r.lpush(QUEUE_KEY, job_id)
+        except redis.exceptions.ConnectionError:
+            # Submitted once, so the request is not held by retries.
+            # The Cromwell workflow ID is the job ID.
+            return CromwellQueue.get_client().submit(workflow_path, inputs)
+
+        CromwellQueue.start_worker()
+        return job_id
+
+    @staticmethod
+    def record_finished(status):
+        """Record a job that was done without Cromwell, so that its status can be read like other jobs
+        :param status: status, for example Succeeded
+        :return: job ID
+        """
+        job_id = str(uuid.uuid4())
+        try:
+            r = BARUtils.connect_redis()
+            r.hset(JOB_KEY_PREFIX + job_id, "status", status)
+            r.expire(JOB_KEY_PREFIX + job_id, JOB_TTL)
+        except redis.exceptions.ConnectionError:
+            pass
+        return job_id
+
+    @staticmethod
+    def get_status(job_id):
+        """Get the status of a job
+        :param job_id: job ID
+        :return: status, or None if the job does not exist
+        """
+        try:
+            status = BARUtils.connect_redis().hget(JOB_KEY_PREFIX + job_id, "status")
+        except redis.exceptions.ConnectionError:
+            # Jobs were submitted in the request, so the job ID is the Cromwell workflow ID
+            try:
+                return CromwellQueue.get_client().get_status(job_id)
+            except requests.HTTPError:
+                return None
+
+        CromwellQueue.start_worker()
+        return None if status is None else status.decode("utf-8")
+
+    @staticmethod
+    def take(r):
+        """Wait for a queued job and move it to the processing list
+        :param r: redis connection
+        :return: job ID, or None if no job was queued in POLL_INTERVAL
+        """
+        job_id = r.brpoplpush(QUEUE_KEY, PROCESSING_KEY, timeout=POLL_INTERVAL)
+        if job_id is None:
+            return None
+        job_id = job_id.decode("utf-8")
+        if r.exists(JOB_KEY_PREFIX + job_id):
+            r.hset(JOB_KEY_PREFIX + job_id, "claimed", time.time())
+        return job_id
+
+    @staticmethod
+    def recover(r):
+        """Queue again the jobs of workers that died while submitting them
+        :param r: redis connection
+        """
+        for job_id in r.lrange(PROCESSING_KEY, 0, -1):
+            job_id = job_id.decode("utf-8")
+            r.eval(
+                RECOVER_SCRIPT,
+                3,
+                PROCESSING_KEY,
+                QUEUE_KEY,
+                JOB_KEY_PREFIX + job_id,
+                job_id,
+                time.time(),
+                CLAIM_TIMEOUT,
+            )
+
+    @staticmethod
+    def process(r, job_id):
+        """Submit a taken job and remove it from the processing list. Failed submissions are scheduled again.
+        :param r: redis connection
+        :param job_id: job ID
+        """
+        key = JOB_KEY_PREFIX + job_id
+        job = r.hgetall(key)
+        if not job:
+            r.lrem(PROCESSING_KEY, 1, job_id)
+            return
+
+        try:
+            workflow_id = CromwellQueue.get_client().submit(
+                job[b"workflow"].decode("utf-8"), json.loads(job[b"inputs"])
+            )
+        except (requests.RequestException, KeyError, ValueError) as e:
+            attempts = r.hincrby(key, "attempts", 1)
+            pipe = r.pipeline()
+            if attempts >= SUBMIT_ATTEMPTS:
+                pipe.hset(key, mapping={"status": FAILED_STATUS, "error": str(e)})
+            else:
+                pipe.zadd(
+                    RETRY_KEY, {job_id: time.time() + RETRY_DELAY * 2**attempts}
+                )
+            pipe.hdel(key, "claimed")
+            pipe.lrem(PROCESSING_KEY, 1, job_id)
+            pipe.execute()
+            return
+        except Exception as e:
+            # Errors such as a missing workflow file are not fixed by trying again
+            logger.exception("Cromwell job %s failed", job_id)
+            pipe = r.pipeline()
+            pipe.hset(key, mapping={"status": FAILED_STATUS, "error": str(e)})
+            pipe.hdel(key, "claimed")
+            pipe.lrem(PROCESSING_KEY, 1, job_id)
+            pipe.execute()
+            return
+
+        pipe = r.pipeline()
+        pipe.hset(key, mapping={"status": SUBMITTED_STATUS, "workflow_id": workflow_id})
+        pipe.hdel(key, "claimed")
+        pipe.sadd(ACTIVE_KEY, job_id)
+        pipe.lrem(PROCESSING_KEY, 1, job_id)
+        pipe.execute()
+
+    @staticmethod
+    def requeue(r):
+        """Queue the jobs whose next attempt is due
+        :param r: redis connection
+        """
+        for job_id in r.zrangebyscore(RETRY_KEY, 0, time.time()):
+            # Only the worker that removes the job queues it
+            if r.zrem(RETRY_KEY, job_id):
+                r.lpush(QUEUE_KEY, job_id)
+
+    @staticmethod
+    def poll(r):
+        """Copy the status of active jobs from Cromwell
+        :param r: redis connection
+        """
+        for job_id in r.smembers(ACTIVE_KEY):
+            key = JOB_KEY_PREFIX + job_id.decode("utf-8")
+            workflow_id = r.hget(key, "workflow_id")
+            if workflow_id is None:
+                r.srem(ACTIVE_KEY, job_id)
+                continue
+            try:
+                status = CromwellQueue.get_client().get_status(
+                    workflow_id.decode("utf-8")
+                )
+            except (requests.RequestException, KeyError, ValueError):
+                # The last known status is kept until Cromwell answers
+                continue
+            r.hset(key, "status", status)
+            if status in FINISHED_STATUSES:
+                r.srem(ACTIVE_KEY, job_id)
+
+    @staticmethod
+    def start_worker():
+        """Start the worker of this process, once per worker process"""
+        if CromwellQueue.worker_pid == os.getpid():
+            return
+        with CromwellQueue.worker_lock:
+            if CromwellQueue.worker_pid == os.getpid():
+                return
+            CromwellQueue.worker_pid = os.getpid()
+        threading.Thread(target=CromwellQueue.work, daemon=True).start()
+
+    @staticmethod
+    def work_once(r):
+        """Submit the next queued job and poll the status of active jobs if it is this worker's turn
+        :param r: redis connection
+        """
+        job_id = CromwellQueue.take(r)
+        if job_id is not None:
+            CromwellQueue.process(r, job_id)
+
+        # Only one worker polls per interval
+        if r.set(POLL_LOCK_KEY, 1, ex=POLL_INTERVAL, nx=True):
+            CromwellQueue.recover(r)
+            CromwellQueue.requeue(r)
+            CromwellQueue.poll(r)
+
+    @staticmethod
+    def work():
+        """Submit queued jobs and poll the status of active jobs"""
+        recovered = False
+        while True:
+            try:
+                r = BARUtils.connect_redis()
+                if not recovered:
+                    CromwellQueue.recover(r)
+                    recovered = True
+                CromwellQueue.work_once(r)
+            except redis.exceptions.ConnectionError:
+                time.sleep(WORKER_RETRY)
+            except Exception:
+                # The worker is started once per process, so it must not stop
+                logger.exception("Cromwell worker error")
+                time.sleep(WORKER_RETRY)
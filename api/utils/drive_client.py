@@ -0,0 +1,99 @@
+import os
+import threading
+import time
+import requests
+from cryptography.fernet import Fernet
+
+DRIVE_FILES_URL = "https://www.googleapis.com/drive/v3/files"
+
+# Folder listings are read again from Drive after this many seconds
+DRIVE_LIST_TTL = 60
+
+# The listing cache is emptied if it grows beyond this many folders
+DRIVE_LIST_CACHE_SIZE = 1000
+
+# Number of files in each page of a listing (the maximum allowed by Drive)
+DRIVE_PAGE_SIZE = 1000
+
+# Seconds to wait for Drive
+REQUEST_TIMEOUT = 30
+
+
+class DriveClient:
+    """Google Drive folder listing.
+    The API key is decrypted once per process, requests share a pooled session,
+    listings follow nextPageToken to the last page and are cached for DRIVE_LIST_TTL.
+    """
+
+    instance = None
+    instance_lock = threading.Lock()
+
+    def __init__(self, key, url=DRIVE_FILES_URL):
+        self.key = key
+        self.url = url
+        self.session = requests.Session()
+        # folder ID: (time listed, list of files)
+        self.listings = {}
+        self.listings_lock = threading.Lock()
+
+    @staticmethod
+    def read_key():
+        """Decrypt the Drive API key from DRIVE_LIST_FILE with DRIVE_LIST_KEY
+        :return: API key
+        """
+        cipher_suite = Fernet(os.environ.get("DRIVE_LIST_KEY"))
+        with open(os.environ.get("DRIVE_LIST_FILE"), "rb") as f:
+            for line in f:
+                encrypted_key = line
+        return bytes(cipher_suite.decrypt(encrypted_key)).decode("utf-8")
+
+    @staticmethod
+    def get_client():
+        """Get the Drive client of this process
+        :return: DriveClient
+        """
+        if DriveClient.instance is None:
+            with DriveClient.instance_lock:
+                if DriveClient.instance is None:
+                    DriveClient.instance = DriveClient(DriveClient.read_key())
+        return DriveClient.instance
+
+    def list_files(self, folder_id):
+        """List the files in a folder
+        :param folder_id: Drive folder ID
+        :return: list of dicts with the id, name and mimeType of each file
+        :raises requests.HTTPError: if Drive rejects the request
+        """
+        with self.listings_lock:
+            cached = self.listings.get(folder_id)
+        if cached and cached[0] > time.time() - DRIVE_LIST_TTL:
+            return cached[1]
+
+        # Quotes in the folder ID would end the query string
+        folder = folder_id.replace("\\", "\\\\").replace("'", "\\'")
+        params = {
+            "corpora": "user",
+            "includeItemsFromAllDrives": "true",
+            "supportsAllDrives": "true",
+            "q": "'" + folder + "' in parents",
+            "pageSize": DRIVE_PAGE_SIZE,
+            "fields": "nextPageToken, files(id, name, mimeType)",
+            "key": self.key,
+        }
+        files = []
+        while True:
+            response = self.session.get(
+                self.url, params=params, timeout=REQUEST_TIMEOUT
+            )
+            response.raise_for_status()
+            page = response.json()
+            files.extend(page.get("files", []))
+            if not page.get("nextPageToken"):
+                break
+            params["pageToken"] = page["nextPageToken"]
+
+        with self.listings_lock:
+            if len(self.listings) >= DRIVE_LIST_CACHE_SIZE:
+                self.listings.clear()
+            self.listings[folder_id] = (time.time(), files)
+        return files
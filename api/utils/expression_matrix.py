@@ -0,0 +1,194 @@
+import threading
+import time
+import numpy
+import pandas
+
+# Matrices are reloaded from the database after this many seconds
+MATRIX_CACHE_TTL = 3600
+
+CORRELATION_METHODS = ["pearson", "spearman"]
+
+
+class ExpressionMatrix:
+    """A gene x sample float32 expression matrix.
+    Rows are normalized once per correlation method, so that correlating a gene
+    against every other gene is a single matrix-vector product.
+    """
+
+    # Loaded matrices of this process: key: (time loaded, matrix)
+    cache = {}
+    cache_lock = threading.Lock()
+
+    def __init__(self, genes, samples, values, gene_index=None):
+        self.genes = list(genes)
+        self.samples = list(samples)
+        self.values = numpy.asanyarray(values, dtype=numpy.float32)
+        if gene_index is None:
+            gene_index = {gene.upper(): i for i, gene in enumerate(self.genes)}
+        self.gene_index = gene_index
+        self.normalized = {}
+
+    @staticmethod
+    def from_long_dataframe(df, gene_column, sample_column, value_column):
+        """Make a matrix from a data frame with one row per gene and sample
+        :param df: data frame in long format
+        :param gene_column: name of the gene column
+        :param sample_column: name of the sample column
+        :param value_column: name of the value column
+        :return: ExpressionMatrix
+        """
+        wide = df.pivot_table(
+            index=gene_column, columns=sample_column, values=value_column
+        )
+        return ExpressionMatrix(wide.index, wide.columns, wide.to_numpy())
+
+    @staticmethod
+    def get_cached(key, loader, modified=None):
+        """Get a matrix from the process cache, or load it
+        :param key: cache key, for example the database or table name
+        :param loader: function that returns an ExpressionMatrix, or None if there is no data
+        :param modified: optional time the data last changed, in seconds since the epoch.
+            A matrix loaded before then is loaded again.
+        :return: ExpressionMatrix, or None if there is no data
+        """
+        with ExpressionMatrix.cache_lock:
+            cached = ExpressionMatrix.cache.get(key)
+        if (
+            cached
+            and cached[0] > time.time() - MATRIX_CACHE_TTL
+            and (modified is None or cached[0] > modified)
+        ):
+            return cached[1]
+
+        matrix = loader()
+        if matrix is None:
+            return None
+        with ExpressionMatrix.cache_lock:
+            ExpressionMatrix.cache[key] = (time.time(), matrix)
+        return matrix
+
+    @staticmethod
+    def invalidate(key):
+        """Remove a matrix from the process cache, for example after an insert
+        :param key: cache key
+        """
+        with ExpressionMatrix.cache_lock:
+            ExpressionMatrix.cache.pop(key, None)
+
+    def get_row(self, gene):
+        """Get the values of a gene
+        :param gene: gene id
+        :return: numpy array or None if the gene is not in the matrix
+        """
+        i = self.gene_index.get(gene.upper())
+        if i is None:
+            return None
+        return self.values[i]
+
+    def get_normalized(self, method):
+        """Center each row and divide it by its norm, so dot products of rows are correlations.
+        For Spearman, rows are ranked first.
+        :param method: pearson or spearman
+        :return: numpy float32 array
+        """
+        if method in self.normalized:
+            return self.normalized[method]
+
+        # Missing values are set to the row mean, so they do not add to the correlation
+        values = pandas.DataFrame(self.values)
+        values = values.T.fillna(values.mean(axis=1)).T
+        if method == "spearman":
+            values = values.rank(axis=1)
+        values = values.to_numpy(dtype=numpy.float32)
+
+        centered = values - values.mean(axis=1, keepdims=True)
+        norms = numpy.linalg.norm(centered, axis=1, keepdims=True)
+
+        # Constant rows are not correlated with anything
+        norms[norms == 0] = 1
+        self.normalized[method] = numpy.nan_to_num(centered / norms)
+        return self.normalized[method]
+
+    def correlate(self, gene, method="pearson", top_n=25):
+        """Find the genes most correlated with a gene
+        :param gene: gene id
+        :param method: pearson or spearman
+        :param top_n: number of genes to return
+        :return: list of (gene, correlation) or None if the gene is not in the matrix
+        """
+        i = self.gene_index.get(gene.upper())
+        if i is None:
+            return None
+
+        normalized = self.get_normalized(method)
+        correlations = normalized @ normalized[i]
+
+        # The gene itself is not returned
+        correlations[i] = -numpy.inf
+        top_n = min(top_n, len(self.genes) - 1)
+        if top_n <= 0:
+            return []
+
+        top = numpy.argpartition(-correlations, top_n - 1)[:top_n]
+        top = top[numpy.argsort(-correlations[top])]
+        return [(self.genes[j], float(correlations[j])) for j in top]
+
+    @staticmethod
+    def get_group_statistics(values):
+        """Get the number of values, mean and sample variance of each row. Missing values are left out.
+        :param values: numpy array of genes x samples of a group
+        :return: count, mean and variance arrays
+        """
+        present = ~numpy.isnan(values)
+        count = present.sum(axis=1)
+        with numpy.errstate(divide="ignore", invalid="ignore"):
+            mean = numpy.where(present, values, 0).sum(axis=1) / count
+            squares = numpy.where(present, values - mean[:, None], 0) ** 2
+            variance = squares.sum(axis=1) / (count - 1)
+        return count, mean, variance
+
+    def compare(self, group1, group2, pseudocount=1.0):
+        """Compare two groups of samples across all genes with Welch's t-test
+        :param group1: list of sample names
+        :param group2: list of sample names
+        :param pseudocount: added to the means before the fold change
+        :return: list of (gene, mean1, mean2, log2 fold change, t, degrees of freedom),
+            by decreasing absolute t. Genes without a t statistic are last.
+        """
+        sample_index = {sample: j for j, sample in enumerate(self.samples)}
+        values = numpy.asarray(self.values, dtype=numpy.float64)
+        n1, mean1, var1 = ExpressionMatrix.get_group_statistics(
+            values[:, [sample_index[sample] for sample in group1]]
+        )
+        n2, mean2, var2 = ExpressionMatrix.get_group_statistics(
+            values[:, [sample_index[sample] for sample in group2]]
+        )
+
+        with numpy.errstate(divide="ignore", invalid="ignore"):
+            log2_fold_change = numpy.log2((mean1 + pseudocount) / (mean2 + pseudocount))
+            se1 = var1 / n1
+            se2 = var2 / n2
+            t = (mean1 - mean2) / numpy.sqrt(se1 + se2)
+            df = (se1 + se2) ** 2 / (se1**2 / (n1 - 1) + se2**2 / (n2 - 1))
+
+        # Rows without variance or with fewer than two values in a group have no t statistic
+        t[~numpy.isfinite(t)] = numpy.nan
+        df[~numpy.isfinite(df)] = numpy.nan
+        order = numpy.lexsort(
+            (-numpy.abs(log2_fold_change), -numpy.nan_to_num(numpy.abs(t), nan=-1))
+        )
+
+        def to_float(value):
+            return None if numpy.isnan(value) else float(value)
+
+        return [
+            (
+                self.genes[i],
+                to_float(mean1[i]),
+                to_float(mean2[i]),
+                to_float(log2_fold_change[i]),
+                to_float(t[i]),
+                to_float(df[i]),
+            )
+            for i in order
+        ]
@@ -0,0 +1,162 @@
+import json
+import os
+import shutil
+import threading
+import time
+import uuid
+import numpy
+from api.utils.expression_matrix import ExpressionMatrix, CORRELATION_METHODS
+
+# Seconds a version is kept after it stops being live, for readers in other workers that
+# resolved it before the swap and are still opening or mapping its files
+RETIRED_VERSION_TTL = 600
+
+
+class ExpressionStore:
+    """On-disk, memory-mapped expression matrices shared by all worker processes.
+
+    Each dataset is stored under <root>/<name>/<version>/ as:
+        values.npy: gene x sample float32 matrix
+        <method>.npy: rows normalized for correlation (see ExpressionMatrix)
+        genes.json, samples.json: the row and column axes
+        gene_offsets.json: row of each gene, for O(1) row lookups
+    <root>/<name>/current is a symbolic link to the live version. A new version
+    is published by renaming a new link over it, so readers never see a partial export.
+    Versions that are no longer live are deleted RETIRED_VERSION_TTL seconds after the swap.
+    """
+
+    # Mapped datasets of this process: (root, name): (version, matrix)
+    opened = {}
+    opened_lock = threading.Lock()
+
+    @staticmethod
+    def get_root():
+        """Get the store directory from the environment
+        :return: path or None if the store is not configured
+        """
+        return os.environ.get("EXPRESSION_STORE_PATH")
+
+    @staticmethod
+    def export(root, name, matrix):
+        """Write a matrix as a new version and make it the live version
+        :param root: store directory
+        :param name: dataset name, for example single_cell
+        :param matrix: ExpressionMatrix
+        :return: version name
+        """
+        dataset = os.path.join(root, name)
+        version = time.strftime("%Y%m%d%H%M%S") + "_" + uuid.uuid4().hex[:8]
+        path = os.path.join(dataset, version)
+        os.makedirs(path)
+
+        numpy.save(os.path.join(path, "values.npy"), matrix.values)
+        for method in CORRELATION_METHODS:
+            numpy.save(
+                os.path.join(path, method + ".npy"), matrix.get_normalized(method)
+            )
+        with open(os.path.join(path, "genes.json"), "w") as f:
+            json.dump(matrix.genes, f)
+        with open(os.path.join(path, "samples.json"), "w") as f:
+            json.dump(matrix.samples, f)
+        with open(os.path.join(path, "gene_offsets.json"), "w") as f:
+            json.dump(matrix.gene_index, f)
+
+        # Atomic swap of the live version
+        previous = ExpressionStore.get_version(root, name)
+        link = os.path.join(dataset, "current")
+        tmp_link = link + "." + version
+        os.symlink(version, tmp_link)
+        os.replace(tmp_link, link)
+
+        # The modification time of a version is when it stopped being live. Older versions are
+        # deleted once no reader can still be opening them, and the previous version is kept.
+        if previous is not None:
+            try:
+                os.utime(os.path.join(dataset, previous))
+            except FileNotFoundError:
+                pass
+        retired_before = time.time() - RETIRED_VERSION_TTL
+        for old in os.listdir(dataset):
+            if old in [version, previous, "current"] or old.startswith("current."):
+                continue
+            try:
+                if os.path.getmtime(os.path.join(dataset, old)) < retired_before:
+                    shutil.rmtree(os.path.join(dataset, old), ignore_errors=True)
+            except FileNotFoundError:
+                pass
+
+        return version
+
+    @staticmethod
+    def get_version(root, name):
+        """Get the live version of a dataset
+        :param root: store directory
+        :param name: dataset name
+        :return: version name or None if the dataset is not exported
+        """
+        if root is None:
+            return None
+        try:
+            return os.readlink(os.path.join(root, name, "current"))
+        except OSError:
+            return None
+
+    @staticmethod
+    def remove(root, name):
+        """Remove a dataset. The live link is removed first, so readers stop using the dataset
+        before its files are deleted. Files that are still mapped stay readable until unmapped.
+        :param root: store directory
+        :param name: dataset name
+        """
+        if root is None:
+            return
+        try:
+            os.remove(os.path.join(root, name, "current"))
+        except FileNotFoundError:
+            pass
+        with ExpressionStore.opened_lock:
+            ExpressionStore.opened.pop((root, name), None)
+        shutil.rmtree(os.path.join(root, name), ignore_errors=True)
+
+    @staticmethod
+    def load(root, name):
+        """Get the live version of a dataset. Files are mapped read-only, so the
+        pages are shared between processes. The dataset is remapped after a swap.
+        :param root: store directory
+        :param name: dataset name
+        :return: ExpressionMatrix or None if the dataset is not exported
+        """
+        if root is None:
+            return None
+
+        version = ExpressionStore.get_version(root, name)
+        if version is None:
+            return None
+
+        with ExpressionStore.opened_lock:
+            opened = ExpressionStore.opened.get((root, name))
+        if opened and opened[0] == version:
+            return opened[1]
+
+        path = os.path.join(root, name, version)
+        with open(os.path.join(path, "genes.json")) as f:
+            genes = json.load(f)
+        with open(os.path.join(path, "samples.json")) as f:
+            samples = json.load(f)
+        with open(os.path.join(path, "gene_offsets.json")) as f:
+            gene_index = json.load(f)
+
+        matrix = ExpressionMatrix(
+            genes,
+            samples,
+            numpy.load(os.path.join(path, "values.npy"), mmap_mode="r"),
+            gene_index,
+        )
+        for method in CORRELATION_METHODS:
+            matrix.normalized[method] = numpy.load(
+                os.path.join(path, method + ".npy"), mmap_mode="r"
+            )
+
+        with ExpressionStore.opened_lock:
+            ExpressionStore.opened[(root, name)] = (version, matrix)
+        return matrix
@@ -0,0 +1,98 @@
+import threading
+import time
+
+# Indexes are rebuilt from the database after this many seconds
+GENE_INDEX_TTL = 600
+
+
+class GeneIndex:
+    """Trigram index of gene names for case-insensitive substring search.
+    Each trigram maps to the genes that contain it. A query is answered by
+    intersecting the genes of its trigrams and checking the few candidates left.
+    """
+
+    # Indexes of this process: key: (time built, index)
+    cache = {}
+    cache_lock = threading.Lock()
+
+    def __init__(self, genes):
+        self.genes = sorted(set(genes))
+        self.upper = [gene.upper() for gene in self.genes]
+        self.trigrams = {}
+        for i, gene in enumerate(self.upper):
+            for trigram in GeneIndex.get_trigrams(gene):
+                self.trigrams.setdefault(trigram, set()).add(i)
+
+    @staticmethod
+    def get_trigrams(string):
+        """Get the distinct substrings of length three of a string
+        :param string: str
+        :return: set of str
+        """
+        return {string[i : i + 3] for i in range(len(string) - 2)}
+
+    @staticmethod
+    def get_cached(key, loader, modified=None):
+        """Get an index from the process cache, or build it
+        :param key: cache key, for example the table name
+        :param loader: function that returns a list of genes
+        :param modified: optional time the genes last changed, in seconds since the epoch.
+            An index built before then is built again.
+        :return: GeneIndex
+        """
+        with GeneIndex.cache_lock:
+            cached = GeneIndex.cache.get(key)
+        if (
+            cached
+            and cached[0] > time.time() - GENE_INDEX_TTL
+            and (modified is None or cached[0] > modified)
+        ):
+            return cached[1]
+        return GeneIndex.build(key, loader())
+
+    @staticmethod
+    def build(key, genes):
+        """Build an index and put it in the process cache
+        :param key: cache key
+        :param genes: list of genes
+        :return: GeneIndex
+        """
+        index = GeneIndex(genes)
+        with GeneIndex.cache_lock:
+            GeneIndex.cache[key] = (time.time(), index)
+        return index
+
+    @staticmethod
+    def invalidate(key):
+        """Remove an index from the process cache
+        :param key: cache key
+        """
+        with GeneIndex.cache_lock:
+            GeneIndex.cache.pop(key, None)
+
+    def search(self, query, limit):
+        """Find the genes that contain a string.
+        Exact matches come first, then prefix matches, then other matches by position and length.
+        :param query: substring to find
+        :param limit: maximum number of genes to return
+        :return: list of genes
+        """
+        query = query.upper()
+        trigrams = GeneIndex.get_trigrams(query)
+        if len(trigrams) == 0:
+            # Short queries are checked against all genes
+            candidates = range(len(self.genes))
+        else:
+            postings = sorted(
+                (self.trigrams.get(trigram, set()) for trigram in trigrams), key=len
+            )
+            candidates = set.intersection(*postings)
+
+        matches = []
+        for i in candidates:
+            position = self.upper[i].find(query)
+            if position >= 0:
+                matches.append((position, len(self.upper[i]), self.genes[i]))
+
+        matches.sort()
+        return [gene for _, _, gene in matches[:limit]]
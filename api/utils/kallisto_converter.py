@@ -0,0 +1,81 @@
+import io
+import numpy
+import pandas
+
+KALLISTO_COLUMNS = ["target_id", "length", "eff_length", "est_counts", "tpm"]
+
+# Version or isoform number at the end of a transcript ID, for example AT1G01010.1
+ISOFORM_SUFFIX = r"\.\d+$"
+
+EXPRESSION_UNITS = ["rpkm", "tpm"]
+
+
+class KallistoConverter:
+    """Conversion of a Kallisto abundance table to gene expression values.
+    Transcripts are normalized by effective length and library size, then summed by gene:
+        RPKM = est_counts * 10^9 / (eff_length * sum(est_counts))
+        TPM = (est_counts / eff_length) * 10^6 / sum(est_counts / eff_length)
+    Transcripts with no effective length have no expression.
+    """
+
+    @staticmethod
+    def read(tsv):
+        """Read a Kallisto abundance table
+        :param tsv: path or file object of abundance.tsv
+        :return: data frame
+        """
+        df = pandas.read_csv(
+            tsv, sep="\t", dtype={"target_id": str}, usecols=KALLISTO_COLUMNS
+        )
+        for column in ["eff_length", "est_counts"]:
+            if not pandas.api.types.is_numeric_dtype(df[column]):
+                raise ValueError("Invalid Kallisto abundance file")
+        return df
+
+    @staticmethod
+    def normalize(df):
+        """Get the RPKM and TPM of each transcript
+        :param df: data frame of a Kallisto abundance table
+        :return: data frame with target_id, rpkm and tpm columns
+        """
+        counts = df["est_counts"].to_numpy(dtype=numpy.float64)
+        eff_length = df["eff_length"].to_numpy(dtype=numpy.float64)
+        rate = numpy.divide(
+            counts, eff_length, out=numpy.zeros_like(counts), where=eff_length > 0
+        )
+
+        total_counts = counts.sum()
+        total_rate = rate.sum()
+        rpkm = rate * 1e9 / total_counts if total_counts > 0 else rate * 0
+        tpm = rate * 1e6 / total_rate if total_rate > 0 else rate * 0
+        return pandas.DataFrame(
+            {"target_id": df["target_id"], "rpkm": rpkm, "tpm": tpm}
+        )
+
+    @staticmethod
+    def to_genes(df, units):
+        """Sum the expression of the transcripts of each gene
+        :param df: data frame from normalize
+        :param units: rpkm or tpm
+        :return: series of expression by gene, in order of appearance
+        """
+        genes = df["target_id"].str.replace(ISOFORM_SUFFIX, "", regex=True)
+        return df[units].groupby(genes, sort=False).sum()
+
+    @staticmethod
+    def to_csv(tsv, sample, units="rpkm"):
+        """Convert a Kallisto abundance table to a CSV file for SummarizationLoader
+        :param tsv: path or file object of abundance.tsv
+        :param sample: sample name
+        :param units: rpkm or tpm
+        :return: file object of a CSV file with a Gene column and one column for the sample
+        """
+        if units not in EXPRESSION_UNITS:
+            raise ValueError("Invalid units")
+        values = KallistoConverter.to_genes(
+            KallistoConverter.normalize(KallistoConverter.read(tsv)), units
+        )
+        csv = io.StringIO()
+        values.rename(sample).rename_axis("Gene").to_frame().to_csv(csv)
+        csv.seek(0)
+        return csv
@@ -0,0 +1,141 @@
+import io
+import json
+import numpy
+import pyarrow
+from flask import make_response, request
+from api.utils.bar_utils import BARUtils
+
+JSON_MIMETYPE = "application/json"
+NPY_MIMETYPE = "application/x-npy"
+NPZ_MIMETYPE = "application/x-npz"
+ARROW_MIMETYPE = "application/vnd.apache.arrow.stream"
+BINARY_MIMETYPES = [NPY_MIMETYPE, NPZ_MIMETYPE, ARROW_MIMETYPE]
+
+# The axes of .npy responses are sent as headers, which proxies limit to a few KB.
+# Larger axes must be requested as .npz or Arrow, which carry them in the body.
+MAX_AXES_HEADER_BYTES = 4096
+
+
+class PayloadUtils:
+    @staticmethod
+    def get_binary_mimetype():
+        """Find the binary format requested in the Accept header
+        :return: NPY_MIMETYPE, NPZ_MIMETYPE, ARROW_MIMETYPE or None if JSON should be returned
+        """
+        # JSON is listed first, so it is used for */* and missing Accept headers
+        mimetype = request.accept_mimetypes.best_match(
+            [JSON_MIMETYPE] + BINARY_MIMETYPES
+        )
+        if mimetype in BINARY_MIMETYPES:
+            return mimetype
+        else:
+            return None
+
+    @staticmethod
+    def to_float32_matrix(values):
+        """Convert rows of values to a float32 matrix. Missing values become NaN.
+        :param values: list of rows of values
+        :return: numpy float32 array
+        """
+        return numpy.array(values, dtype=numpy.float64).astype(numpy.float32)
+
+    @staticmethod
+    def to_npy(matrix):
+        """Serialize a matrix in NumPy .npy format
+        :param matrix: numpy array
+        :return: bytes
+        """
+        buffer = io.BytesIO()
+        numpy.save(buffer, matrix, allow_pickle=False)
+        return buffer.getvalue()
+
+    @staticmethod
+    def to_npz(genes, samples, matrix):
+        """Serialize a matrix and its axes in NumPy .npz format, as the arrays genes, samples and values
+        :param genes: list of genes (rows)
+        :param samples: list of samples (columns)
+        :param matrix: numpy array
+        :return: bytes
+        """
+        buffer = io.BytesIO()
+        numpy.savez(
+            buffer,
+            genes=numpy.array(genes, dtype=str),
+            samples=numpy.array(samples, dtype=str),
+            values=matrix,
+        )
+        return buffer.getvalue()
+
+    @staticmethod
+    def to_arrow(genes, samples, matrix):
+        """Serialize a matrix as an Arrow IPC stream with one float32 column per sample.
+        Gene and sample axes are stored in the schema metadata.
+        :param genes: list of genes (rows)
+        :param samples: list of samples (columns)
+        :param matrix: numpy float32 array
+        :return: bytes
+        """
+        metadata = {"genes": json.dumps(genes), "samples": json.dumps(samples)}
+        columns = [pyarrow.array(matrix[:, j]) for j in range(len(samples))]
+        fields = [pyarrow.field(sample, pyarrow.float32()) for sample in samples]
+        batch = pyarrow.record_batch(
+            columns, schema=pyarrow.schema(fields, metadata=metadata)
+        )
+
+        sink = pyarrow.BufferOutputStream()
+        with pyarrow.ipc.new_stream(sink, batch.schema) as writer:
+            writer.write_batch(batch)
+        return sink.getvalue().to_pybytes()
+
+    @staticmethod
+    def matrix_response(genes, samples, values, mimetype):
+        """Make a binary response for a gene x sample matrix
+        :param genes: list of genes (rows)
+        :param samples: list of samples (columns)
+        :param values: list of rows of values
+        :param mimetype: NPY_MIMETYPE, NPZ_MIMETYPE or ARROW_MIMETYPE
+        :return: Flask response
+        """
+        matrix = PayloadUtils.to_float32_matrix(values).reshape(
+            len(genes), len(samples)
+        )
+
+        if mimetype == ARROW_MIMETYPE:
+            response = make_response(PayloadUtils.to_arrow(genes, samples, matrix))
+        elif mimetype == NPZ_MIMETYPE:
+            response = make_response(PayloadUtils.to_npz(genes, samples, matrix))
+        else:
+            # For .npy, the axes are sent as headers because the format has no metadata
+            genes_header = json.dumps(genes)
+            samples_header = json.dumps(samples)
+            if len(genes_header) + len(samples_header) > MAX_AXES_HEADER_BYTES:
+                response = make_response(
+                    BARUtils.error_exit(
+                        "Too many genes or samples for .npy, request "
+                        + NPZ_MIMETYPE
+                        + " or "
+                        + ARROW_MIMETYPE
+                    ),
+                    406,
+                )
+                response.headers["Vary"] = "Accept"
+                return response
+            response = make_response(PayloadUtils.to_npy(matrix))
+            response.headers["X-BAR-Genes"] = genes_header
+            response.headers["X-BAR-Samples"] = samples_header
+
+        response.headers["Content-Type"] = mimetype
+        response.headers["Vary"] = "Accept"
+        return response
+
+    @staticmethod
+    def gene_response(gene, data, mimetype):
+        """Make a binary response for the expression data of one gene
+        :param gene: gene id
+        :param data: dict of sample and value
+        :param mimetype: NPY_MIMETYPE, NPZ_MIMETYPE or ARROW_MIMETYPE
+        :return: Flask response
+        """
+        samples = list(data.keys())
+        values = [list(data.values())]
+        return PayloadUtils.matrix_response([gene], samples, values, mimetype)
@@ -0,0 +1,70 @@
+import re
+import threading
+import time
+from api.models.single_cell import SingleCell, SingleCellClusterAggregate
+
+# Sample catalogs are reloaded from the database after this many seconds
+SAMPLE_CATALOG_TTL = 3600
+
+
+class RNASeqDatabase:
+    """An RNA-Seq expression database.
+    The model must have data_probeset_id, data_bot_id and data_signal columns.
+    """
+
+    def __init__(self, name, model, sample_regex, aggregate_model=None):
+        self.name = name
+        self.model = model
+        self.sample_regex = re.compile(sample_regex, re.I)
+        self.aggregate_model = aggregate_model
+        self.samples = None
+        self.samples_loaded = 0
+        self.samples_lock = threading.Lock()
+
+    def get_store_name(self):
+        """Get the name of the database in the expression store
+        :return: str
+        """
+        return "rnaseq_" + self.name
+
+    def is_valid_sample(self, sample_id):
+        """Check the format of a sample id
+        :param sample_id: sample id in the data_bot_id column
+        :return: bool
+        """
+        return bool(self.sample_regex.search(sample_id))
+
+    def get_samples(self):
+        """Get the sample catalog of the database. It is loaded once and kept in memory.
+        :return: set of sample ids
+        """
+        with self.samples_lock:
+            if (
+                self.samples is None
+                or self.samples_loaded < time.time() - SAMPLE_CATALOG_TTL
+            ):
+                rows = (
+                    self.model.query.with_entities(self.model.data_bot_id)
+                    .distinct()
+                    .all()
+                )
+                self.samples = {row.data_bot_id for row in rows}
+                self.samples_loaded = time.time()
+            return self.samples
+
+    def invalidate_samples(self):
+        """Reload the sample catalog on next use, for example after new samples are loaded"""
+        with self.samples_lock:
+            self.samples = None
+
+
+# Adding a database is one entry here
+RNASEQ_DATABASES = {
+    # Example: cluster0_WT1.ExprMean
+    "single_cell": RNASeqDatabase(
+        "single_cell",
+        SingleCell,
+        r"^\D+\d+_WT\d+.ExprMean$",
+        SingleCellClusterAggregate,
+    ),
+}
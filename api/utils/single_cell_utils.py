@@ -0,0 +1,73 @@
+import pandas
+from api import single_cell_db as db
+from api.models.single_cell import SingleCell, SingleCellClusterAggregate
+
+# Example: cluster0_WT1.ExprMean is a replicate of cluster0
+CLUSTER_REGEX = r"^(\D+\d+)_WT\d+\.ExprMean$"
+
+# Number of genes aggregated in one transaction
+AGGREGATE_BATCH_SIZE = 1000
+
+
+class SingleCellUtils:
+    @staticmethod
+    def aggregate_clusters(df):
+        """Compute the per gene, per cluster statistics of the cluster replicates.
+        Samples that are not cluster replicates are ignored.
+        :param df: data frame with data_probeset_id, data_bot_id and data_signal columns
+        :return: data frame with data_probeset_id, cluster, mean, sd, n, min and max columns
+        """
+        clusters = df["data_bot_id"].str.extract(CLUSTER_REGEX, expand=False)
+        df = df.assign(cluster=clusters).dropna(subset=["cluster"])
+
+        aggregates = (
+            df.groupby(["data_probeset_id", "cluster"])["data_signal"]
+            .agg(["mean", "std", "count", "min", "max"])
+            .reset_index()
+        )
+        return aggregates.rename(columns={"std": "sd", "count": "n"})
+
+    @staticmethod
+    def rebuild_cluster_aggregates(proj_ids=None):
+        """Rebuild the cluster aggregate table.
+        If projects are given, only the genes that are in these projects are rebuilt.
+        :param proj_ids: list of project ids in the proj_id column
+        :return: number of genes rebuilt
+        """
+        engine = db.get_engine(bind="single_cell")
+        SingleCellClusterAggregate.__table__.create(engine, checkfirst=True)
+
+        query = db.select([SingleCell.data_probeset_id]).distinct()
+        if proj_ids:
+            query = query.where(SingleCell.proj_id.in_(proj_ids))
+        with engine.connect() as con:
+            genes = [row.data_probeset_id for row in con.execute(query)]
+
+        # Genes are rebuilt in batches, so memory use stays bounded
+        for start in range(0, len(genes), AGGREGATE_BATCH_SIZE):
+            batch = genes[start : start + AGGREGATE_BATCH_SIZE]
+            with engine.begin() as con:
+                df = pandas.read_sql(
+                    db.select(
+                        [
+                            SingleCell.data_probeset_id,
+                            SingleCell.data_bot_id,
+                            SingleCell.data_signal,
+                        ]
+                    ).where(SingleCell.data_probeset_id.in_(batch)),
+                    con,
+                )
+                aggregates = SingleCellUtils.aggregate_clusters(df)
+                con.execute(
+                    SingleCellClusterAggregate.__table__.delete().where(
+                        SingleCellClusterAggregate.data_probeset_id.in_(batch)
+                    )
+                )
+                aggregates.to_sql(
+                    SingleCellClusterAggregate.__tablename__,
+                    con,
+                    if_exists="append",
+                    index=False,
+                )
+
+        return len(genes)
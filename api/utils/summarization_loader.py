@@ -0,0 +1,206 @@
+import hashlib
+import threading
+import time
+import uuid
+import pandas
+from sqlalchemy import text
+from sqlalchemy.inspection import inspect
+from api import summarization_db as db
+from api.models.summarization import TableCatalog, TableCatalogGene, TableCatalogSample
+from api.utils.table_catalog import TableCatalogUtils
+
+# Number of CSV rows (genes) read and melted at a time
+LOAD_CHUNK_GENES = 2000
+
+# Number of rows sent to executemany at a time. mysqlclient sends each batch
+# as multi-row INSERT statements.
+INSERT_BATCH_ROWS = 10000
+
+
+class SummarizationLoader:
+    @staticmethod
+    def get_user_table(table_id, metadata=None):
+        """Get the schema of a user table. Values of a gene are found with the (Gene, Sample) index.
+        The index is named from a hash of the table name, so it stays within the 64 characters
+        MySQL allows for identifiers.
+        :param table_id: The name of the user table
+        :param metadata: MetaData of the table
+        :return: Table
+        """
+        if metadata is None:
+            metadata = db.MetaData()
+        return db.Table(
+            table_id,
+            metadata,
+            db.Column("index", db.BigInteger, primary_key=True, autoincrement=False),
+            db.Column("Gene", db.String(32), nullable=False),
+            db.Column("Sample", db.String(64), nullable=False),
+            db.Column("Value", db.Float),
+            db.Index(
+                "ix_gene_sample_" + hashlib.sha1(table_id.encode()).hexdigest()[:16],
+                "Gene",
+                "Sample",
+            ),
+        )
+
+    @staticmethod
+    def create_user_table(con, table_id):
+        """Create a user table if it does not exist
+        :param con: connection
+        :param table_id: The name of the user table
+        """
+        SummarizationLoader.get_user_table(table_id).create(con, checkfirst=True)
+
+    @staticmethod
+    def load_csv(con, table_id, csv, start_index=0):
+        """Load a wide CSV file (one Gene column, one column per sample) into a long user table.
+        The file is read in blocks of LOAD_CHUNK_GENES genes, so memory use does not grow with the file.
+        :param con: connection in the transaction of the load
+        :param table_id: The name of the user table
+        :param csv: path or file object of the CSV file
+        :param start_index: first value of the index column
+        :return: dict with the number of rows, genes and samples loaded, seconds and rows per second
+        """
+        start = time.perf_counter()
+        index = start_index
+        SummarizationLoader.create_user_table(con, table_id)
+        genes = []
+        samples = []
+
+        for chunk in pandas.read_csv(csv, chunksize=LOAD_CHUNK_GENES):
+            if len(samples) == 0:
+                samples = [str(sample) for sample in chunk.columns if sample != "Gene"]
+            genes.extend(chunk["Gene"].tolist())
+
+            df = chunk.melt(id_vars=["Gene"], var_name="Sample", value_name="Value")
+            df.index = pandas.RangeIndex(index, index + len(df))
+            df.to_sql(
+                table_id,
+                con,
+                if_exists="append",
+                index=True,
+                chunksize=INSERT_BATCH_ROWS,
+            )
+            index += len(df)
+
+        rows = index - start_index
+        TableCatalogUtils.record(con, table_id, genes, samples, rows)
+
+        seconds = time.perf_counter() - start
+        return {
+            "rows": rows,
+            "genes": len(set(genes)),
+            "samples": len(samples),
+            "seconds": round(seconds, 3),
+            "rows_per_second": round(rows / seconds) if seconds > 0 else rows,
+        }
+
+    @staticmethod
+    def rename_tables(con, renames):
+        """Rename tables in one atomic step
+        :param con: connection
+        :param renames: list of (old name, new name)
+        """
+        quote = con.dialect.identifier_preparer.quote
+        if con.dialect.name == "mysql":
+            con.execute(
+                text(
+                    "RENAME TABLE "
+                    + ", ".join(
+                        quote(old) + " TO " + quote(new) for old, new in renames
+                    )
+                )
+            )
+        else:
+            # DDL is transactional in the other databases, so the renames are one step
+            for old, new in renames:
+                con.execute(
+                    text("ALTER TABLE " + quote(old) + " RENAME TO " + quote(new))
+                )
+
+    @staticmethod
+    def drop_table(engine, table_id):
+        """Drop a table
+        :param engine: engine of the summarization database
+        :param table_id: The name of the table
+        """
+        quote = engine.dialect.identifier_preparer.quote
+        with engine.begin() as con:
+            con.execute(text("DROP TABLE IF EXISTS " + quote(table_id)))
+
+    @staticmethod
+    def swap_table(engine, table_id, staging, old):
+        """Swap a staging table and its catalog in for a user table. Appends to the table and
+        reads of the catalog wait until both the table and the catalog are swapped.
+        :param engine: engine of the summarization database
+        :param table_id: The name of the user table
+        :param staging: The name of the staging table
+        :param old: The name the user table is renamed to
+        :return: True if the user table existed and was renamed to old
+        """
+        quote = engine.dialect.identifier_preparer.quote
+        with engine.connect() as con:
+            if engine.dialect.name == "mysql":
+                # RENAME TABLE commits the transaction, which would release the catalog row
+                # lock, so the tables are locked instead. Locked tables can be renamed from
+                # MySQL 8.0.13
+                exists = inspect(engine).has_table(table_id)
+                renames = [(table_id, old)] if exists else []
+                renames.append((staging, table_id))
+                tables = [
+                    model.__tablename__
+                    for model in [TableCatalog, TableCatalogGene, TableCatalogSample]
+                ] + [name for name, _ in renames]
+                con.execute(
+                    text(
+                        "LOCK TABLES "
+                        + ", ".join(quote(name) + " WRITE" for name in tables)
+                    )
+                )
+                try:
+                    SummarizationLoader.rename_tables(con, renames)
+                    TableCatalogUtils.move(con, staging, table_id)
+                finally:
+                    con.execute(text("UNLOCK TABLES"))
+            else:
+                # DDL is transactional in the other databases, so the catalog row lock is
+                # held from the rename to the catalog move
+                with con.begin():
+                    TableCatalogUtils.lock(con, table_id)
+                    exists = inspect(con).has_table(table_id)
+                    renames = [(table_id, old)] if exists else []
+                    renames.append((staging, table_id))
+                    SummarizationLoader.rename_tables(con, renames)
+                    TableCatalogUtils.move(con, staging, table_id)
+        return exists
+
+    @staticmethod
+    def replace_csv(engine, table_id, csv):
+        """Replace the data of a user table with a CSV file.
+        The file is loaded into a staging table, which is then swapped with the user table
+        in one RENAME, so readers see either the old or the new data. The old table is dropped
+        in the background.
+        :param engine: engine of the summarization database
+        :param table_id: The name of the user table
+        :param csv: path or file object of the CSV file
+        :return: dict with the number of rows, genes and samples loaded, seconds and rows per second
+        """
+        suffix = uuid.uuid4().hex[:8]
+        staging = table_id + "_staging_" + suffix
+        old = table_id + "_old_" + suffix
+
+        try:
+            with engine.begin() as con:
+                stats = SummarizationLoader.load_csv(con, staging, csv)
+            exists = SummarizationLoader.swap_table(engine, table_id, staging, old)
+        finally:
+            # The staging table is left if the load or the swap failed
+            SummarizationLoader.drop_table(engine, staging)
+            with engine.begin() as con:
+                TableCatalogUtils.delete(con, staging)
+
+        if exists:
+            threading.Thread(
+                target=SummarizationLoader.drop_table, args=(engine, old), daemon=True
+            ).start()
+        return stats
@@ -0,0 +1,244 @@
+"""Migrate user tables of the summarization database to the indexed schema.
+
+Tables created before the schema of SummarizationLoader.get_user_table have no index on
+Gene or Sample, so each query scans the table. Each table is copied in batches into a new
+table with the schema and swapped in with one RENAME. The old table is read but not locked
+while it is copied, so queries are answered during the migration. Writes are blocked only
+from the final row count to the swap, and the migration of a table that was written to
+during the copy is abandoned. On MySQL, this needs 8.0.13 or later.
+
+Usage:
+    python -m api.utils.summarization_migration [table_id ...]
+
+Without table IDs, all user tables without the index are migrated.
+"""
+
+import sys
+import time
+import uuid
+from sqlalchemy import text
+from sqlalchemy.inspection import inspect
+from api import summarization_db as db
+from api.utils.summarization_loader import SummarizationLoader
+
+# Number of rows copied at a time
+MIGRATION_BATCH_ROWS = 10000
+
+# Number of queries timed before and after each migration
+LATENCY_QUERIES = 20
+
+USER_TABLE_COLUMNS = {"index", "Gene", "Sample", "Value"}
+
+
+class SummarizationMigration:
+    @staticmethod
+    def needs_migration(engine, table_id):
+        """Check if a table is a user table without the (Gene, Sample) index
+        :param engine: engine of the summarization database
+        :param table_id: The name of the table
+        :return: bool
+        """
+        insp = inspect(engine)
+        columns = {column["name"] for column in insp.get_columns(table_id)}
+        if columns != USER_TABLE_COLUMNS:
+            return False
+        return not any(
+            index["column_names"][:2] == ["Gene", "Sample"]
+            for index in insp.get_indexes(table_id)
+        )
+
+    @staticmethod
+    def get_tables(engine):
+        """Get the user tables to migrate
+        :param engine: engine of the summarization database
+        :return: list of table names
+        """
+        return [
+            table_id
+            for table_id in inspect(engine).get_table_names()
+            if SummarizationMigration.needs_migration(engine, table_id)
+        ]
+
+    @staticmethod
+    def measure_latency(engine, table_id, gene):
+        """Time the query of the values of a gene, as done by /value
+        :param engine: engine of the summarization database
+        :param table_id: The name of the table
+        :param gene: gene to query
+        :return: mean latency in milliseconds
+        """
+        tbl = db.table(table_id, db.column("Gene"), db.column("Value"))
+        query = db.select([tbl.c.Value]).where(tbl.c.Gene == gene)
+        with engine.connect() as con:
+            start = time.perf_counter()
+            for i in range(LATENCY_QUERIES):
+                con.execute(query).fetchall()
+            seconds = time.perf_counter() - start
+        return round(seconds * 1000 / LATENCY_QUERIES, 3)
+
+    @staticmethod
+    def count_rows(con, tbl):
+        """Count the rows of a table
+        :param con: connection
+        :param tbl: table
+        :return: int
+        """
+        return con.execute(db.select([db.func.count()]).select_from(tbl)).scalar()
+
+    @staticmethod
+    def check_rows(con, table_id, rows):
+        """Check that no rows were added to a table while it was copied
+        :param con: connection
+        :param table_id: The name of the user table
+        :param rows: number of rows copied
+        """
+        if SummarizationMigration.count_rows(con, db.table(table_id)) != rows:
+            raise RuntimeError(table_id + " was modified during the migration")
+
+    @staticmethod
+    def swap(engine, table_id, new, old, rows):
+        """Swap the copy of a table in, if no rows were added to the table during the copy.
+        Writes to the table are blocked from the count to the swap, so none are lost.
+        :param engine: engine of the summarization database
+        :param table_id: The name of the user table
+        :param new: The name of the copy
+        :param old: The name the user table is renamed to
+        :param rows: number of rows copied
+        """
+        quote = engine.dialect.identifier_preparer.quote
+        renames = [(table_id, old), (new, table_id)]
+        with engine.connect() as con:
+            if engine.dialect.name == "mysql":
+                # Locked tables can be renamed from MySQL 8.0.13
+                con.execute(
+                    text(
+                        "LOCK TABLES "
+                        + quote(table_id)
+                        + " WRITE, "
+                        + quote(new)
+                        + " WRITE"
+                    )
+                )
+                try:
+                    SummarizationMigration.check_rows(con, table_id, rows)
+                    SummarizationLoader.rename_tables(con, renames)
+                finally:
+                    con.execute(text("UNLOCK TABLES"))
+            else:
+                # DDL is transactional in the other databases, so the count and the swap are one step
+                with con.begin():
+                    if engine.dialect.name == "postgresql":
+                        con.execute(
+                            text("LOCK TABLE " + quote(table_id) + " IN EXCLUSIVE MODE")
+                        )
+                    SummarizationMigration.check_rows(con, table_id, rows)
+                    SummarizationLoader.rename_tables(con, renames)
+
+    @staticmethod
+    def migrate_table(engine, table_id):
+        """Copy a table into the indexed schema and swap it in
+        :param engine: engine of the summarization database
+        :param table_id: The name of the user table
+        :return: dict with the number of rows, seconds and latency before and after in milliseconds
+        """
+        start = time.perf_counter()
+        old_tbl = db.table(
+            table_id,
+            db.column("index"),
+            db.column("Gene"),
+            db.column("Sample"),
+            db.column("Value"),
+        )
+        with engine.connect() as con:
+            gene = con.execute(db.select([old_tbl.c.Gene]).limit(1)).scalar()
+        if gene is not None:
+            before = SummarizationMigration.measure_latency(engine, table_id, gene)
+
+        suffix = uuid.uuid4().hex[:8]
+        new = table_id + "_migrate_" + suffix
+        old = table_id + "_old_" + suffix
+        new_tbl = SummarizationLoader.get_user_table(new)
+
+        try:
+            with engine.begin() as con:
+                new_tbl.create(con)
+
+            # The old table is streamed on one connection and copied on another
+            rows = 0
+            with engine.connect() as src:
+                result = src.execution_options(stream_results=True).execute(
+                    db.select(
+                        [
+                            old_tbl.c.index,
+                            old_tbl.c.Gene,
+                            old_tbl.c.Sample,
+                            old_tbl.c.Value,
+                        ]
+                    )
+                )
+                while True:
+                    batch = result.fetchmany(MIGRATION_BATCH_ROWS)
+                    if len(batch) == 0:
+                        break
+                    with engine.begin() as dst:
+                        dst.execute(
+                            new_tbl.insert(),
+                            [
+                                {
+                                    # Tables loaded by pandas may have duplicate or missing index values
+                                    "index": rows + i,
+                                    "Gene": row.Gene,
+                                    "Sample": row.Sample,
+                                    "Value": row.Value,
+                                }
+                                for i, row in enumerate(batch)
+                            ],
+                        )
+                    rows += len(batch)
+
+            SummarizationMigration.swap(engine, table_id, new, old, rows)
+        except Exception:
+            SummarizationLoader.drop_table(engine, new)
+            raise
+        SummarizationLoader.drop_table(engine, old)
+
+        stats = {
+            "table_id": table_id,
+            "rows": rows,
+            "seconds": round(time.perf_counter() - start, 3),
+            "before_ms": None,
+            "after_ms": None,
+        }
+        if gene is not None:
+            stats["before_ms"] = before
+            stats["after_ms"] = SummarizationMigration.measure_latency(
+                engine, table_id, gene
+            )
+        return stats
+
+    @staticmethod
+    def migrate(table_ids=None):
+        """Migrate user tables
+        :param table_ids: list of table names, or None for all tables that need it
+        :return: list of the stats of each table
+        """
+        engine = db.get_engine(bind="summarization")
+        if not table_ids:
+            table_ids = SummarizationMigration.get_tables(engine)
+        return [
+            SummarizationMigration.migrate_table(engine, table_id)
+            for table_id in table_ids
+        ]
+
+
+if __name__ == "__main__":
+    from api import app
+
+    with app.app_context():
+        for stats in SummarizationMigration.migrate(sys.argv[1:]):
+            print(
+                "{table_id}: {rows} rows in {seconds} s, "
+                "query latency {before_ms} ms before, {after_ms} ms after".format(
+                    **stats
+                )
+            )
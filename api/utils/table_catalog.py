@@ -0,0 +1,231 @@
+import threading
+import time
+from datetime import datetime
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.inspection import inspect
+from api import summarization_db as db
+from api.models.summarization import TableCatalog, TableCatalogGene, TableCatalogSample
+
+# Seconds a table that does not exist is remembered, so lookups of unknown tables do not
+# inspect the database each time. Other processes see a new table after at most this long.
+MISSING_TABLE_TTL = 30
+
+
+class TableCatalogUtils:
+    """Catalog of the genes, samples, row count and last modified time of each user table.
+    It is updated with each insert, so listings do not scan the user tables.
+    Tables loaded before the catalog existed are added on first use.
+    """
+
+    # Table ID: time it was found not to exist
+    missing = {}
+    missing_lock = threading.Lock()
+
+    @staticmethod
+    def lock(con, table_id):
+        """Lock the catalog row of a table until the end of the transaction, so appends to
+        the table are serialized
+        :param con: connection in the transaction of the insert
+        :param table_id: The name of the user table
+        :return: row count of the table, or 0 if it is not in the catalog
+        """
+        catalog = TableCatalog.__table__
+        row = con.execute(
+            db.select([catalog.c.row_count])
+            .where(catalog.c.table_id == table_id)
+            .with_for_update()
+        ).first()
+        return 0 if row is None else row.row_count
+
+    @staticmethod
+    def add_names(con, tbl, column, table_id, names):
+        """Add the new names of a table to a gene or sample catalog, after the names already there.
+        The caller holds the lock of the catalog row of the table, so positions are not taken twice.
+        :param con: connection in the transaction of the insert
+        :param tbl: catalog table
+        :param column: gene or sample
+        :param table_id: The name of the user table
+        :param names: list of names, in order of appearance
+        """
+        # Names are compared case-folded, like the case-insensitive key of the catalog
+        existing = {
+            str(row[0]).casefold()
+            for row in con.execute(
+                db.select([tbl.c[column]]).where(tbl.c.table_id == table_id)
+            )
+        }
+        new = {}
+        for name in names:
+            folded = str(name).casefold()
+            if folded not in existing and folded not in new:
+                new[folded] = name
+        new = list(new.values())
+        if len(new) > 0:
+            con.execute(
+                tbl.insert(),
+                [
+                    {"table_id": table_id, column: name, "position": len(existing) + i}
+                    for i, name in enumerate(new)
+                ],
+            )
+
+    @staticmethod
+    def record(con, table_id, genes, samples, row_count):
+        """Add the data of an insert to the catalog of a table
+        :param con: connection in the transaction of the insert
+        :param table_id: The name of the user table
+        :param genes: list of genes in the inserted rows
+        :param samples: list of samples in the inserted rows
+        :param row_count: number of inserted rows
+        """
+        catalog = TableCatalog.__table__
+        now = datetime.now()
+        row = con.execute(
+            db.select([catalog.c.row_count])
+            .where(catalog.c.table_id == table_id)
+            .with_for_update()
+        ).first()
+        if row is None:
+            # The new row stays locked until the end of the transaction
+            con.execute(
+                catalog.insert().values(
+                    table_id=table_id, row_count=row_count, last_modified=now
+                )
+            )
+        else:
+            con.execute(
+                catalog.update()
+                .where(catalog.c.table_id == table_id)
+                .values(row_count=catalog.c.row_count + row_count, last_modified=now)
+            )
+
+        TableCatalogUtils.add_names(
+            con, TableCatalogGene.__table__, "gene", table_id, genes
+        )
+        TableCatalogUtils.add_names(
+            con, TableCatalogSample.__table__, "sample", table_id, samples
+        )
+        TableCatalogUtils.forget_missing(table_id)
+
+    @staticmethod
+    def forget_missing(table_id):
+        """Stop remembering that a table does not exist
+        :param table_id: The name of the user table
+        """
+        with TableCatalogUtils.missing_lock:
+            TableCatalogUtils.missing.pop(table_id, None)
+
+    @staticmethod
+    def backfill(table_id):
+        """Add a table that is not in the catalog yet by reading it once
+        :param table_id: The name of the user table
+        :return: False if the table does not exist
+        """
+        engine = db.get_engine(bind="summarization")
+        if not inspect(engine).has_table(table_id):
+            return False
+
+        tbl = db.table(table_id, db.column("Gene"), db.column("Sample"))
+        with engine.begin() as con:
+            genes = [
+                row.Gene for row in con.execute(db.select([tbl.c.Gene]).distinct())
+            ]
+            samples = [
+                row.Sample for row in con.execute(db.select([tbl.c.Sample]).distinct())
+            ]
+            row_count = con.execute(
+                db.select([db.func.count()]).select_from(tbl)
+            ).scalar()
+            try:
+                TableCatalogUtils.record(con, table_id, genes, samples, row_count)
+            except IntegrityError:
+                # Another worker added the table first
+                pass
+        return True
+
+    @staticmethod
+    def get_table(table_id):
+        """Get the catalog entry of a table
+        :param table_id: The name of the user table
+        :return: TableCatalog row, or None if the table does not exist
+        """
+        row = TableCatalog.query.filter_by(table_id=table_id).first()
+        if row is not None:
+            return row
+
+        missing_since = TableCatalogUtils.missing.get(table_id)
+        if missing_since and missing_since > time.time() - MISSING_TABLE_TTL:
+            return None
+        if TableCatalogUtils.backfill(table_id):
+            return TableCatalog.query.filter_by(table_id=table_id).first()
+        with TableCatalogUtils.missing_lock:
+            TableCatalogUtils.missing[table_id] = time.time()
+        return None
+
+    @staticmethod
+    def get_names(model, column, table_id):
+        """Get the genes or samples of a table in order of appearance
+        :param model: TableCatalogGene or TableCatalogSample
+        :param column: gene or sample
+        :param table_id: The name of the user table
+        :return: list of names, or None if the table does not exist
+        """
+        if TableCatalogUtils.get_table(table_id) is None:
+            return None
+        rows = (
+            model.query.with_entities(getattr(model, column))
+            .filter_by(table_id=table_id)
+            .order_by(model.position)
+            .all()
+        )
+        return [row[0] for row in rows]
+
+    @staticmethod
+    def get_genes(table_id):
+        """Get the genes of a table
+        :param table_id: The name of the user table
+        :return: list of genes, or None if the table does not exist
+        """
+        return TableCatalogUtils.get_names(TableCatalogGene, "gene", table_id)
+
+    @staticmethod
+    def get_samples(table_id):
+        """Get the samples of a table
+        :param table_id: The name of the user table
+        :return: list of samples, or None if the table does not exist
+        """
+        return TableCatalogUtils.get_names(TableCatalogSample, "sample", table_id)
+
+    @staticmethod
+    def move(con, source, target):
+        """Replace the catalog of a table with the catalog of another table, after they are swapped
+        :param con: connection
+        :param source: The name of the table that is renamed
+        :param target: The new name of the table
+        """
+        TableCatalogUtils.delete(con, target)
+        for model in [TableCatalog, TableCatalogGene, TableCatalogSample]:
+            tbl = model.__table__
+            con.execute(
+                tbl.update().where(tbl.c.table_id == source).values(table_id=target)
+            )
+        TableCatalogUtils.forget_missing(target)
+
+    @staticmethod
+    def delete(con, table_id):
+        """Delete the catalog of a table
+        :param con: connection
+        :param table_id: The name of the user table
+        """
+        for model in [TableCatalog, TableCatalogGene, TableCatalogSample]:
+            con.execute(
+                model.__table__.delete().where(model.__table__.c.table_id == table_id)
+            )
+
+    @staticmethod
+    def remove(table_id):
+        """Remove a table from the catalog, after it is dropped
+        :param table_id: The name of the user table
+        """
+        with db.get_engine(bind="summarization").begin() as con:
+            TableCatalogUtils.delete(con, table_id)
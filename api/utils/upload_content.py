@@ -0,0 +1,201 @@
+import hashlib
+import os
+import uuid
+import redis.exceptions
+from api.utils.bar_utils import BARUtils
+from api.utils.chunked_upload import UPLOAD_CHUNK_SIZE
+from api.utils.cromwell_queue import CromwellQueue, JOB_TTL
+
+# Bytes read at a time while hashing
+HASH_BLOCK_SIZE = 1024 * 1024
+
+# Hash of each user table: <type>:<digest> of each upload merged into the table: job ID
+CONTENT_KEY_PREFIX = "BAR_API_upload_content_"
+
+# Records of processed uploads are forgotten with their jobs
+CONTENT_TTL = JOB_TTL
+
+# Uploads whose job ended with these statuses are processed again
+RERUN_STATUSES = {"Failed", "Aborted"}
+
+
+class UploadContent:
+    """Content-addressed storage of uploaded files.
+
+    Files are stored in <user dir>/content/<digest>.<type>, so the same content is stored once.
+    The digest is the SHA-256 of the SHA-256 of each chunk of UPLOAD_CHUNK_SIZE bytes, so chunked
+    uploads get it from their checked chunks without reading the file again.
+    Workflows get a hard link at <user dir>/content/<digest>/<name>, as their tools take the
+    sample name from the file name.
+    The uploads merged into each user table since it was last replaced are recorded in Redis.
+    An upload whose content is already in the table is answered with the job that processed it.
+    """
+
+    @staticmethod
+    def get_digest(chunk_digests):
+        """Get the digest of content from the SHA-256 of its chunks
+        :param chunk_digests: list of hex SHA-256 of each chunk of UPLOAD_CHUNK_SIZE bytes, in order
+        :return: hex digest
+        """
+        return hashlib.sha256(
+            b"".join(bytes.fromhex(chunk_digest) for chunk_digest in chunk_digests)
+        ).hexdigest()
+
+    @staticmethod
+    def get_path(user_dir, digest, upload_type):
+        """Get the path of stored content
+        :param user_dir: directory of the user's files
+        :param digest: hex digest of the content
+        :param upload_type: tsv or csv
+        :return: path
+        """
+        return os.path.join(user_dir, "content", digest + "." + upload_type)
+
+    @staticmethod
+    def store(tmp_path, user_dir, digest, upload_type):
+        """Move a hashed file to its content address
+        :param tmp_path: path of the file
+        :param user_dir: directory of the user's files
+        :param digest: hex digest of the file
+        :param upload_type: tsv or csv
+        :return: path of the stored content
+        """
+        path = UploadContent.get_path(user_dir, digest, upload_type)
+        if os.path.exists(path):
+            os.remove(tmp_path)
+        else:
+            os.replace(tmp_path, path)
+        return path
+
+    @staticmethod
+    def save_stream(user_dir, stream, upload_type):
+        """Write an uploaded file to disk, hashing it on the way
+        :param user_dir: directory of the user's files
+        :param stream: file object of the upload
+        :param upload_type: tsv or csv
+        :return: hex digest and path of the stored content
+        """
+        os.makedirs(os.path.join(user_dir, "content"), exist_ok=True)
+        tmp_path = os.path.join(user_dir, "content", uuid.uuid4().hex + ".tmp")
+        chunk_digests = []
+        sha256 = hashlib.sha256()
+        chunk_left = UPLOAD_CHUNK_SIZE
+        try:
+            with open(tmp_path, "wb") as f:
+                while True:
+                    block = stream.read(HASH_BLOCK_SIZE)
+                    if not block:
+                        break
+                    f.write(block)
+                    # Blocks are split at the chunk boundaries
+                    while len(block) >= chunk_left:
+                        sha256.update(block[:chunk_left])
+                        chunk_digests.append(sha256.hexdigest())
+                        block = block[chunk_left:]
+                        sha256 = hashlib.sha256()
+                        chunk_left = UPLOAD_CHUNK_SIZE
+                    sha256.update(block)
+                    chunk_left -= len(block)
+        except Exception:
+            os.remove(tmp_path)
+            raise
+        if chunk_left < UPLOAD_CHUNK_SIZE:
+            chunk_digests.append(sha256.hexdigest())
+        digest = UploadContent.get_digest(chunk_digests)
+        return digest, UploadContent.store(tmp_path, user_dir, digest, upload_type)
+
+    @staticmethod
+    def save_file(user_dir, file_path, upload_type, digest):
+        """Move a file that is already on disk and hashed to its content address
+        :param user_dir: directory of the user's files
+        :param file_path: path of the file
+        :param upload_type: tsv or csv
+        :param digest: hex digest of the file, for example from ChunkedUpload.complete
+        :return: path of the stored content
+        """
+        os.makedirs(os.path.join(user_dir, "content"), exist_ok=True)
+        return UploadContent.store(file_path, user_dir, digest, upload_type)
+
+    @staticmethod
+    def link(path, name):
+        """Get a path of stored content under the name of the upload
+        :param path: path of the stored content
+        :param name: secure file name of the upload
+        :return: path of the link, or of the content if the name is empty
+        """
+        if not name:
+            return path
+        link_dir = os.path.splitext(path)[0]
+        os.makedirs(link_dir, exist_ok=True)
+        link_path = os.path.join(link_dir, name)
+        if os.path.exists(link_path):
+            return link_path
+
+        # Linked under a temporary name first, so concurrent uploads do not fail on each other
+        tmp_path = os.path.join(link_dir, "." + uuid.uuid4().hex + ".tmp")
+        try:
+            os.link(path, tmp_path)
+        except OSError:
+            # File systems without hard links
+            os.symlink(os.path.abspath(path), tmp_path)
+        os.replace(tmp_path, link_path)
+        return link_path
+
+    @staticmethod
+    def get_processed(table_id, digest, upload_type, overwrite):
+        """Get the job that already merged the same content into a table
+        :param table_id: The name of the user table
+        :param digest: hex digest of the content
+        :param upload_type: tsv or csv
+        :param overwrite: replace or append
+        :return: job ID, or None if the upload must be processed
+        """
+        field = upload_type + ":" + digest
+        try:
+            r = BARUtils.connect_redis()
+            jobs = r.hgetall(CONTENT_KEY_PREFIX + table_id)
+        except redis.exceptions.ConnectionError:
+            return None
+
+        job_id = jobs.get(field.encode("utf-8"))
+        if job_id is None:
+            return None
+        # A replace only does nothing if the table has no other content
+        if overwrite == "replace" and len(jobs) != 1:
+            return None
+
+        job_id = job_id.decode("utf-8")
+        status = CromwellQueue.get_status(job_id)
+        if status is None or status in RERUN_STATUSES:
+            r.hdel(CONTENT_KEY_PREFIX + table_id, field)
+            return None
+        return job_id
+
+    @staticmethod
+    def record(table_id, digest, upload_type, overwrite, job_id):
+        """Record the job that merges content into a table
+        :param table_id: The name of the user table
+        :param digest: hex digest of the content
+        :param upload_type: tsv or csv
+        :param overwrite: replace or append
+        :param job_id: job ID
+        """
+        try:
+            pipe = BARUtils.connect_redis().pipeline()
+            if overwrite == "replace":
+                pipe.delete(CONTENT_KEY_PREFIX + table_id)
+            pipe.hset(CONTENT_KEY_PREFIX + table_id, upload_type + ":" + digest, job_id)
+            pipe.expire(CONTENT_KEY_PREFIX + table_id, CONTENT_TTL)
+            pipe.execute()
+        except redis.exceptions.ConnectionError:
+            pass
+
+    @staticmethod
+    def forget(table_id):
+        """Forget the content of a table, after it is replaced by other means or dropped
+        :param table_id: The name of the user table
+        """
+        try:
+            BARUtils.connect_redis().delete(CONTENT_KEY_PREFIX + table_id)
+        except redis.exceptions.ConnectionError:
+            pass
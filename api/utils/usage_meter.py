@@ -0,0 +1,241 @@
+import time
+import uuid
+import redis.exceptions
+from api import summarization_db as db
+from api.models.summarization import Users
+from api.utils.bar_utils import BARUtils
+from sqlalchemy.exc import SQLAlchemyError
+
+# Remaining uses of each key, loaded from the users table on first use
+QUOTA_KEY_PREFIX = "BAR_API_quota_"
+
+# Hash of key: uses not yet written to the users table
+PENDING_KEY = "BAR_API_quota_pending"
+
+# Set of the pending hashes that are being written to the users table
+FLUSHING_KEY = "BAR_API_quota_flushing"
+
+# Set while a worker owns the next flush
+FLUSH_LOCK_KEY = "BAR_API_quota_flush"
+
+# Batches still being written after this many seconds were left by a worker that stopped
+FLUSH_STALE = 300
+
+# Pending uses are written to the users table at most this often (seconds)
+FLUSH_INTERVAL = 10
+
+# Idle quota keys are reloaded from the users table after this many seconds
+QUOTA_TTL = 86400
+
+# Check and decrement in one step, so that workers can not overspend a key.
+# Returns -2 if the key is not loaded, -1 if there are no uses left, or the uses left.
+CONSUME_SCRIPT = """
+local left = redis.call('GET', KEYS[1])
+if not left then
+    return -2
+end
+left = tonumber(left)
+if left <= 0 then
+    return -1
+end
+redis.call('DECR', KEYS[1])
+redis.call('EXPIRE', KEYS[1], ARGV[2])
+redis.call('HINCRBY', KEYS[2], ARGV[1], 1)
+return left - 1
+"""
+
+# Take the pending uses for a flush, and register them so they are still counted as pending
+START_FLUSH_SCRIPT = """
+if redis.call('EXISTS', KEYS[1]) == 0 then
+    return 0
+end
+redis.call('RENAME', KEYS[1], KEYS[2])
+redis.call('SADD', KEYS[3], KEYS[2])
+return 1
+"""
+
+# Put the uses of a batch back in the pending uses, for the next flush
+REQUEUE_FLUSH_SCRIPT = """
+local uses = redis.call('HGETALL', KEYS[2])
+for i = 1, #uses, 2 do
+    redis.call('HINCRBY', KEYS[1], uses[i], uses[i + 1])
+end
+redis.call('DEL', KEYS[2])
+redis.call('SREM', KEYS[3], KEYS[2])
+return #uses / 2
+"""
+
+# Forget the uses of a key that are not in the users table yet
+DISCARD_SCRIPT = """
+redis.call('DEL', KEYS[1])
+redis.call('HDEL', KEYS[2], ARGV[1])
+for _, batch in ipairs(redis.call('SMEMBERS', KEYS[3])) do
+    redis.call('HDEL', batch, ARGV[1])
+end
+return 1
+"""
+
+# Uses of a key that are not in the users table yet, including the batches being flushed
+GET_PENDING_SCRIPT = """
+local pending = tonumber(redis.call('HGET', KEYS[1], ARGV[1]) or 0)
+for _, batch in ipairs(redis.call('SMEMBERS', KEYS[2])) do
+    pending = pending + tonumber(redis.call('HGET', batch, ARGV[1]) or 0)
+end
+return pending
+"""
+
+
+class UsageMeter:
+    """API key usage metering.
+    Quotas are decremented in Redis and the uses are written to the users table in batches.
+    If Redis is not available, the users table is updated directly.
+    """
+
+    @staticmethod
+    def load_quota(r, key):
+        """Copy the uses left of a key from the users table to Redis
+        :param r: redis connection
+        :param key: API key
+        :return: False if the key does not exist
+        """
+        # Uses that are not flushed yet are already counted in Redis. They are read before the
+        # users table, so a batch written in between is counted twice rather than not at all.
+        pending = r.eval(GET_PENDING_SCRIPT, 2, PENDING_KEY, FLUSHING_KEY, key)
+        row = Users.query.with_entities(Users.uses_left).filter_by(api_key=key).first()
+        if row is None:
+            return False
+
+        r.set(QUOTA_KEY_PREFIX + key, row.uses_left - pending, ex=QUOTA_TTL, nx=True)
+        return True
+
+    @staticmethod
+    def get_remaining(key):
+        """Get the uses left of a key
+        :param key: API key
+        :return: uses left, or None if the key does not exist
+        """
+        try:
+            r = BARUtils.connect_redis()
+            left = r.get(QUOTA_KEY_PREFIX + key)
+            if left is None and UsageMeter.load_quota(r, key):
+                left = r.get(QUOTA_KEY_PREFIX + key)
+            return None if left is None else int(left)
+        except redis.exceptions.ConnectionError:
+            row = (
+                Users.query.with_entities(Users.uses_left)
+                .filter_by(api_key=key)
+                .first()
+            )
+            return None if row is None else row.uses_left
+
+    @staticmethod
+    def reset(key):
+        """Reload the uses left of a key from the users table on next use, after it is changed
+        :param key: API key
+        """
+        try:
+            BARUtils.connect_redis().delete(QUOTA_KEY_PREFIX + key)
+        except redis.exceptions.ConnectionError:
+            pass
+
+    @staticmethod
+    def discard(key):
+        """Forget the uses of a key that are not written to the users table, before its quota is overwritten
+        :param key: API key
+        """
+        try:
+            keys = [QUOTA_KEY_PREFIX + key, PENDING_KEY, FLUSHING_KEY]
+            BARUtils.connect_redis().eval(DISCARD_SCRIPT, len(keys), *keys, key)
+        except redis.exceptions.ConnectionError:
+            pass
+
+    @staticmethod
+    def consume(key):
+        """Use one unit of the quota of a key
+        :param key: API key
+        :return: True if the key exists and had uses left
+        """
+        if key is None:
+            return False
+
+        try:
+            r = BARUtils.connect_redis()
+            keys = [QUOTA_KEY_PREFIX + key, PENDING_KEY]
+            left = r.eval(CONSUME_SCRIPT, len(keys), *keys, key, QUOTA_TTL)
+            if left == -2:
+                if not UsageMeter.load_quota(r, key):
+                    return False
+                left = r.eval(CONSUME_SCRIPT, len(keys), *keys, key, QUOTA_TTL)
+
+            # Only one worker flushes per interval
+            if r.set(FLUSH_LOCK_KEY, 1, ex=FLUSH_INTERVAL, nx=True):
+                UsageMeter.flush(r)
+            return left >= 0
+        except redis.exceptions.ConnectionError:
+            return UsageMeter.consume_database(key)
+
+    @staticmethod
+    def consume_database(key):
+        """Use one unit of the quota of a key in the users table. The check and update are one statement.
+        :param key: API key
+        :return: True if the key exists and had uses left
+        """
+        try:
+            result = db.session.execute(
+                db.update(Users)
+                .where(Users.api_key == key, Users.uses_left > 0)
+                .values(uses_left=Users.uses_left - 1)
+            )
+            db.session.commit()
+        except SQLAlchemyError:
+            db.session.rollback()
+            return False
+        return result.rowcount == 1
+
+    @staticmethod
+    def flush(r):
+        """Write the pending uses to the users table
+        :param r: redis connection
+        :return: number of keys updated
+        """
+        keys = [PENDING_KEY, None, FLUSHING_KEY]
+        for batch_key in r.smembers(FLUSHING_KEY):
+            if (
+                int(batch_key.decode("utf-8").split("_")[-2])
+                < time.time() - FLUSH_STALE
+            ):
+                keys[1] = batch_key
+                r.eval(REQUEUE_FLUSH_SCRIPT, len(keys), *keys)
+
+        # Take the pending uses atomically, so uses made meanwhile go to the next flush
+        keys[1] = "%s_%d_%s" % (PENDING_KEY, time.time(), uuid.uuid4().hex)
+        if not r.eval(START_FLUSH_SCRIPT, len(keys), *keys):
+            # Nothing is pending
+            return 0
+
+        pending = r.hgetall(keys[1])
+        try:
+            for key, uses in pending.items():
+                # Quotas that were overwritten meanwhile, for example revoked keys, stay at 0
+                db.session.execute(
+                    db.update(Users)
+                    .where(Users.api_key == key.decode("utf-8"))
+                    .values(
+                        uses_left=db.case(
+                            (Users.uses_left > int(uses), Users.uses_left - int(uses)),
+                            else_=0,
+                        )
+                    )
+                )
+            db.session.commit()
+        except SQLAlchemyError:
+            # Keep the uses for the next flush
+            db.session.rollback()
+            r.eval(REQUEUE_FLUSH_SCRIPT, len(keys), *keys)
+            return 0
+
+        pipe = r.pipeline()
+        pipe.delete(keys[1])
+        pipe.srem(FLUSHING_KEY, keys[1])
+        pipe.execute()
+        return len(pending)
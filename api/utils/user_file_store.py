@@ -0,0 +1,313 @@
+import fcntl
+import gzip
+import hashlib
+import json
+import os
+import shutil
+import time
+import uuid
+
+# Index of the files of each user directory
+INDEX_FILE = ".index.json"
+
+# Held while the index of a user directory is changed
+LOCK_FILE = ".index.lock"
+
+# Files of at least this many bytes are stored gzip-compressed
+COMPRESS_MIN_BYTES = 64 * 1024
+
+COMPRESSION_LEVEL = 6
+
+# Bytes read at a time while hashing and compressing
+BLOCK_SIZE = 1024 * 1024
+
+# Maximum length of a file name
+MAX_NAME_LENGTH = 255
+
+
+class UserFileStore:
+    """Files saved by users, with an index so listing and serving do not walk the directory.
+
+    Each user directory has an index, .index.json, with the name, size, modification time
+    and SHA-256 of each file, and the name and encoding of the file on disk. Large files are
+    stored as <name>.gz and sent compressed to clients that accept gzip. The index is changed
+    under a lock and replaced atomically, so readers do not lock.
+    Directories from before the index are indexed on first use, and files written to a
+    directory outside of the store are indexed when it is listed.
+    """
+
+    @staticmethod
+    def get_accel_prefix():
+        """Get the internal location of the user directories in nginx, for X-Accel-Redirect.
+        The location should set gzip_static always and gunzip on, so that nginx serves <name>.gz
+        with ranges and decompresses it for clients that do not accept gzip.
+        :return: prefix or None if files are sent by the application
+        """
+        return os.environ.get("USER_FILES_ACCEL_PREFIX")
+
+    @staticmethod
+    def is_valid_name(name):
+        """Check that a file name can be stored in a user directory
+        :param name: file name
+        :return: True if the name is valid
+        """
+        return (
+            0 < len(name) <= MAX_NAME_LENGTH
+            and not name.startswith(".")
+            and not name.endswith(".gz")
+            and not any(c in name for c in "/\\\0")
+        )
+
+    @staticmethod
+    def hash_file(path):
+        """Get the SHA-256 of a file
+        :param path: path of the file
+        :return: hex SHA-256
+        """
+        sha256 = hashlib.sha256()
+        with open(path, "rb") as f:
+            while True:
+                block = f.read(BLOCK_SIZE)
+                if not block:
+                    break
+                sha256.update(block)
+        return sha256.hexdigest()
+
+    @staticmethod
+    def read_index(user_dir):
+        """Read the index of a user directory
+        :param user_dir: directory of the user's files
+        :return: dict of name: entry, or None if the directory has no index
+        """
+        try:
+            with open(os.path.join(user_dir, INDEX_FILE)) as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return None
+
+    @staticmethod
+    def write_index(user_dir, index):
+        """Replace the index of a user directory. The caller holds the lock.
+        :param user_dir: directory of the user's files
+        :param index: dict of name: entry
+        """
+        tmp_path = os.path.join(user_dir, INDEX_FILE + "." + uuid.uuid4().hex)
+        with open(tmp_path, "w") as f:
+            json.dump(index, f)
+        os.replace(tmp_path, os.path.join(user_dir, INDEX_FILE))
+
+    @staticmethod
+    def lock(user_dir):
+        """Lock the index of a user directory, across processes
+        :param user_dir: directory of the user's files
+        :return: file object holding the lock, closed to release it
+        """
+        f = open(os.path.join(user_dir, LOCK_FILE), "a")
+        fcntl.flock(f, fcntl.LOCK_EX)
+        return f
+
+    @staticmethod
+    def get_entry(name, stored, encoding, size, sha256):
+        """Make an index entry
+        :param name: file name
+        :param stored: name of the file on disk
+        :param encoding: gzip or None
+        :param size: uncompressed size in bytes
+        :param sha256: hex SHA-256 of the uncompressed file
+        :return: dict
+        """
+        return {
+            "name": name,
+            "stored": stored,
+            "encoding": encoding,
+            "size": size,
+            "mtime": time.time(),
+            "sha256": sha256,
+        }
+
+    @staticmethod
+    def build_index(user_dir, index=None):
+        """Index the files of a directory that are not in its index, and drop the entries of
+        files that are gone. Files may be written to the directory outside of the store.
+        The caller holds the lock.
+        :param user_dir: directory of the user's files
+        :param index: dict of name: entry, or None if the directory has no index yet
+        :return: dict of name: entry
+        """
+        index = {
+            name: entry
+            for name, entry in (index or {}).items()
+            if os.path.isfile(os.path.join(user_dir, entry["stored"]))
+        }
+        for name in os.listdir(user_dir):
+            path = os.path.join(user_dir, name)
+            if (
+                name not in index
+                and UserFileStore.is_valid_name(name)
+                and os.path.isfile(path)
+            ):
+                entry = UserFileStore.get_entry(
+                    name,
+                    name,
+                    None,
+                    os.path.getsize(path),
+                    UserFileStore.hash_file(path),
+                )
+                entry["mtime"] = os.path.getmtime(path)
+                index[name] = entry
+        UserFileStore.write_index(user_dir, index)
+        return index
+
+    @staticmethod
+    def load_index(user_dir):
+        """Get the index of a user directory, indexing it first if needed
+        :param user_dir: directory of the user's files
+        :return: dict of name: entry, or None if the directory does not exist
+        """
+        index = UserFileStore.read_index(user_dir)
+        if index is not None:
+            return index
+        if not os.path.isdir(user_dir):
+            return None
+        return UserFileStore.refresh_index(user_dir)
+
+    @staticmethod
+    def refresh_index(user_dir):
+        """Add the files of a user directory that are not in its index
+        :param user_dir: directory of the user's files
+        :return: dict of name: entry
+        """
+        lock = UserFileStore.lock(user_dir)
+        try:
+            # Another worker may have indexed the directory first
+            index = UserFileStore.read_index(user_dir)
+            return UserFileStore.build_index(user_dir, index)
+        finally:
+            lock.close()
+
+    @staticmethod
+    def is_indexed(user_dir, index):
+        """Check that the index of a user directory has each of its files, with one read of
+        the directory
+        :param user_dir: directory of the user's files
+        :param index: dict of name: entry
+        :return: True if no files were added or removed outside of the store
+        """
+        stored = {entry["stored"] for entry in index.values()}
+        with os.scandir(user_dir) as entries:
+            names = {
+                entry.name
+                for entry in entries
+                if entry.is_file()
+                and (entry.name in stored or UserFileStore.is_valid_name(entry.name))
+            }
+        return names == stored
+
+    @staticmethod
+    def list_files(user_dir):
+        """List the files of a user directory, like os.walk: the names of the files in the
+        directory, then the names of the files in each subdirectory
+        :param user_dir: directory of the user's files
+        :return: list of lists of names, or None if the directory does not exist
+        """
+        index = UserFileStore.load_index(user_dir)
+        if index is None:
+            return None
+        if not UserFileStore.is_indexed(user_dir, index):
+            index = UserFileStore.refresh_index(user_dir)
+
+        files = [sorted(index)]
+        for name in sorted(os.listdir(user_dir)):
+            path = os.path.join(user_dir, name)
+            if not os.path.islink(path) and os.path.isdir(path):
+                files.extend(walk[2] for walk in os.walk(path))
+        return files
+
+    @staticmethod
+    def get(user_dir, name):
+        """Get the index entry of a file
+        :param user_dir: directory of the user's files
+        :param name: file name
+        :return: dict of the entry, or None if the file does not exist
+        """
+        index = UserFileStore.load_index(user_dir)
+        if index is None:
+            return None
+        if name not in index and os.path.isfile(os.path.join(user_dir, name)):
+            # The file was written outside of the store
+            index = UserFileStore.refresh_index(user_dir)
+        return index.get(name)
+
+    @staticmethod
+    def compress(path):
+        """Compress a file next to itself
+        :param path: path of the file
+        :return: path of the compressed file
+        """
+        gz_path = path + ".gz"
+        with open(path, "rb") as src, open(gz_path, "wb") as dst:
+            # No name or time in the header, so the same content gives the same bytes
+            with gzip.GzipFile(
+                filename="",
+                mode="wb",
+                fileobj=dst,
+                compresslevel=COMPRESSION_LEVEL,
+                mtime=0,
+            ) as gz:
+                shutil.copyfileobj(src, gz, BLOCK_SIZE)
+        return gz_path
+
+    @staticmethod
+    def save(user_dir, name, stream):
+        """Save a file and add it to the index. Large files are stored compressed.
+        :param user_dir: directory of the user's files
+        :param name: file name
+        :param stream: file object of the content
+        :return: dict of the index entry
+        """
+        os.makedirs(user_dir, exist_ok=True)
+        tmp_path = os.path.join(user_dir, "." + uuid.uuid4().hex + ".tmp")
+        sha256 = hashlib.sha256()
+        size = 0
+        try:
+            with open(tmp_path, "wb") as f:
+                while True:
+                    block = stream.read(BLOCK_SIZE)
+                    if not block:
+                        break
+                    sha256.update(block)
+                    size += len(block)
+                    f.write(block)
+
+            stored, encoding = name, None
+            if size >= COMPRESS_MIN_BYTES:
+                gz_path = UserFileStore.compress(tmp_path)
+                if os.path.getsize(gz_path) < size:
+                    os.replace(gz_path, tmp_path)
+                    stored, encoding = name + ".gz", "gzip"
+                else:
+                    os.remove(gz_path)
+        except Exception:
+            os.remove(tmp_path)
+            raise
+
+        entry = UserFileStore.get_entry(
+            name, stored, encoding, size, sha256.hexdigest()
+        )
+        lock = UserFileStore.lock(user_dir)
+        try:
+            index = UserFileStore.read_index(user_dir)
+            if index is None:
+                index = UserFileStore.build_index(user_dir)
+            previous = index.get(name)
+            os.replace(tmp_path, os.path.join(user_dir, stored))
+            if previous is not None and previous["stored"] != stored:
+                try:
+                    os.remove(os.path.join(user_dir, previous["stored"]))
+                except FileNotFoundError:
+                    pass
+            index[name] = entry
+            UserFileStore.write_index(user_dir, index)
+        finally:
+            lock.close()
+        return entry
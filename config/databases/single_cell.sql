@@ -36,7 +36,8 @@ CREATE TABLE `sample_data` (
   `data_probeset_id` varchar(24) NOT NULL,
   `data_signal` float DEFAULT 0,
   `data_bot_id` varchar(32) NOT NULL,
-  KEY `data_probeset_id` (`data_probeset_id`,`data_bot_id`,`data_signal`)
+  KEY `data_probeset_id` (`data_probeset_id`,`data_bot_id`,`data_signal`),
+  KEY `data_bot_id` (`data_bot_id`,`data_signal`)
 ) ENGINE=InnoDB DEFAULT CHARSET=latin1;
 /*!40101 SET character_set_client = @saved_cs_client */;
 
@@ -49,6 +50,35 @@ LOCK TABLES `sample_data` WRITE;
 INSERT INTO `sample_data` VALUES ('1',1,'AT1G01010',0.330615,'cluster0_WT1.ExprMean'),('1',2,'AT1G01010',0.376952,'cluster0_WT2.ExprMean'),('1',3,'AT1G01010',0.392354,'cluster0_WT3.ExprMean'),('1',4,'AT1G01010',0.104124,'cluster1_WT1.ExprMean'),('1',5,'AT1G01010',0.183412,'cluster1_WT2.ExprMean'),('1',6,'AT1G01010',0.165289,'cluster1_WT3.ExprMean'),('1',7,'AT1G01010',0.0327218,'cluster2_WT1.ExprMean'),('1',8,'AT1G01010',0.0337024,'cluster2_WT2.ExprMean'),('1',9,'AT1G01010',0.0206359,'cluster2_WT3.ExprMean'),('1',10,'AT1G01010',0.214786,'cluster3_WT1.ExprMean'),('1',11,'AT1G01010',0.241307,'cluster3_WT2.ExprMean'),('1',12,'AT1G01010',0.134913,'cluster3_WT3.ExprMean'),('1',13,'AT1G01010',0.117571,'cluster4_WT1.ExprMean'),('1',14,'AT1G01010',0.0735138,'cluster4_WT2.ExprMean'),('1',15,'AT1G01010',0.116268,'cluster4_WT3.ExprMean'),('1',16,'AT1G01010',0.0439212,'cluster5_WT1.ExprMean'),('1',17,'AT1G01010',0.0570379,'cluster5_WT2.ExprMean'),('1',18,'AT1G01010',0.0779526,'cluster5_WT3.ExprMean'),('1',19,'AT1G01010',0.379817,'cluster6_WT1.ExprMean'),('1',20,'AT1G01010',0.640221,'cluster6_WT2.ExprMean'),('1',21,'AT1G01010',0.357844,'cluster6_WT3.ExprMean'),('1',22,'AT1G01010',0.555463,'cluster7_WT1.ExprMean'),('1',23,'AT1G01010',0.671035,'cluster7_WT2.ExprMean'),('1',24,'AT1G01010',0.505183,'cluster7_WT3.ExprMean'),('1',25,'AT1G01010',0.0302899,'cluster8_WT1.ExprMean'),('1',26,'AT1G01010',0,'cluster8_WT2.ExprMean'),('1',27,'AT1G01010',0.0236176,'cluster8_WT3.ExprMean'),('1',28,'AT1G01010',0.675148,'cluster9_WT1.ExprMean'),('1',29,'AT1G01010',0.750971,'cluster9_WT2.ExprMean'),('1',30,'AT1G01010',0.613557,'cluster9_WT3.ExprMean'),('1',31,'AT1G01010',0.0399103,'cluster10_WT1.ExprMean'),('1',32,'AT1G01010',0.0128781,'cluster10_WT2.ExprMean'),('1',33,'AT1G01010',0.00493557,'cluster10_WT3.ExprMean'),('1',34,'AT1G01010',0.180303,'cluster11_WT1.ExprMean'),('1',35,'AT1G01010',0.292895,'cluster11_WT2.ExprMean'),('1',36,'AT1G01010',0.113247,'cluster11_WT3.ExprMean'),('1',37,'AT1G01010',0.225366,'cluster12_WT1.ExprMean'),('1',38,'AT1G01010',0.31592,'cluster12_WT2.ExprMean'),('1',39,'AT1G01010',0.255742,'cluster12_WT3.ExprMean'),('1',40,'AT1G01010',0.147108,'cluster13_WT1.ExprMean'),('1',41,'AT1G01010',0.241902,'cluster13_WT2.ExprMean'),('1',42,'AT1G01010',0.251595,'cluster13_WT3.ExprMean'),('1',43,'AT1G01010',0.683089,'cluster14_WT1.ExprMean'),('1',44,'AT1G01010',0.75138,'cluster14_WT2.ExprMean'),('1',45,'AT1G01010',0.616441,'cluster14_WT3.ExprMean'),('1',46,'AT1G01010',0.0577139,'cluster15_WT1.ExprMean'),('1',47,'AT1G01010',0.115468,'cluster15_WT2.ExprMean'),('1',48,'AT1G01010',0.0141389,'cluster15_WT3.ExprMean'),('1',49,'AT1G01010',0.177473,'cluster16_WT1.ExprMean'),('1',50,'AT1G01010',0.222742,'cluster16_WT2.ExprMean'),('1',51,'AT1G01010',0.0914264,'cluster16_WT3.ExprMean'),('1',52,'AT1G01010',0.0408065,'cluster17_WT1.ExprMean'),('1',53,'AT1G01010',0.0645613,'cluster17_WT2.ExprMean'),('1',54,'AT1G01010',0.0309355,'cluster17_WT3.ExprMean'),('1',55,'AT1G01010',0.697676,'cluster18_WT1.ExprMean'),('1',56,'AT1G01010',0.794452,'cluster18_WT2.ExprMean'),('1',57,'AT1G01010',0.951476,'cluster18_WT3.ExprMean'),('1',58,'AT1G01010',0.314653,'cluster19_WT1.ExprMean'),('1',59,'AT1G01010',0.456848,'cluster19_WT2.ExprMean'),('1',60,'AT1G01010',0.337701,'cluster19_WT3.ExprMean'),('1',61,'AT1G01010',0.311621,'cluster20_WT1.ExprMean'),('1',62,'AT1G01010',0.505607,'cluster20_WT2.ExprMean'),('1',63,'AT1G01010',0.466686,'cluster20_WT3.ExprMean'),('1',64,'AT1G01010',0.279148,'cluster21_WT1.ExprMean'),('1',65,'AT1G01010',0.307624,'cluster21_WT2.ExprMean'),('1',66,'AT1G01010',0.273229,'cluster21_WT3.ExprMean'),('1',67,'AT1G01010',0.154758,'cluster22_WT1.ExprMean'),('1',68,'AT1G01010',0.246915,'cluster22_WT2.ExprMean'),('1',69,'AT1G01010',0.215633,'cluster22_WT3.ExprMean'),('1',70,'AT1G01010',0.278561,'cluster23_WT1.ExprMean'),('1',71,'AT1G01010',0.313757,'cluster23_WT2.ExprMean'),('1',72,'AT1G01010',0.341591,'cluster23_WT3.ExprMean'),('1',73,'AT1G01010',0.399525,'cluster24_WT1.ExprMean'),('1',74,'AT1G01010',0.326986,'cluster24_WT2.ExprMean'),('1',75,'AT1G01010',0.328818,'cluster24_WT3.ExprMean'),('1',76,'AT1G01010',0.0799877,'cluster25_WT1.ExprMean'),('1',77,'AT1G01010',0.0296777,'cluster25_WT2.ExprMean'),('1',78,'AT1G01010',0.0202025,'cluster25_WT3.ExprMean'),('1',79,'AT1G01010',0.0290226,'cluster26_WT1.ExprMean'),('1',80,'AT1G01010',0,'cluster26_WT2.ExprMean'),('1',81,'AT1G01010',0,'cluster26_WT3.ExprMean'),('1',82,'AT1G01010',0.0924709,'cluster27_WT1.ExprMean'),('1',83,'AT1G01010',0.0508237,'cluster27_WT2.ExprMean'),('1',84,'AT1G01010',0.00982657,'cluster27_WT3.ExprMean'),('1',85,'AT1G01010',0.0557328,'cluster28_WT1.ExprMean'),('1',86,'AT1G01010',0.101592,'cluster28_WT2.ExprMean'),('1',87,'AT1G01010',0.107528,'cluster28_WT3.ExprMean'),('1',88,'AT1G01010',0.291406,'cluster29_WT1.ExprMean'),('1',89,'AT1G01010',0.231561,'cluster29_WT2.ExprMean'),('1',90,'AT1G01010',0.201914,'cluster29_WT3.ExprMean'),('1',91,'AT1G01010',0.0319319,'cluster30_WT1.ExprMean'),('1',92,'AT1G01010',0.111761,'cluster30_WT2.ExprMean'),('1',93,'AT1G01010',0.157263,'cluster30_WT3.ExprMean'),('1',94,'AT1G01010',0.52613,'cluster31_WT1.ExprMean'),('1',95,'AT1G01010',0.566468,'cluster31_WT2.ExprMean'),('1',96,'AT1G01010',0.436468,'cluster31_WT3.ExprMean'),('1',97,'AT1G01010',0.342944,'cluster32_WT1.ExprMean'),('1',98,'AT1G01010',0.371802,'cluster32_WT2.ExprMean'),('1',99,'AT1G01010',0.275506,'cluster32_WT3.ExprMean'),('1',100,'AT1G01010',0.147324,'cluster33_WT1.ExprMean'),('1',101,'AT1G01010',0,'cluster33_WT2.ExprMean'),('1',102,'AT1G01010',0.0330883,'cluster33_WT3.ExprMean'),('1',103,'AT1G01010',0.0535194,'cluster34_WT1.ExprMean'),('1',104,'AT1G01010',0,'cluster34_WT2.ExprMean'),('1',105,'AT1G01010',0,'cluster34_WT3.ExprMean'),('1',106,'AT1G01010',0.224244,'cluster35_WT1.ExprMean'),('1',107,'AT1G01010',0,'cluster35_WT2.ExprMean'),('1',108,'AT1G01010',0.118697,'cluster35_WT3.ExprMean'),('1',109,'AT1G01010',0.192663,'Med_CTRL');
 /*!40000 ALTER TABLE `sample_data` ENABLE KEYS */;
 UNLOCK TABLES;
+
+--
+-- Table structure for table `cluster_aggregate`
+--
+
+DROP TABLE IF EXISTS `cluster_aggregate`;
+/*!40101 SET @saved_cs_client     = @@character_set_client */;
+/*!40101 SET character_set_client = utf8 */;
+CREATE TABLE `cluster_aggregate` (
+  `data_probeset_id` varchar(24) NOT NULL,
+  `cluster` varchar(32) NOT NULL,
+  `mean` float NOT NULL,
+  `sd` float DEFAULT NULL,
+  `n` int(11) NOT NULL,
+  `min` float NOT NULL,
+  `max` float NOT NULL,
+  PRIMARY KEY (`data_probeset_id`,`cluster`)
+) ENGINE=InnoDB DEFAULT CHARSET=latin1;
+/*!40101 SET character_set_client = @saved_cs_client */;
+
+--
+-- Dumping data for table `cluster_aggregate`
+--
+
+LOCK TABLES `cluster_aggregate` WRITE;
+/*!40000 ALTER TABLE `cluster_aggregate` DISABLE KEYS */;
+INSERT INTO `cluster_aggregate` VALUES ('AT1G01010','cluster0',0.36664,0.0321352,3,0.330615,0.392354),('AT1G01010','cluster1',0.150942,0.0415455,3,0.104124,0.183412),('AT1G01010','cluster2',0.02902,0.00727741,3,0.0206359,0.0337024),('AT1G01010','cluster3',0.197002,0.0553816,3,0.134913,0.241307),('AT1G01010','cluster4',0.102451,0.0250688,3,0.0735138,0.117571),('AT1G01010','cluster5',0.0596372,0.017164,3,0.0439212,0.0779526),('AT1G01010','cluster6',0.459294,0.157072,3,0.357844,0.640221),('AT1G01010','cluster7',0.577227,0.085041,3,0.505183,0.671035),('AT1G01010','cluster8',0.0179692,0.0159153,3,0,0.0302899),('AT1G01010','cluster9',0.679892,0.0688297,3,0.613557,0.750971),('AT1G01010','cluster10',0.0192413,0.0183351,3,0.00493557,0.0399103),('AT1G01010','cluster11',0.195482,0.0907808,3,0.113247,0.292895),('AT1G01010','cluster12',0.265676,0.0460871,3,0.225366,0.31592),('AT1G01010','cluster13',0.213535,0.0577313,3,0.147108,0.251595),('AT1G01010','cluster14',0.683637,0.0674712,3,0.616441,0.75138),('AT1G01010','cluster15',0.0624403,0.0508296,3,0.0141389,0.115468),('AT1G01010','cluster16',0.16388,0.0667047,3,0.0914264,0.222742),('AT1G01010','cluster17',0.0454344,0.017284,3,0.0309355,0.0645613),('AT1G01010','cluster18',0.814535,0.128086,3,0.697676,0.951476),('AT1G01010','cluster19',0.369734,0.076318,3,0.314653,0.456848),('AT1G01010','cluster20',0.427971,0.102624,3,0.311621,0.505607),('AT1G01010','cluster21',0.286667,0.018389,3,0.273229,0.307624),('AT1G01010','cluster22',0.205769,0.0468637,3,0.154758,0.246915),('AT1G01010','cluster23',0.311303,0.0315866,3,0.278561,0.341591),('AT1G01010','cluster24',0.351776,0.0413617,3,0.326986,0.399525),('AT1G01010','cluster25',0.0432893,0.0321329,3,0.0202025,0.0799877),('AT1G01010','cluster26',0.0096742,0.0167562,3,0,0.0290226),('AT1G01010','cluster27',0.0510404,0.0413226,3,0.00982657,0.0924709),('AT1G01010','cluster28',0.0882843,0.0283462,3,0.0557328,0.107528),('AT1G01010','cluster29',0.241627,0.0455873,3,0.201914,0.291406),('AT1G01010','cluster30',0.100319,0.0634442,3,0.0319319,0.157263),('AT1G01010','cluster31',0.509689,0.0665413,3,0.436468,0.566468),('AT1G01010','cluster32',0.330084,0.0494193,3,0.275506,0.371802),('AT1G01010','cluster33',0.0601374,0.077297,3,0,0.147324),('AT1G01010','cluster34',0.0178398,0.0308994,3,0,0.0535194),('AT1G01010','cluster35',0.114314,0.112186,3,0,0.224244);
+/*!40000 ALTER TABLE `cluster_aggregate` ENABLE KEYS */;
+UNLOCK TABLES;
 /*!40103 SET TIME_ZONE=@OLD_TIME_ZONE */;
 
 /*!40101 SET SQL_MODE=@OLD_SQL_MODE */;
@@ -32,11 +32,12 @@ DROP TABLE IF EXISTS `bb5a52387069485486b2f4861c2826dd`;
 /*!40101 SET @saved_cs_client     = @@character_set_client */;
 /*!40101 SET character_set_client = utf8 */;
 CREATE TABLE `bb5a52387069485486b2f4861c2826dd` (
-  `index` bigint(20) DEFAULT NULL,
-  `Gene` text DEFAULT NULL,
-  `Sample` text DEFAULT NULL,
+  `index` bigint(20) NOT NULL,
+  `Gene` varchar(32) NOT NULL,
+  `Sample` varchar(64) NOT NULL,
   `Value` float DEFAULT NULL,
-  KEY `ix_bb5a52387069485486b2f4861c2826dd_index` (`index`)
+  PRIMARY KEY (`index`),
+  KEY `ix_bb5a52387069485486b2f4861c2826dd_gene_sample` (`Gene`,`Sample`)
 ) ENGINE=InnoDB DEFAULT CHARSET=latin1;
 /*!40101 SET character_set_client = @saved_cs_client */;
 
@@ -75,6 +76,81 @@ INSERT INTO `requests` VALUES ('Some','Request','request@gmail.com','Test notes'
 /*!40000 ALTER TABLE `requests` ENABLE KEYS */;
 UNLOCK TABLES;
 
+--
+-- Table structure for table `table_catalog`
+--
+
+DROP TABLE IF EXISTS `table_catalog`;
+/*!40101 SET @saved_cs_client     = @@character_set_client */;
+/*!40101 SET character_set_client = utf8 */;
+CREATE TABLE `table_catalog` (
+  `table_id` varchar(64) NOT NULL,
+  `row_count` bigint(20) NOT NULL DEFAULT 0,
+  `last_modified` datetime NOT NULL,
+  PRIMARY KEY (`table_id`)
+) ENGINE=InnoDB DEFAULT CHARSET=latin1;
+/*!40101 SET character_set_client = @saved_cs_client */;
+
+--
+-- Dumping data for table `table_catalog`
+--
+
+LOCK TABLES `table_catalog` WRITE;
+/*!40000 ALTER TABLE `table_catalog` DISABLE KEYS */;
+INSERT INTO `table_catalog` VALUES ('bb5a52387069485486b2f4861c2826dd',6,'2021-01-12 18:22:44');
+/*!40000 ALTER TABLE `table_catalog` ENABLE KEYS */;
+UNLOCK TABLES;
+
+--
+-- Table structure for table `table_catalog_gene`
+--
+
+DROP TABLE IF EXISTS `table_catalog_gene`;
+/*!40101 SET @saved_cs_client     = @@character_set_client */;
+/*!40101 SET character_set_client = utf8 */;
+CREATE TABLE `table_catalog_gene` (
+  `table_id` varchar(64) NOT NULL,
+  `gene` varchar(32) NOT NULL,
+  `position` int(11) NOT NULL,
+  PRIMARY KEY (`table_id`,`gene`)
+) ENGINE=InnoDB DEFAULT CHARSET=latin1;
+/*!40101 SET character_set_client = @saved_cs_client */;
+
+--
+-- Dumping data for table `table_catalog_gene`
+--
+
+LOCK TABLES `table_catalog_gene` WRITE;
+/*!40000 ALTER TABLE `table_catalog_gene` DISABLE KEYS */;
+INSERT INTO `table_catalog_gene` VALUES ('bb5a52387069485486b2f4861c2826dd','AT1G01010',0),('bb5a52387069485486b2f4861c2826dd','AT1G01020',1),('bb5a52387069485486b2f4861c2826dd','AT1G01030',2);
+/*!40000 ALTER TABLE `table_catalog_gene` ENABLE KEYS */;
+UNLOCK TABLES;
+
+--
+-- Table structure for table `table_catalog_sample`
+--
+
+DROP TABLE IF EXISTS `table_catalog_sample`;
+/*!40101 SET @saved_cs_client     = @@character_set_client */;
+/*!40101 SET character_set_client = utf8 */;
+CREATE TABLE `table_catalog_sample` (
+  `table_id` varchar(64) NOT NULL,
+  `sample` varchar(64) NOT NULL,
+  `position` int(11) NOT NULL,
+  PRIMARY KEY (`table_id`,`sample`)
+) ENGINE=InnoDB DEFAULT CHARSET=latin1;
+/*!40101 SET character_set_client = @saved_cs_client */;
+
+--
+-- Dumping data for table `table_catalog_sample`
+--
+
+LOCK TABLES `table_catalog_sample` WRITE;
+/*!40000 ALTER TABLE `table_catalog_sample` DISABLE KEYS */;
+INSERT INTO `table_catalog_sample` VALUES ('bb5a52387069485486b2f4861c2826dd','sample1',0),('bb5a52387069485486b2f4861c2826dd','sample2',1);
+/*!40000 ALTER TABLE `table_catalog_sample` ENABLE KEYS */;
+UNLOCK TABLES;
+
 --
 -- Table structure for table `users`
 --
@@ -1,5 +1,7 @@
 from api import app
+from api.utils.api_key_cache import ApiKeyCache
 from unittest import TestCase
+from unittest.mock import patch
 import json
 
 
@@ -17,6 +19,18 @@ class TestIntegrations(TestCase):
         self.assertEqual(response.status_code, 200)
         self.assertEqual(data, expected)
 
+        # Keys with NULL uses left are expired
+        with patch.object(
+            ApiKeyCache, "get", return_value={"status": "user", "uses_left": None}
+        ):
+            response = self.app_client.post(
+                "/api_manager/validate_api_key", json={"key": "abc"}
+            )
+        self.assertEqual(response.status_code, 401)
+        self.assertEqual(
+            response.json, {"wasSuccessful": False, "error": "API key expired"}
+        )
+
     def test_1_request(self):
         # testPassword set in the test config
         response = self.app_client.post(
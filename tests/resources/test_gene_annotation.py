@@ -12,3 +12,23 @@ class TestIntegrations(TestCase):
         self.assertEqual(response["status"], "success")
         annotation = response["result"][0]["gene_annotation"]
         self.assertIn(test_query, annotation)
+
+    def test_gene_lookup(self):
+        response = self.app_client.get("/gene_annotation/arabidopsis/At1g01020").json
+        expected = {
+            "wasSuccessful": True,
+            "data": [{"gene": "At1g01020", "annotation": "ARV1__Arv1-like protein"}],
+        }
+        self.assertEqual(response, expected)
+
+        # Poplar and tomato annotations are found by isoform
+        response = self.app_client.get("/gene_annotation/poplar/potri.001g000500").json
+        self.assertEqual(
+            [row["gene"] for row in response["data"]], ["Potri.001G000500.1"]
+        )
+
+        response = self.app_client.get("/gene_annotation/arabidopsis/At1g0102x")
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(
+            response.json, {"wasSuccessful": False, "error": "Invalid gene id"}
+        )
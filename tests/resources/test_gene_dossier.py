@@ -0,0 +1,49 @@
+from api import app
+from unittest import TestCase
+from unittest.mock import patch
+
+
+class TestIntegrations(TestCase):
+    def setUp(self):
+        self.app_client = app.test_client()
+
+    @patch("api.resources.thalemine.requests.post")
+    def test_get_gene_dossier(self, post):
+        """This tests the data returned by the gene dossier end point
+        :return:
+        """
+        # ThaleMine is not called
+        thalemine = {"results": [], "wasSuccessful": True}
+        post.return_value.json.return_value = thalemine
+
+        # Valid data
+        response = self.app_client.get("/gene_dossier/arabidopsis/At3g24650")
+        data = response.json["data"]
+        self.assertTrue(response.json["wasSuccessful"])
+        self.assertEqual(
+            sorted(data.keys()),
+            ["gene_alias", "gene_annotation", "gene_isoforms", "gene_rifs"],
+        )
+        expected = {"wasSuccessful": True, "data": ["ABI3", "AtABI3", "SIS10"]}
+        self.assertEqual(data["gene_alias"], expected)
+        self.assertEqual(data["gene_rifs"], thalemine)
+
+        # Sections validate the gene themselves
+        response = self.app_client.get("/gene_dossier/arabidopsis/At3g2465x")
+        expected = {"wasSuccessful": False, "error": "Invalid gene id"}
+        self.assertEqual(response.json["data"]["gene_alias"], expected)
+
+        # Invalid species
+        response = self.app_client.get("/gene_dossier/abc/At3g24650")
+        expected = {"wasSuccessful": False, "error": "Invalid species"}
+        self.assertEqual(response.json, expected)
+
+        # Invalid timeout
+        response = self.app_client.get(
+            "/gene_dossier/arabidopsis/At3g24650?timeout=abc"
+        )
+        expected = {"wasSuccessful": False, "error": "Invalid timeout"}
+        self.assertEqual(response.json, expected)
+
+        response = self.app_client.get("/gene_dossier/arabidopsis/At3g24650?timeout=0")
+        self.assertEqual(response.json, expected)
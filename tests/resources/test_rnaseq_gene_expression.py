@@ -149,3 +149,219 @@ class TestIntegrations(TestCase):
         response = self.app_client.post("/rnaseq_gene_expression/", json=data)
         expected = {"wasSuccessful": False, "error": "Invalid sample id"}
         self.assertEqual(response.json, expected)
+
+    def test_post_arabidopsis_single_cell_matrix(self):
+        """This tests the gene x sample matrix returned for Arabidopsis single cell database.
+        :return:
+        """
+        # Valid example. Genes without data are returned as missing values.
+        data = {
+            "species": "arabidopsis",
+            "database": "single_cell",
+            "genes": ["At1g01010", "At1g01011"],
+            "sample_ids": [
+                "cluster0_WT1.ExprMean",
+                "cluster0_WT2.ExprMean",
+                "cluster0_WT3.ExprMean",
+            ],
+        }
+        response = self.app_client.post("/rnaseq_gene_expression/matrix", json=data)
+        expected = {
+            "wasSuccessful": True,
+            "data": {
+                "genes": ["AT1G01010", "AT1G01011"],
+                "samples": [
+                    "cluster0_WT1.ExprMean",
+                    "cluster0_WT2.ExprMean",
+                    "cluster0_WT3.ExprMean",
+                ],
+                "values": [[0.330615, 0.376952, 0.392354], [None, None, None]],
+            },
+        }
+        self.assertEqual(response.json, expected)
+
+        # All samples
+        data = {
+            "species": "arabidopsis",
+            "database": "single_cell",
+            "genes": ["At1g01010"],
+        }
+        response = self.app_client.post("/rnaseq_gene_expression/matrix", json=data)
+        self.assertEqual(len(response.json["data"]["samples"]), 109)
+        self.assertEqual(len(response.json["data"]["values"][0]), 109)
+
+        # No data for valid genes
+        data = {
+            "species": "arabidopsis",
+            "database": "single_cell",
+            "genes": ["At1g01011"],
+        }
+        response = self.app_client.post("/rnaseq_gene_expression/matrix", json=data)
+        expected = {
+            "wasSuccessful": False,
+            "error": "There are no data found for the given genes",
+        }
+        self.assertEqual(response.json, expected)
+
+        # Invalid gene
+        data = {
+            "species": "arabidopsis",
+            "database": "single_cell",
+            "genes": ["At1g01010", "x?yx"],
+        }
+        response = self.app_client.post("/rnaseq_gene_expression/matrix", json=data)
+        expected = {"wasSuccessful": False, "error": "Invalid gene id"}
+        self.assertEqual(response.json, expected)
+
+        # Invalid sample ID
+        data = {
+            "species": "arabidopsis",
+            "database": "single_cell",
+            "genes": ["At1g01010"],
+            "sample_ids": ["cluster0_WT1.ExprMean", "x?yx"],
+        }
+        response = self.app_client.post("/rnaseq_gene_expression/matrix", json=data)
+        expected = {"wasSuccessful": False, "error": "Invalid sample id"}
+        self.assertEqual(response.json, expected)
+
+        # Empty gene list
+        data = {"species": "arabidopsis", "database": "single_cell", "genes": []}
+        response = self.app_client.post("/rnaseq_gene_expression/matrix", json=data)
+        expected = {
+            "wasSuccessful": False,
+            "error": {"genes": ["Shorter than minimum length 1."]},
+        }
+        self.assertEqual(response.json, expected)
+
+    def test_get_arabidopsis_single_cell_cluster_aggregates(self):
+        """This tests the per cluster statistics returned for Arabidopsis single cell database.
+        :return:
+        """
+        # Valid result
+        response = self.app_client.get(
+            "/rnaseq_gene_expression/cluster_aggregates/arabidopsis/single_cell/At1g01010"
+        )
+        data = response.json["data"]
+        self.assertEqual(len(data), 36)
+        self.assertEqual(data["cluster0"]["n"], 3)
+        self.assertAlmostEqual(data["cluster0"]["mean"], 0.36664, places=5)
+        self.assertAlmostEqual(data["cluster0"]["sd"], 0.0321352, places=5)
+        self.assertAlmostEqual(data["cluster0"]["min"], 0.330615, places=5)
+        self.assertAlmostEqual(data["cluster0"]["max"], 0.392354, places=5)
+
+        # Invalid gene
+        response = self.app_client.get(
+            "/rnaseq_gene_expression/cluster_aggregates/arabidopsis/single_cell/At1g0101x"
+        )
+        expected = {"wasSuccessful": False, "error": "Invalid gene id"}
+        self.assertEqual(response.json, expected)
+
+        # Invalid database
+        response = self.app_client.get(
+            "/rnaseq_gene_expression/cluster_aggregates/arabidopsis/abc/At1g01010"
+        )
+        expected = {"wasSuccessful": False, "error": "Invalid database"}
+        self.assertEqual(response.json, expected)
+
+        # No data for a valid gene
+        response = self.app_client.get(
+            "/rnaseq_gene_expression/cluster_aggregates/arabidopsis/single_cell/At1g01011"
+        )
+        expected = {
+            "wasSuccessful": False,
+            "error": "There are no data found for the given gene",
+        }
+        self.assertEqual(response.json, expected)
+
+    def test_get_arabidopsis_single_cell_top_genes(self):
+        """This tests the ranked genes returned for a sample in Arabidopsis single cell database.
+        :return:
+        """
+        # Valid result
+        response = self.app_client.get(
+            "/rnaseq_gene_expression/top_genes/arabidopsis/single_cell/cluster3_WT2.ExprMean?limit=5"
+        )
+        expected = {
+            "wasSuccessful": True,
+            "data": {
+                "sample_id": "cluster3_WT2.ExprMean",
+                "offset": 0,
+                "genes": ["AT1G01010"],
+                "values": [0.241307],
+            },
+        }
+        self.assertEqual(response.json, expected)
+
+        # Nothing above the threshold
+        response = self.app_client.get(
+            "/rnaseq_gene_expression/top_genes/arabidopsis/single_cell/cluster3_WT2.ExprMean?min_signal=0.5"
+        )
+        expected = {
+            "wasSuccessful": False,
+            "error": "There are no data found for the given sample",
+        }
+        self.assertEqual(response.json, expected)
+
+        # Invalid limit
+        response = self.app_client.get(
+            "/rnaseq_gene_expression/top_genes/arabidopsis/single_cell/cluster3_WT2.ExprMean?limit=abc"
+        )
+        expected = {"wasSuccessful": False, "error": "Invalid limit or offset"}
+        self.assertEqual(response.json, expected)
+
+        # Offset too large
+        response = self.app_client.get(
+            "/rnaseq_gene_expression/top_genes/arabidopsis/single_cell/cluster3_WT2.ExprMean?offset=100001"
+        )
+        self.assertEqual(response.json, expected)
+
+        # Invalid minimum signal
+        for min_signal in ["abc", "nan", "inf", "-Infinity"]:
+            response = self.app_client.get(
+                "/rnaseq_gene_expression/top_genes/arabidopsis/single_cell/cluster3_WT2.ExprMean?min_signal="
+                + min_signal
+            )
+            expected = {"wasSuccessful": False, "error": "Invalid minimum signal"}
+            self.assertEqual(response.json, expected)
+        # Invalid sample id
+        response = self.app_client.get(
+            "/rnaseq_gene_expression/top_genes/arabidopsis/single_cell/abc;xyz"
+        )
+        expected = {"wasSuccessful": False, "error": "Invalid sample id"}
+        self.assertEqual(response.json, expected)
+
+    def test_get_arabidopsis_single_cell_coexpression(self):
+        """This tests the co-expression returned for Arabidopsis single cell database.
+        :return:
+        """
+        # Valid result. There is only one gene in the test database.
+        response = self.app_client.get(
+            "/rnaseq_gene_expression/coexpression/arabidopsis/single_cell/At1g01010"
+        )
+        expected = {
+            "wasSuccessful": True,
+            "data": {
+                "gene": "AT1G01010",
+                "method": "pearson",
+                "genes": [],
+                "values": [],
+            },
+        }
+        self.assertEqual(response.json, expected)
+
+        # Invalid method
+        response = self.app_client.get(
+            "/rnaseq_gene_expression/coexpression/arabidopsis/single_cell/At1g01010?method=abc"
+        )
+        expected = {"wasSuccessful": False, "error": "Invalid method"}
+        self.assertEqual(response.json, expected)
+
+        # Gene not in the database
+        response = self.app_client.get(
+            "/rnaseq_gene_expression/coexpression/arabidopsis/single_cell/At1g01011"
+        )
+        expected = {
+            "wasSuccessful": False,
+            "error": "There are no data found for the given gene",
+        }
+        self.assertEqual(response.json, expected)
@@ -1,6 +1,23 @@
-from api import app
+from api import app, summarization_db as db
+from api.resources.summarization_gene_expression import (
+    SummarizationGeneExpressionUtils,
+)
+from api.utils.bar_utils import BARUtils
+from api.utils.compressed_store import CompressedStore
+from api.utils.cromwell_queue import CromwellQueue
+from api.utils.drive_client import DriveClient
+from api.utils.summarization_loader import SummarizationLoader
+from api.utils.table_catalog import TableCatalogUtils
+from sqlalchemy.exc import SQLAlchemyError
 from unittest import TestCase
+from unittest.mock import patch
+import hashlib
+import io
 import json
+import os
+import requests
+import tempfile
+import threading
 
 
 class TestIntegrations(TestCase):
@@ -59,3 +76,335 @@ class TestIntegrations(TestCase):
         expected = {"wasSuccessful": True, "data": True}
         self.assertEqual(response.status_code, 200)
         self.assertEqual(data, expected)
+
+    def test_get_coexpression(self):
+        response = self.app_client.get(
+            "/summarization_gene_expression/coexpression/bb5a52387069485486b2f4861c2826dd/AT1G01010",
+            headers={"x-api-key": "bb5a52387069485486b2f4861c2826dd"},
+        )
+        data = json.loads(response.get_data(as_text=True))
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(data["data"]["genes"], ["AT1G01030", "AT1G01020"])
+        self.assertAlmostEqual(data["data"]["values"][0], 1, places=5)
+        self.assertAlmostEqual(data["data"]["values"][1], -1, places=5)
+
+        # Invalid method
+        response = self.app_client.get(
+            "/summarization_gene_expression/coexpression/bb5a52387069485486b2f4861c2826dd/AT1G01010?method=abc",
+            headers={"x-api-key": "bb5a52387069485486b2f4861c2826dd"},
+        )
+        self.assertEqual(response.status_code, 400)
+
+    def test_drop_table(self):
+        table_id = "droptest1"
+        key = {"x-api-key": "bb5a52387069485486b2f4861c2826dd"}
+        with app.app_context():
+            SummarizationGeneExpressionUtils.insert_csv(
+                table_id,
+                io.StringIO("Gene,s1,s2,s3,s4\nAT1G01010,1,2,3,4\nAT1G01020,4,3,2,1\n"),
+                "replace",
+            )
+
+        # Queries fill the caches of the table
+        url = "/summarization_gene_expression/"
+        coexpression = url + "coexpression/" + table_id + "/AT1G01010"
+        differential = url + "differential/" + table_id
+        groups = {"group1": ["s1", "s2"], "group2": ["s3", "s4"]}
+        find_gene = url + "find_gene/" + table_id + "/AT1G0101"
+        self.assertEqual(
+            self.app_client.get(coexpression, headers=key).status_code, 200
+        )
+        response = self.app_client.post(differential, json=groups, headers=key)
+        self.assertEqual(response.status_code, 200)
+        response = self.app_client.get(find_gene, headers=key)
+        self.assertEqual(response.json["data"], ["AT1G01010"])
+
+        self.app_client.get(url + "drop_table/" + table_id)
+
+        response = self.app_client.get(coexpression, headers=key)
+        self.assertEqual(response.status_code, 404)
+        self.assertEqual(
+            response.json, {"wasSuccessful": False, "error": "Table not found"}
+        )
+        response = self.app_client.post(differential, json=groups, headers=key)
+        self.assertEqual(response.status_code, 404)
+        response = self.app_client.get(find_gene, headers=key)
+        self.assertEqual(response.json["data"], [])
+
+    def test_missing_table_cache(self):
+        table_id = "missingtest1"
+        with app.app_context():
+            TableCatalogUtils.forget_missing(table_id)
+            with patch.object(
+                TableCatalogUtils, "backfill", wraps=TableCatalogUtils.backfill
+            ) as backfill:
+                self.assertIsNone(TableCatalogUtils.get_table(table_id))
+                self.assertIsNone(TableCatalogUtils.get_table(table_id))
+                self.assertEqual(backfill.call_count, 1)
+
+            # Inserted tables are found at once
+            SummarizationGeneExpressionUtils.insert_csv(
+                table_id, io.StringIO("Gene,s1\nAT1G01010,1\n"), "replace"
+            )
+            self.assertEqual(TableCatalogUtils.get_table(table_id).row_count, 1)
+        self.app_client.get("/summarization_gene_expression/drop_table/" + table_id)
+
+    def test_append_csv(self):
+        table_id = "appendtest1"
+        with app.app_context():
+            for csv in ["Gene,s1\nAT1G01010,1\n", "Gene,s2\nAT1G01010,2\n"]:
+                SummarizationGeneExpressionUtils.insert_csv(
+                    table_id, io.StringIO(csv), "append"
+                )
+            engine = db.get_engine(bind="summarization")
+            with engine.begin() as con:
+                self.assertEqual(TableCatalogUtils.lock(con, table_id), 2)
+                self.assertEqual(TableCatalogUtils.lock(con, "abc"), 0)
+        self.app_client.get("/summarization_gene_expression/drop_table/" + table_id)
+
+    def test_get_upload_name(self):
+        get_upload_name = SummarizationGeneExpressionUtils.get_upload_name
+        self.assertEqual(get_upload_name("tsv", "abundance.tsv", "s 1"), "s_1.tsv")
+        self.assertEqual(get_upload_name("tsv", "leaf/abundance.tsv"), "leaf.tsv")
+        self.assertEqual(get_upload_name("tsv", "leaf.tsv"), "leaf.tsv")
+        self.assertEqual(get_upload_name("tsv", "../"), "")
+        self.assertEqual(get_upload_name("csv", "data/leaf.csv"), "leaf.csv")
+
+    def test_tsv_upload_error(self):
+        # Database errors of uploads inserted in the request are not raised
+        tmp = tempfile.TemporaryDirectory()
+        with patch.object(
+            SummarizationGeneExpressionUtils, "get_user_dir", return_value=tmp.name
+        ), patch.object(
+            SummarizationGeneExpressionUtils, "decrement_uses", return_value=True
+        ), patch.object(
+            SummarizationGeneExpressionUtils,
+            "queue_upload",
+            side_effect=SQLAlchemyError,
+        ) as queue_upload:
+            response = self.app_client.post(
+                "/summarization_gene_expression/tsv_upload",
+                data={
+                    "file": (io.BytesIO(b"target_id\n"), "leaf/abundance.tsv"),
+                    "sample": "leaf1",
+                },
+                headers={"x-api-key": "bb5a52387069485486b2f4861c2826dd"},
+            )
+        self.assertEqual(response.status_code, 500)
+        self.assertEqual(
+            response.json, {"wasSuccessful": False, "error": "Internal server error"}
+        )
+        self.assertEqual(queue_upload.call_args[0][6], "leaf1.tsv")
+        tmp.cleanup()
+
+    def test_summarize_drive_error(self):
+        # No job is queued if Drive cannot be reached
+        with patch.object(
+            SummarizationGeneExpressionUtils, "decrement_uses", return_value=True
+        ), patch.object(DriveClient, "get_client") as get_client, patch.object(
+            CromwellQueue, "enqueue"
+        ) as enqueue:
+            get_client.return_value.list_files.side_effect = requests.ConnectionError
+            response = self.app_client.post(
+                "/summarization_gene_expression/summarize",
+                json={
+                    "species": "Athaliana",
+                    "email": "",
+                    "aliases": False,
+                    "csvEmail": False,
+                    "overwrite": True,
+                    "folderId": "folder1",
+                },
+                headers={"x-api-key": "bb5a52387069485486b2f4861c2826dd"},
+            )
+        self.assertEqual(response.status_code, 503)
+        self.assertEqual(
+            response.json, {"wasSuccessful": False, "error": "Drive is not available"}
+        )
+        enqueue.assert_not_called()
+
+    def test_matrix_cache_version(self):
+        table_id = "matrixversiontest1"
+        with app.app_context():
+            SummarizationGeneExpressionUtils.insert_csv(
+                table_id, io.StringIO("Gene,s1,s2\nAT1G01010,1,2\n"), "replace"
+            )
+            matrix = SummarizationGeneExpressionUtils.get_matrix_object(table_id)
+            self.assertEqual(matrix.genes, ["AT1G01010"])
+
+            # Inserts by other processes do not invalidate the cache of this one
+            with db.get_engine(bind="summarization").begin() as con:
+                SummarizationLoader.load_csv(
+                    con, table_id, io.StringIO("Gene,s1,s2\nAT1G01020,3,4\n"), 2
+                )
+            matrix = SummarizationGeneExpressionUtils.get_matrix_object(table_id)
+            self.assertEqual(sorted(matrix.genes), ["AT1G01010", "AT1G01020"])
+        self.app_client.get("/summarization_gene_expression/drop_table/" + table_id)
+
+    def test_compressed_on_insert(self):
+        table_id = "compressedtest1"
+        tmp = tempfile.TemporaryDirectory()
+        with patch.dict(os.environ, {"COMPRESSED_STORE_PATH": tmp.name}):
+            with app.app_context():
+                SummarizationGeneExpressionUtils.insert_csv(
+                    table_id, io.StringIO("Gene,s1\nAT1G01010,1\n"), "replace"
+                )
+            # Tables are only added to the compressed store by the export endpoint
+            self.assertEqual(os.listdir(tmp.name), [])
+            response = self.app_client.post(
+                "/summarization_gene_expression/compressed/export/" + table_id
+            )
+            self.assertEqual(response.status_code, 200)
+
+            # Compressed tables are rewritten by inserts
+            with app.app_context():
+                SummarizationGeneExpressionUtils.insert_csv(
+                    table_id, io.StringIO("Gene,s1\nAT1G01020,2\n"), "append"
+                )
+            matrix = CompressedStore.load(tmp.name, table_id)
+            self.assertEqual(sorted(matrix.genes), ["AT1G01010", "AT1G01020"])
+            self.app_client.get("/summarization_gene_expression/drop_table/" + table_id)
+        tmp.cleanup()
+
+    def test_upload_email(self):
+        table_id = "uploademailtest1"
+        tmp = tempfile.TemporaryDirectory()
+        path = os.path.join(tmp.name, "abundance.tsv")
+        with open("tests/data/kallisto_abundance.tsv", "rb") as src, open(
+            path, "wb"
+        ) as dst:
+            dst.write(src.read())
+
+        # Uploads inserted without the workflow are emailed like the workflow does
+        with patch.dict(os.environ, {"BAR": "true"}), patch.object(
+            BARUtils, "send_email"
+        ) as send_email, app.app_context():
+            SummarizationGeneExpressionUtils.queue_upload(
+                "tsv", table_id, path, "replace", "user@example.com", "abc", "leaf.tsv"
+            )
+            for thread in threading.enumerate():
+                if thread is not threading.current_thread() and thread.daemon:
+                    thread.join(1)
+        self.assertEqual(send_email.call_args[0][0], "user@example.com")
+        self.app_client.get("/summarization_gene_expression/drop_table/" + table_id)
+        tmp.cleanup()
+
+    def test_chunked_upload_name(self):
+        # Names of uploads that are directories of the user are not used as paths
+        tmp = tempfile.TemporaryDirectory()
+        os.makedirs(os.path.join(tmp.name, "content"))
+        key = {"x-api-key": "bb5a52387069485486b2f4861c2826dd"}
+        data = b"Gene,s1\nAT1G01010,1\n"
+        url = "/summarization_gene_expression/upload"
+        with patch.object(
+            SummarizationGeneExpressionUtils, "get_user_dir", return_value=tmp.name
+        ), patch.object(
+            SummarizationGeneExpressionUtils, "decrement_uses", return_value=True
+        ), patch.object(
+            SummarizationGeneExpressionUtils, "queue_upload", return_value="job1"
+        ) as queue_upload:
+            response = self.app_client.post(
+                url,
+                json={"filename": "content", "size": len(data), "type": "csv"},
+                headers=key,
+            )
+            upload_id = response.json["data"]["upload_id"]
+            response = self.app_client.put(
+                url + "/" + upload_id + "/0",
+                data=data,
+                headers=dict(
+                    key, **{"X-Chunk-Sha256": hashlib.sha256(data).hexdigest()}
+                ),
+            )
+            self.assertEqual(response.status_code, 200)
+            response = self.app_client.post(
+                url + "/" + upload_id + "/complete", headers=key
+            )
+        self.assertEqual(response.json, {"wasSuccessful": True, "data": "job1"})
+        self.assertEqual(queue_upload.call_args[0][6], "content")
+        with open(queue_upload.call_args[0][2], "rb") as f:
+            self.assertEqual(f.read(), data)
+        tmp.cleanup()
+
+    def test_table_object_cache(self):
+        with app.app_context():
+            SummarizationGeneExpressionUtils.invalidate_table("users")
+            tbl = SummarizationGeneExpressionUtils.get_table_object("users")
+            self.assertIs(
+                SummarizationGeneExpressionUtils.get_table_object("users"), tbl
+            )
+
+            # Invalidated tables are reflected again
+            SummarizationGeneExpressionUtils.invalidate_table("users")
+            self.assertIsNot(
+                SummarizationGeneExpressionUtils.get_table_object("users"), tbl
+            )
+
+    def test_get_matrix(self):
+        response = self.app_client.post(
+            "/summarization_gene_expression/matrix/bb5a52387069485486b2f4861c2826dd",
+            json={
+                "genes": ["At1g01010", "At1g01020"],
+                "samples": ["sample2", "sample1"],
+            },
+            headers={"x-api-key": "bb5a52387069485486b2f4861c2826dd"},
+        )
+        expected = {
+            "wasSuccessful": True,
+            "data": {
+                "genes": ["AT1G01010", "AT1G01020"],
+                "samples": ["sample2", "sample1"],
+                "values": [[54, 32], [65, 546]],
+            },
+        }
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json, expected)
+
+        # NULL values are returned as null
+        table_id = "matrixnulltest1"
+        with app.app_context():
+            SummarizationGeneExpressionUtils.insert_csv(
+                table_id,
+                io.StringIO("Gene,s1,s2\nAT1G01010,1,\nAT1G01020,,4\n"),
+                "replace",
+            )
+        response = self.app_client.post(
+            "/summarization_gene_expression/matrix/" + table_id,
+            json={"genes": ["At1g01010", "At1g01020"], "samples": ["s1", "s2"]},
+            headers={"x-api-key": "bb5a52387069485486b2f4861c2826dd"},
+        )
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json["data"]["values"], [[1, None], [None, 4]])
+        self.app_client.get("/summarization_gene_expression/drop_table/" + table_id)
+
+        # Invalid gene
+        response = self.app_client.post(
+            "/summarization_gene_expression/matrix/bb5a52387069485486b2f4861c2826dd",
+            json={"genes": ["abc"]},
+            headers={"x-api-key": "bb5a52387069485486b2f4861c2826dd"},
+        )
+        expected = {"wasSuccessful": False, "error": "Invalid gene ID"}
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response.json, expected)
+
+    def test_get_table_info(self):
+        response = self.app_client.get(
+            "/summarization_gene_expression/table_info/bb5a52387069485486b2f4861c2826dd"
+        )
+        expected = {
+            "wasSuccessful": True,
+            "data": {
+                "row_count": 6,
+                "gene_count": 3,
+                "sample_count": 2,
+                "last_modified": "2021-01-12T18:22:44",
+            },
+        }
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json, expected)
+
+        # Table not found
+        response = self.app_client.get("/summarization_gene_expression/table_info/abc")
+        expected = {"wasSuccessful": False, "error": "Table not found"}
+        self.assertEqual(response.status_code, 404)
+        self.assertEqual(response.json, expected)
@@ -0,0 +1,38 @@
+from api import app
+from api.utils.api_key_cache import ApiKeyCache
+from unittest import TestCase
+import time
+
+
+class UtilsUnitTest(TestCase):
+    def test_get(self):
+        key = "bb5a52387069485486b2f4861c2826dd"
+        with app.app_context():
+            ApiKeyCache.invalidate(key)
+            user = ApiKeyCache.get(key)
+            self.assertEqual(user["status"], "user")
+            self.assertTrue(ApiKeyCache.is_valid(key))
+
+            # Cached entries are updated after each use
+            ApiKeyCache.record_use(key, True)
+            self.assertEqual(ApiKeyCache.get(key)["uses_left"], user["uses_left"] - 1)
+            ApiKeyCache.record_use(key, False)
+            self.assertFalse(ApiKeyCache.is_valid(key))
+
+            # Invalidated keys are read again
+            ApiKeyCache.invalidate(key)
+            self.assertEqual(ApiKeyCache.get(key), user)
+
+            # Keys with NULL uses left are not valid
+            ApiKeyCache.entries["abc"] = (
+                time.time(),
+                {"status": "user", "uses_left": None},
+            )
+            ApiKeyCache.record_use("abc", True)
+            self.assertFalse(ApiKeyCache.is_valid("abc"))
+            ApiKeyCache.invalidate("abc")
+
+            # Keys that do not exist
+            self.assertIsNone(ApiKeyCache.get("abc"))
+            self.assertFalse(ApiKeyCache.is_valid("abc"))
+            self.assertFalse(ApiKeyCache.is_valid(None))
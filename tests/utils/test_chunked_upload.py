@@ -0,0 +1,74 @@
+from unittest import TestCase
+from unittest.mock import patch
+from api.utils import chunked_upload
+from api.utils.chunked_upload import ChunkedUpload
+import hashlib
+import io
+import os
+import tempfile
+
+
+class UtilsUnitTest(TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.user_dir = self.tmp.name
+        self.data = bytes(range(256)) * 40
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def send(self, upload, index, data=None, checksum=None):
+        chunk = self.data[index * 4096 : (index + 1) * 4096] if data is None else data
+        if checksum is None:
+            checksum = hashlib.sha256(chunk).hexdigest()
+        ChunkedUpload.write_chunk(
+            self.user_dir, upload, index, io.BytesIO(chunk), checksum
+        )
+
+    def test_upload(self):
+        with patch.object(chunked_upload, "UPLOAD_CHUNK_SIZE", 4096):
+            upload = ChunkedUpload.initiate(
+                self.user_dir, "test.tsv", len(self.data), {"type": "tsv"}
+            )
+        self.assertEqual(upload["chunks"], 3)
+        self.assertEqual(ChunkedUpload.load(self.user_dir, upload["upload_id"]), upload)
+        self.assertIsNone(ChunkedUpload.load(self.user_dir, "abc"))
+
+        # Chunks can arrive in any order and are checked
+        self.send(upload, 2)
+        with self.assertRaisesRegex(ValueError, "Checksum mismatch"):
+            self.send(upload, 0, checksum="0" * 64)
+        with self.assertRaisesRegex(ValueError, "Invalid chunk size"):
+            self.send(upload, 1, data=b"abc")
+        with self.assertRaisesRegex(ValueError, "Invalid chunk index"):
+            self.send(upload, 3)
+        self.assertEqual(ChunkedUpload.get_received(self.user_dir, upload), [2])
+
+        target = os.path.join(self.user_dir, "test.tsv")
+        with self.assertRaisesRegex(ValueError, "Missing chunks"):
+            ChunkedUpload.complete(self.user_dir, upload, target)
+
+        # The upload resumes with the missing chunks
+        self.send(upload, 0)
+        self.send(upload, 1)
+        chunk_digests = ChunkedUpload.complete(self.user_dir, upload, target)
+        self.assertEqual(
+            chunk_digests,
+            [
+                hashlib.sha256(self.data[i : i + 4096]).hexdigest()
+                for i in range(0, len(self.data), 4096)
+            ],
+        )
+        with open(target, "rb") as f:
+            self.assertEqual(f.read(), self.data)
+        self.assertEqual(os.listdir(os.path.join(self.user_dir, ".uploads")), [])
+
+    def test_initiate(self):
+        with self.assertRaisesRegex(ValueError, "Invalid file size"):
+            ChunkedUpload.initiate(self.user_dir, "test.tsv", 0, {})
+
+        # Stale uploads are removed
+        upload = ChunkedUpload.initiate(self.user_dir, "test.tsv", 10, {})
+        with patch.object(chunked_upload, "UPLOAD_TTL", -1):
+            ChunkedUpload.initiate(self.user_dir, "test.tsv", 10, {})
+        self.assertIsNone(ChunkedUpload.load(self.user_dir, upload["upload_id"]))
@@ -0,0 +1,66 @@
+from unittest import TestCase
+from api.utils.compressed_store import CompressedMatrix, CompressedStore
+from api.utils.expression_matrix import ExpressionMatrix
+import numpy
+import os
+import tempfile
+
+
+class UtilsUnitTest(TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.root = self.tmp.name
+        values = numpy.arange(12, dtype=numpy.float32).reshape(4, 3) / 10
+        values[1, 2] = numpy.nan
+        self.matrix = ExpressionMatrix(
+            ["AT1G01010", "AT1G01020", "AT1G01030", "AT1G01040"],
+            ["sample1", "sample2", "sample3"],
+            values,
+        )
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def test_write_and_load(self):
+        self.assertIsNone(CompressedStore.load(None, "test"))
+        self.assertIsNone(CompressedStore.load(self.root, "test"))
+
+        CompressedStore.write(self.root, "test", self.matrix)
+        matrix = CompressedStore.load(self.root, "test")
+        self.assertIsInstance(matrix, CompressedMatrix)
+        self.assertEqual(matrix.genes, self.matrix.genes)
+        self.assertEqual(matrix.samples, self.matrix.samples)
+        numpy.testing.assert_array_equal(
+            matrix.get_row("at1g01030"), self.matrix.get_row("AT1G01030")
+        )
+        self.assertIsNone(matrix.get_row("AT1G01050"))
+
+        # Missing values are left out, and values are the float32 values as read from the database
+        self.assertEqual(
+            matrix.get_values("AT1G01020"), {"sample1": 0.3, "sample2": 0.4}
+        )
+        self.assertEqual(matrix.get_values("AT1G01020", "sample2"), {"sample2": 0.4})
+        self.assertEqual(matrix.get_values("AT1G01050"), {})
+
+        # The open file is reused until the table is written again
+        self.assertIs(CompressedStore.load(self.root, "test"), matrix)
+
+    def test_replace_and_remove(self):
+        CompressedStore.write(self.root, "test", self.matrix)
+        first = CompressedStore.load(self.root, "test")
+        CompressedStore.write(
+            self.root,
+            "test",
+            ExpressionMatrix(
+                self.matrix.genes[:1], self.matrix.samples, self.matrix.values[:1]
+            ),
+        )
+
+        # Readers of the old file can finish
+        self.assertEqual(len(first.genes), 4)
+        self.assertIsNotNone(first.get_row("AT1G01040"))
+        self.assertEqual(CompressedStore.load(self.root, "test").genes, ["AT1G01010"])
+        self.assertEqual(os.listdir(self.root), ["test.bcm"])
+
+        CompressedStore.remove(self.root, "test")
+        self.assertIsNone(CompressedStore.load(self.root, "test"))
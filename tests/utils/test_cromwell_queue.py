@@ -0,0 +1,182 @@
+from api.utils import cromwell_queue
+from api.utils.bar_utils import BARUtils
+from api.utils.cromwell_queue import CromwellClient, CromwellQueue
+from http.server import BaseHTTPRequestHandler, HTTPServer
+from unittest import TestCase
+from unittest.mock import patch
+import json
+import os
+import redis.exceptions
+import requests
+import tempfile
+import threading
+import time
+
+
+class StopWorker(BaseException):
+    """Ends the loop of a worker in tests"""
+
+
+class CromwellStandIn(BaseHTTPRequestHandler):
+    """Local stand-in for the Cromwell workflow API"""
+
+    failures = 0
+    submissions = []
+
+    def send_json(self, code, data):
+        body = json.dumps(data).encode("utf-8")
+        self.send_response(code)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_POST(self):
+        self.rfile.read(int(self.headers["Content-Length"]))
+        if CromwellStandIn.failures > 0:
+            CromwellStandIn.failures -= 1
+            self.send_json(500, {"status": "error"})
+            return
+        CromwellStandIn.submissions.append(self.path)
+        self.send_json(201, {"id": "workflow-1", "status": "Submitted"})
+
+    def do_GET(self):
+        if self.path == "/api/workflows/v1/workflow-1/status":
+            self.send_json(200, {"id": "workflow-1", "status": "Succeeded"})
+        else:
+            self.send_json(404, {"status": "fail"})
+
+    def log_message(self, *args):
+        pass
+
+
+class UtilsUnitTest(TestCase):
+    def setUp(self):
+        self.server = HTTPServer(("127.0.0.1", 0), CromwellStandIn)
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        self.client = CromwellClient("http://127.0.0.1:%d" % self.server.server_port)
+        self.tmp = tempfile.TemporaryDirectory()
+        self.workflow = os.path.join(self.tmp.name, "test.wdl")
+        with open(self.workflow, "w") as f:
+            f.write("workflow test {}")
+        CromwellStandIn.failures = 0
+        CromwellStandIn.submissions = []
+
+    def tearDown(self):
+        self.server.shutdown()
+        self.server.server_close()
+        self.tmp.cleanup()
+
+    def test_client(self):
+        self.assertEqual(
+            self.client.submit(self.workflow, {"test.id": "a"}), "workflow-1"
+        )
+        self.assertEqual(self.client.get_status("workflow-1"), "Succeeded")
+
+    def test_queue(self):
+        r = BARUtils.connect_redis()
+        with patch.object(CromwellQueue, "client", self.client), patch.object(
+            CromwellQueue, "start_worker"
+        ), patch.object(cromwell_queue, "RETRY_DELAY", 0), patch.object(
+            cromwell_queue, "QUEUE_KEY", "BAR_API_cromwell_queue_test"
+        ), patch.object(
+            cromwell_queue, "PROCESSING_KEY", "BAR_API_cromwell_processing_test"
+        ):
+            CromwellStandIn.failures = 1
+            job_id = CromwellQueue.enqueue(self.workflow, {"test.id": "a"})
+            self.assertEqual(CromwellQueue.get_status(job_id), "Queued")
+            self.assertEqual(CromwellQueue.take(r), job_id)
+
+            # Failed submissions are queued again
+            CromwellQueue.process(r, job_id)
+            self.assertEqual(CromwellQueue.get_status(job_id), "Queued")
+            self.assertEqual(r.llen(cromwell_queue.PROCESSING_KEY), 0)
+            CromwellQueue.requeue(r)
+            self.assertEqual(CromwellQueue.take(r), job_id)
+            CromwellQueue.process(r, job_id)
+            self.assertEqual(CromwellQueue.get_status(job_id), "Submitted")
+            self.assertEqual(CromwellStandIn.submissions, ["/api/workflows/v1"])
+            self.assertEqual(r.llen(cromwell_queue.PROCESSING_KEY), 0)
+
+            # Status is copied from Cromwell by the poller
+            CromwellQueue.poll(r)
+            self.assertEqual(CromwellQueue.get_status(job_id), "Succeeded")
+            self.assertFalse(r.sismember(cromwell_queue.ACTIVE_KEY, job_id))
+
+            self.assertIsNone(CromwellQueue.get_status("abc"))
+            r.delete(cromwell_queue.JOB_KEY_PREFIX + job_id)
+
+    def test_recover(self):
+        r = BARUtils.connect_redis()
+        with patch.object(CromwellQueue, "start_worker"), patch.object(
+            cromwell_queue, "QUEUE_KEY", "BAR_API_cromwell_queue_test"
+        ), patch.object(
+            cromwell_queue, "PROCESSING_KEY", "BAR_API_cromwell_processing_test"
+        ):
+            job_id = CromwellQueue.enqueue(self.workflow, {"test.id": "a"})
+            key = cromwell_queue.JOB_KEY_PREFIX + job_id
+            self.assertEqual(CromwellQueue.take(r), job_id)
+
+            # Jobs being submitted are left to their worker
+            CromwellQueue.recover(r)
+            self.assertEqual(r.llen(cromwell_queue.QUEUE_KEY), 0)
+
+            # Jobs of a worker that died are queued again
+            r.hset(key, "claimed", time.time() - cromwell_queue.CLAIM_TIMEOUT - 1)
+            CromwellQueue.recover(r)
+            self.assertEqual(r.llen(cromwell_queue.PROCESSING_KEY), 0)
+            self.assertEqual(CromwellQueue.take(r), job_id)
+            r.delete(cromwell_queue.PROCESSING_KEY, key)
+
+    def test_missing_workflow(self):
+        r = BARUtils.connect_redis()
+        with patch.object(CromwellQueue, "client", self.client), patch.object(
+            CromwellQueue, "start_worker"
+        ), patch.object(
+            cromwell_queue, "QUEUE_KEY", "BAR_API_cromwell_queue_test"
+        ), patch.object(
+            cromwell_queue, "PROCESSING_KEY", "BAR_API_cromwell_processing_test"
+        ):
+            missing_id = CromwellQueue.enqueue(
+                os.path.join(self.tmp.name, "missing.wdl"), {"test.id": "a"}
+            )
+            job_id = CromwellQueue.enqueue(self.workflow, {"test.id": "b"})
+
+            # The job fails and the worker serves the next one
+            CromwellQueue.work_once(r)
+            CromwellQueue.work_once(r)
+            self.assertEqual(CromwellQueue.get_status(missing_id), "Failed")
+            self.assertEqual(CromwellQueue.get_status(job_id), "Submitted")
+            self.assertEqual(r.llen(cromwell_queue.PROCESSING_KEY), 0)
+            r.delete(
+                cromwell_queue.JOB_KEY_PREFIX + missing_id,
+                cromwell_queue.JOB_KEY_PREFIX + job_id,
+            )
+
+    def test_worker_errors(self):
+        # Unexpected errors do not stop the worker
+        with patch.object(BARUtils, "connect_redis"), patch.object(
+            CromwellQueue, "recover"
+        ), patch.object(
+            CromwellQueue, "work_once", side_effect=[RuntimeError, StopWorker]
+        ) as work_once, patch.object(
+            cromwell_queue.time, "sleep"
+        ):
+            with self.assertRaises(StopWorker):
+                CromwellQueue.work()
+            self.assertEqual(work_once.call_count, 2)
+
+    def test_enqueue_without_redis(self):
+        # Without Redis, workflows are submitted once in the request
+        with patch.object(CromwellQueue, "client", self.client), patch.object(
+            BARUtils,
+            "connect_redis",
+            side_effect=redis.exceptions.ConnectionError,
+        ), patch.object(cromwell_queue.time, "sleep") as sleep:
+            self.assertEqual(
+                CromwellQueue.enqueue(self.workflow, {"test.id": "a"}), "workflow-1"
+            )
+            CromwellStandIn.failures = 1
+            with self.assertRaises(requests.HTTPError):
+                CromwellQueue.enqueue(self.workflow, {"test.id": "a"})
+            sleep.assert_not_called()
@@ -0,0 +1,77 @@
+from api.utils.drive_client import DriveClient
+from http.server import BaseHTTPRequestHandler, HTTPServer
+from unittest import TestCase
+from urllib.parse import parse_qs, urlparse
+import json
+import requests
+import threading
+
+
+class DriveStandIn(BaseHTTPRequestHandler):
+    """Local stand-in for the Drive files API with pages of two files"""
+
+    requests = []
+
+    def do_GET(self):
+        query = parse_qs(urlparse(self.path).query)
+        DriveStandIn.requests.append(query)
+        if query["key"] != ["test_key"]:
+            self.send_response(403)
+            self.send_header("Content-Length", "0")
+            self.end_headers()
+            return
+
+        page = int(query.get("pageToken", ["0"])[0])
+        data = {
+            "files": [
+                {"id": str(i), "name": "sample%d.bam" % i, "mimeType": "text/plain"}
+                for i in range(page * 2, page * 2 + 2)
+            ]
+        }
+        if page < 2:
+            data["nextPageToken"] = str(page + 1)
+        body = json.dumps(data).encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+class UtilsUnitTest(TestCase):
+    def setUp(self):
+        self.server = HTTPServer(("127.0.0.1", 0), DriveStandIn)
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        self.url = "http://127.0.0.1:%d/drive/v3/files" % self.server.server_port
+        DriveStandIn.requests = []
+
+    def tearDown(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+    def test_list_files(self):
+        client = DriveClient("test_key", self.url)
+        files = client.list_files("folder1")
+
+        # All pages are read
+        self.assertEqual(
+            [file["name"] for file in files], ["sample%d.bam" % i for i in range(6)]
+        )
+        self.assertEqual(len(DriveStandIn.requests), 3)
+        self.assertEqual(DriveStandIn.requests[0]["q"], ["'folder1' in parents"])
+
+        # Listings are cached by folder
+        self.assertEqual(client.list_files("folder1"), files)
+        self.assertEqual(len(DriveStandIn.requests), 3)
+        client.list_files("folder2")
+        self.assertEqual(len(DriveStandIn.requests), 6)
+
+    def test_error(self):
+        client = DriveClient("wrong_key", self.url)
+        with self.assertRaises(requests.HTTPError) as e:
+            client.list_files("folder1")
+        self.assertEqual(e.exception.response.status_code, 403)
+        self.assertEqual(client.listings, {})
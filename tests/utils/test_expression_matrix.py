@@ -0,0 +1,77 @@
+from unittest import TestCase
+from api.utils.expression_matrix import ExpressionMatrix
+import numpy
+import pandas
+
+
+class UtilsUnitTest(TestCase):
+    def setUp(self):
+        rng = numpy.random.default_rng(0)
+        self.values = rng.random((20, 8))
+        self.genes = ["AT1G%05d" % i for i in range(20)]
+        self.samples = ["sample%d" % i for i in range(8)]
+        self.matrix = ExpressionMatrix(self.genes, self.samples, self.values)
+
+    def test_from_long_dataframe(self):
+        df = pandas.DataFrame(
+            {
+                "Gene": ["AT1G01010", "AT1G01010", "AT1G01020"],
+                "Sample": ["sample1", "sample2", "sample1"],
+                "Value": [1.0, 2.0, 3.0],
+            }
+        )
+        matrix = ExpressionMatrix.from_long_dataframe(df, "Gene", "Sample", "Value")
+        self.assertEqual(matrix.genes, ["AT1G01010", "AT1G01020"])
+        self.assertEqual(matrix.samples, ["sample1", "sample2"])
+        self.assertEqual(matrix.values.dtype, numpy.float32)
+        self.assertEqual(matrix.get_row("at1g01010").tolist(), [1.0, 2.0])
+        self.assertTrue(numpy.isnan(matrix.get_row("AT1G01020")[1]))
+        self.assertIsNone(matrix.get_row("AT1G01030"))
+
+    def test_correlate_pearson(self):
+        result = self.matrix.correlate("AT1G00003", "pearson", 5)
+        expected = pandas.DataFrame(self.values.T, columns=self.genes).corr()
+        expected = expected["AT1G00003"].drop("AT1G00003").sort_values(ascending=False)
+
+        self.assertEqual([gene for gene, _ in result], list(expected.index[:5]))
+        for gene, value in result:
+            self.assertAlmostEqual(value, expected[gene], places=5)
+
+    def test_correlate_spearman(self):
+        result = self.matrix.correlate("AT1G00003", "spearman", 3)
+        expected = pandas.DataFrame(self.values.T, columns=self.genes).corr(
+            method="spearman"
+        )
+        for gene, value in result:
+            self.assertAlmostEqual(value, expected.loc["AT1G00003", gene], places=5)
+
+    def test_correlate_edge_cases(self):
+        # Unknown gene
+        self.assertIsNone(self.matrix.correlate("AT1G99999"))
+
+        # Constant rows are not correlated with anything
+        matrix = ExpressionMatrix(["A", "B"], ["s1", "s2"], [[1, 1], [1, 2]])
+        self.assertEqual(matrix.correlate("A"), [("B", 0.0)])
+
+    def test_compare(self):
+        values = [
+            [1, 2, 3, 4, 6, 8],
+            [5, 5, 5, 5, 5, 5],
+            [1, numpy.nan, 3, 10, 12, 14],
+        ]
+        matrix = ExpressionMatrix(["A", "B", "C"], list("abcdef"), values)
+        result = matrix.compare(["a", "b", "c"], ["d", "e", "f"])
+        self.assertEqual([row[0] for row in result], ["C", "A", "B"])
+
+        # A: means 2 and 6, variances 1 and 4
+        gene, mean1, mean2, fold_change, t, df = result[1]
+        self.assertEqual((mean1, mean2), (2.0, 6.0))
+        self.assertAlmostEqual(fold_change, numpy.log2(3 / 7))
+        self.assertAlmostEqual(t, -4 / numpy.sqrt(5 / 3))
+        self.assertAlmostEqual(df, (5 / 3) ** 2 / ((1 / 9) / 2 + (16 / 9) / 2))
+
+        # Missing values are left out
+        self.assertEqual(result[0][1:3], (2.0, 12.0))
+
+        # Constant rows have no t statistic
+        self.assertEqual(result[2], ("B", 5.0, 5.0, 0.0, None, None))
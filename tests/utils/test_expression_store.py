@@ -0,0 +1,80 @@
+from unittest import TestCase
+from unittest.mock import patch
+from api.utils import expression_store
+from api.utils.expression_matrix import ExpressionMatrix
+from api.utils.expression_store import ExpressionStore
+import numpy
+import os
+import tempfile
+
+
+class UtilsUnitTest(TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.root = self.tmp.name
+        rng = numpy.random.default_rng(0)
+        self.genes = ["AT1G%05d" % i for i in range(20)]
+        self.samples = ["sample%d" % i for i in range(8)]
+        self.matrix = ExpressionMatrix(self.genes, self.samples, rng.random((20, 8)))
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def test_export_and_load(self):
+        # Datasets that are not exported are not loaded
+        self.assertIsNone(ExpressionStore.load(None, "test"))
+        self.assertIsNone(ExpressionStore.load(self.root, "test"))
+        self.assertIsNone(ExpressionStore.get_version(None, "test"))
+
+        version = ExpressionStore.export(self.root, "test", self.matrix)
+        self.assertEqual(ExpressionStore.get_version(self.root, "test"), version)
+
+        matrix = ExpressionStore.load(self.root, "test")
+        self.assertIsInstance(matrix.values, numpy.memmap)
+        self.assertEqual(matrix.genes, self.genes)
+        self.assertEqual(matrix.samples, self.samples)
+        numpy.testing.assert_array_equal(
+            matrix.get_row("at1g00003"), self.matrix.get_row("AT1G00003")
+        )
+        self.assertEqual(
+            matrix.correlate("AT1G00003", "spearman", 5),
+            self.matrix.correlate("AT1G00003", "spearman", 5),
+        )
+
+        # The mapped matrix is reused until the dataset is swapped
+        self.assertIs(ExpressionStore.load(self.root, "test"), matrix)
+
+    def test_swap(self):
+        first = ExpressionStore.export(self.root, "test", self.matrix)
+        second = ExpressionStore.export(self.root, "test", self.matrix)
+        third = ExpressionStore.export(
+            self.root,
+            "test",
+            ExpressionMatrix(self.genes[:2], self.samples, self.matrix.values[:2]),
+        )
+
+        self.assertEqual(ExpressionStore.load(self.root, "test").genes, self.genes[:2])
+
+        # Versions that are no longer live are kept for readers that resolved them
+        versions = sorted(os.listdir(os.path.join(self.root, "test")))
+        self.assertEqual(versions, sorted(["current", first, second, third]))
+
+        # and deleted after the grace period, except the previous version
+        with patch.object(expression_store, "RETIRED_VERSION_TTL", -1):
+            fourth = ExpressionStore.export(self.root, "test", self.matrix)
+        versions = sorted(os.listdir(os.path.join(self.root, "test")))
+        self.assertEqual(versions, sorted(["current", third, fourth]))
+
+    def test_remove(self):
+        ExpressionStore.export(self.root, "test", self.matrix)
+        matrix = ExpressionStore.load(self.root, "test")
+
+        ExpressionStore.remove(self.root, "test")
+        self.assertIsNone(ExpressionStore.get_version(self.root, "test"))
+        self.assertIsNone(ExpressionStore.load(self.root, "test"))
+        self.assertFalse(os.path.exists(os.path.join(self.root, "test")))
+
+        # Mapped matrices stay readable
+        self.assertEqual(matrix.get_row("AT1G00003").shape, (8,))
+        ExpressionStore.remove(self.root, "test")
+        ExpressionStore.remove(None, "test")
@@ -0,0 +1,49 @@
+from unittest import TestCase
+from api.utils.gene_index import GeneIndex
+import time
+
+
+class UtilsUnitTest(TestCase):
+    def setUp(self):
+        self.index = GeneIndex(
+            [
+                "AT1G01010",
+                "AT1G01020",
+                "AT2G01010",
+                "AT1G0101",
+                "At1g10100",
+                "AT1G01010",
+            ]
+        )
+
+    def test_search(self):
+        # Exact match, then prefix matches, then other matches
+        self.assertEqual(
+            self.index.search("at1g0101", 10),
+            ["AT1G0101", "AT1G01010"],
+        )
+        self.assertEqual(
+            self.index.search("G0101", 10), ["AT1G0101", "AT1G01010", "AT2G01010"]
+        )
+        self.assertEqual(self.index.search("10100", 10), ["At1g10100"])
+
+        # Results are limited
+        self.assertEqual(len(self.index.search("AT", 2)), 2)
+
+        # Short queries
+        self.assertEqual(self.index.search("2", 10), ["AT2G01010", "AT1G01020"])
+        self.assertEqual(self.index.search("xyz", 10), [])
+
+    def test_cache(self):
+        GeneIndex.invalidate("test")
+        index = GeneIndex.get_cached("test", lambda: ["AT1G01010"])
+        self.assertIs(GeneIndex.get_cached("test", lambda: []), index)
+        GeneIndex.invalidate("test")
+        self.assertEqual(GeneIndex.get_cached("test", lambda: []).genes, [])
+
+        # Indexes built before the last change are built again
+        index = GeneIndex.get_cached("test", lambda: ["AT1G01010"], time.time() - 60)
+        self.assertEqual(index.genes, [])
+        index = GeneIndex.get_cached("test", lambda: ["AT1G01010"], time.time() + 60)
+        self.assertEqual(index.genes, ["AT1G01010"])
+        GeneIndex.invalidate("test")
@@ -0,0 +1,53 @@
+from unittest import TestCase
+from api.utils.kallisto_converter import KallistoConverter
+import io
+import numpy
+import pandas
+
+ABUNDANCE = (
+    "target_id\tlength\teff_length\test_counts\ttpm\n"
+    "AT1G01010.1\t1000\t800\t40\t0\n"
+    "AT1G01010.2\t1200\t1000\t20\t0\n"
+    "AT1G01020.1\t500\t400\t40\t0\n"
+    "AT1G01030.1\t100\t0\t0\t0\n"
+)
+
+
+class UtilsUnitTest(TestCase):
+    def test_normalize(self):
+        df = KallistoConverter.normalize(KallistoConverter.read(io.StringIO(ABUNDANCE)))
+
+        # 100 reads in total. Rates are 0.05, 0.02, 0.1 and 0 reads per base, 0.17 in total.
+        self.assertEqual(
+            df["rpkm"].round(6).tolist(), [500000.0, 200000.0, 1000000.0, 0.0]
+        )
+        self.assertEqual(
+            df["tpm"].round(3).tolist(), [294117.647, 117647.059, 588235.294, 0.0]
+        )
+        self.assertAlmostEqual(df["tpm"].sum(), 1e6)
+
+    def test_to_csv(self):
+        csv = KallistoConverter.to_csv(io.StringIO(ABUNDANCE), "leaf")
+        df = pandas.read_csv(csv)
+        self.assertEqual(df.columns.tolist(), ["Gene", "leaf"])
+        self.assertEqual(df["Gene"].tolist(), ["AT1G01010", "AT1G01020", "AT1G01030"])
+        self.assertEqual(df["leaf"].tolist(), [700000.0, 1000000.0, 0.0])
+
+        tpm = pandas.read_csv(
+            KallistoConverter.to_csv(io.StringIO(ABUNDANCE), "leaf", "tpm")
+        )
+        self.assertAlmostEqual(tpm["leaf"][0], 411764.70588235, places=5)
+
+        with self.assertRaises(ValueError):
+            KallistoConverter.to_csv(io.StringIO("Gene,leaf\nAT1G01010,1\n"), "leaf")
+        with self.assertRaises(ValueError):
+            KallistoConverter.to_csv(io.StringIO(ABUNDANCE), "leaf", "fpkm")
+
+    def test_fixture(self):
+        # Kallisto output and its gene RPKM, in the Gene x sample layout of kallistoToRpkm.R.
+        # The expected values were computed independently with exact fractions.
+        csv = KallistoConverter.to_csv("tests/data/kallisto_abundance.tsv", "leaf")
+        df = pandas.read_csv(csv)
+        expected = pandas.read_csv("tests/data/kallisto_rpkm.csv")
+        self.assertEqual(df["Gene"].tolist(), expected["Gene"].tolist())
+        numpy.testing.assert_allclose(df["leaf"], expected["leaf"], rtol=1e-9)
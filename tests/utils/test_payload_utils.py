@@ -0,0 +1,93 @@
+from api import app
+from api.utils.payload_utils import (
+    PayloadUtils,
+    NPY_MIMETYPE,
+    NPZ_MIMETYPE,
+    ARROW_MIMETYPE,
+)
+from unittest import TestCase
+import io
+import json
+import math
+import numpy
+import pyarrow
+
+
+class UtilsUnitTest(TestCase):
+    def test_get_binary_mimetype(self):
+        # JSON is the default
+        with app.test_request_context("/"):
+            self.assertIsNone(PayloadUtils.get_binary_mimetype())
+
+        with app.test_request_context("/", headers={"Accept": "*/*"}):
+            self.assertIsNone(PayloadUtils.get_binary_mimetype())
+
+        with app.test_request_context("/", headers={"Accept": NPY_MIMETYPE}):
+            self.assertEqual(PayloadUtils.get_binary_mimetype(), NPY_MIMETYPE)
+
+        with app.test_request_context("/", headers={"Accept": NPZ_MIMETYPE}):
+            self.assertEqual(PayloadUtils.get_binary_mimetype(), NPZ_MIMETYPE)
+
+        with app.test_request_context("/", headers={"Accept": ARROW_MIMETYPE}):
+            self.assertEqual(PayloadUtils.get_binary_mimetype(), ARROW_MIMETYPE)
+
+    def test_npy_response(self):
+        with app.test_request_context("/"):
+            response = PayloadUtils.matrix_response(
+                ["AT1G01010", "AT1G01020"],
+                ["sample1", "sample2"],
+                [[1.5, 2], [None, 4]],
+                NPY_MIMETYPE,
+            )
+        self.assertEqual(response.headers["Content-Type"], NPY_MIMETYPE)
+        self.assertEqual(
+            json.loads(response.headers["X-BAR-Genes"]), ["AT1G01010", "AT1G01020"]
+        )
+        self.assertEqual(
+            json.loads(response.headers["X-BAR-Samples"]), ["sample1", "sample2"]
+        )
+
+        matrix = numpy.load(io.BytesIO(response.get_data()))
+        self.assertEqual(matrix.dtype, numpy.float32)
+        self.assertEqual(matrix.shape, (2, 2))
+        self.assertEqual(matrix[0].tolist(), [1.5, 2])
+        self.assertTrue(math.isnan(matrix[1, 0]))
+
+        # Axes too large for headers are refused
+        genes = ["AT1G%05d" % i for i in range(1000)]
+        with app.test_request_context("/"):
+            response = PayloadUtils.matrix_response(
+                genes, ["sample1"], [[1]] * 1000, NPY_MIMETYPE
+            )
+        self.assertEqual(response.status_code, 406)
+        self.assertNotIn("X-BAR-Genes", response.headers)
+
+    def test_npz_response(self):
+        genes = ["AT1G%05d" % i for i in range(1000)]
+        with app.test_request_context("/"):
+            response = PayloadUtils.matrix_response(
+                genes, ["sample1"], [[1]] * 999 + [[None]], NPZ_MIMETYPE
+            )
+        self.assertEqual(response.headers["Content-Type"], NPZ_MIMETYPE)
+        self.assertNotIn("X-BAR-Genes", response.headers)
+
+        with numpy.load(io.BytesIO(response.get_data())) as npz:
+            self.assertEqual(npz["genes"].tolist(), genes)
+            self.assertEqual(npz["samples"].tolist(), ["sample1"])
+            self.assertEqual(npz["values"].dtype, numpy.float32)
+            self.assertEqual(npz["values"].shape, (1000, 1))
+            self.assertTrue(math.isnan(npz["values"][999, 0]))
+
+    def test_arrow_response(self):
+        with app.test_request_context("/"):
+            response = PayloadUtils.gene_response(
+                "AT1G01010", {"sample1": 32, "sample2": 54}, ARROW_MIMETYPE
+            )
+        self.assertEqual(response.headers["Content-Type"], ARROW_MIMETYPE)
+        self.assertNotIn("X-BAR-Genes", response.headers)
+
+        table = pyarrow.ipc.open_stream(response.get_data()).read_all()
+        self.assertEqual(table.column_names, ["sample1", "sample2"])
+        self.assertEqual(table.column("sample2").to_pylist(), [54])
+        self.assertEqual(table.schema.field("sample1").type, pyarrow.float32())
+        self.assertEqual(json.loads(table.schema.metadata[b"genes"]), ["AT1G01010"])
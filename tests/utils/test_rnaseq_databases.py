@@ -0,0 +1,20 @@
+from api import app
+from api.utils.rnaseq_databases import RNASEQ_DATABASES
+from unittest import TestCase
+
+
+class UtilsUnitTest(TestCase):
+    def test_single_cell(self):
+        database = RNASEQ_DATABASES["single_cell"]
+        self.assertEqual(database.get_store_name(), "rnaseq_single_cell")
+        self.assertTrue(database.is_valid_sample("cluster0_WT1.ExprMean"))
+        self.assertFalse(database.is_valid_sample("abc;xyz"))
+
+        with app.app_context():
+            database.invalidate_samples()
+            samples = database.get_samples()
+            self.assertIn("cluster0_WT1.ExprMean", samples)
+            self.assertNotIn("cluster99_WT1.ExprMean", samples)
+
+            # The catalog is kept in memory
+            self.assertIs(database.get_samples(), samples)
@@ -0,0 +1,39 @@
+from unittest import TestCase
+from api.utils.single_cell_utils import SingleCellUtils
+import pandas
+
+
+class UtilsUnitTest(TestCase):
+    def test_aggregate_clusters(self):
+        df = pandas.DataFrame(
+            {
+                "data_probeset_id": ["AT1G01010"] * 5 + ["AT1G01020"],
+                "data_bot_id": [
+                    "cluster0_WT1.ExprMean",
+                    "cluster0_WT2.ExprMean",
+                    "cluster0_WT3.ExprMean",
+                    "cluster10_WT1.ExprMean",
+                    "Med_CTRL",
+                    "cluster0_WT1.ExprMean",
+                ],
+                "data_signal": [1.0, 2.0, 3.0, 4.0, 5.0, 6.0],
+            }
+        )
+        result = SingleCellUtils.aggregate_clusters(df)
+
+        # Samples that are not cluster replicates are ignored
+        self.assertEqual(len(result), 3)
+
+        row = result[
+            (result.data_probeset_id == "AT1G01010") & (result.cluster == "cluster0")
+        ].iloc[0]
+        self.assertEqual(row["mean"], 2.0)
+        self.assertEqual(row["sd"], 1.0)
+        self.assertEqual(row["n"], 3)
+        self.assertEqual(row["min"], 1.0)
+        self.assertEqual(row["max"], 3.0)
+
+        # A single replicate has no standard deviation
+        row = result[result.cluster == "cluster10"].iloc[0]
+        self.assertEqual(row["n"], 1)
+        self.assertTrue(pandas.isna(row["sd"]))
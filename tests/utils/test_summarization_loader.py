@@ -0,0 +1,127 @@
+from unittest import TestCase
+from unittest.mock import patch
+from api.models.summarization import TableCatalog, TableCatalogGene, TableCatalogSample
+from api.utils import summarization_loader
+from api.utils.summarization_loader import SummarizationLoader
+import io
+import os
+import sqlalchemy
+import tempfile
+import time
+
+
+class UtilsUnitTest(TestCase):
+    def test_load_csv(self):
+        csv = io.StringIO(
+            "Gene,sample1,sample2\nAT1G01010,1,2\nAT1G01020,3,4\nAT1G01030,5,6\n"
+        )
+        engine = sqlalchemy.create_engine("sqlite://")
+        with engine.begin() as con:
+            for model in [TableCatalog, TableCatalogGene, TableCatalogSample]:
+                model.__table__.create(con)
+
+            # Small blocks, so the file is read in more than one block
+            with patch.object(summarization_loader, "LOAD_CHUNK_GENES", 2):
+                stats = SummarizationLoader.load_csv(con, "test", csv, 10)
+
+            self.assertEqual(stats["rows"], 6)
+            self.assertEqual(stats["genes"], 3)
+            self.assertEqual(stats["samples"], 2)
+
+            rows = con.execute(
+                sqlalchemy.text(
+                    'SELECT "index", Gene, Sample, Value FROM test ORDER BY "index"'
+                )
+            ).fetchall()
+            self.assertEqual([row[0] for row in rows], list(range(10, 16)))
+            self.assertIn((14, "AT1G01030", "sample1", 5.0), rows)
+
+            catalog = con.execute(TableCatalog.__table__.select()).first()
+            self.assertEqual(catalog.row_count, 6)
+            genes = con.execute(
+                sqlalchemy.select([TableCatalogGene.gene]).order_by(
+                    TableCatalogGene.position
+                )
+            ).fetchall()
+            self.assertEqual(
+                [row.gene for row in genes], ["AT1G01010", "AT1G01020", "AT1G01030"]
+            )
+
+            # Names that differ only by case are one entry, like in the catalog key
+            SummarizationLoader.load_csv(
+                con, "test", io.StringIO("Gene,SAMPLE1\nat1g01010,1\nAt1g01040,2\n"), 16
+            )
+            genes = con.execute(
+                sqlalchemy.select([TableCatalogGene.gene]).order_by(
+                    TableCatalogGene.position
+                )
+            ).fetchall()
+            self.assertEqual(
+                [row.gene for row in genes],
+                ["AT1G01010", "AT1G01020", "AT1G01030", "At1g01040"],
+            )
+            samples = con.execute(
+                sqlalchemy.select([TableCatalogSample.sample])
+            ).fetchall()
+            self.assertEqual(len(samples), 2)
+
+        # Index names stay within the MySQL identifier limit for long table names
+        table = SummarizationLoader.get_user_table("t" * 64 + "_staging_0123abcd")
+        self.assertLessEqual(len(list(table.indexes)[0].name), 64)
+
+    def test_replace_csv(self):
+        tmp = tempfile.TemporaryDirectory()
+        engine = sqlalchemy.create_engine("sqlite:///" + os.path.join(tmp.name, "db"))
+        with engine.begin() as con:
+            for model in [TableCatalog, TableCatalogGene, TableCatalogSample]:
+                model.__table__.create(con)
+
+        SummarizationLoader.replace_csv(
+            engine, "test", io.StringIO("Gene,sample1\nAT1G01010,1\nAT1G01020,2\n")
+        )
+        stats = SummarizationLoader.replace_csv(
+            engine, "test", io.StringIO("Gene,sample2\nAT1G01030,3\n")
+        )
+        self.assertEqual(stats["rows"], 1)
+
+        with engine.connect() as con:
+            rows = con.execute(sqlalchemy.text("SELECT Gene, Sample FROM test"))
+            self.assertEqual(rows.fetchall(), [("AT1G01030", "sample2")])
+            catalog = con.execute(TableCatalog.__table__.select()).fetchall()
+            self.assertEqual(
+                [(row.table_id, row.row_count) for row in catalog], [("test", 1)]
+            )
+
+        # Staging tables are renamed, and old tables are dropped in the background
+        for _ in range(50):
+            tables = sqlalchemy.inspect(engine).get_table_names()
+            if len(tables) == 4:
+                break
+            time.sleep(0.1)
+        self.assertNotIn("test_staging", " ".join(tables))
+        self.assertEqual(
+            sorted(tables),
+            ["table_catalog", "table_catalog_gene", "table_catalog_sample", "test"],
+        )
+
+        # A failed swap leaves the table and its catalog, and drops the staging table
+        with patch.object(
+            SummarizationLoader, "rename_tables", side_effect=RuntimeError
+        ):
+            with self.assertRaises(RuntimeError):
+                SummarizationLoader.replace_csv(
+                    engine, "test", io.StringIO("Gene,sample3\nAT1G01040,4\n")
+                )
+        with engine.connect() as con:
+            rows = con.execute(sqlalchemy.text("SELECT Gene FROM test"))
+            self.assertEqual(rows.fetchall(), [("AT1G01030",)])
+            catalog = con.execute(TableCatalog.__table__.select()).fetchall()
+            self.assertEqual([row.table_id for row in catalog], ["test"])
+            genes = con.execute(TableCatalogGene.__table__.select()).fetchall()
+            self.assertEqual([row.gene for row in genes], ["AT1G01030"])
+        self.assertEqual(
+            sorted(sqlalchemy.inspect(engine).get_table_names()),
+            ["table_catalog", "table_catalog_gene", "table_catalog_sample", "test"],
+        )
+        engine.dispose()
+        tmp.cleanup()
@@ -0,0 +1,80 @@
+from unittest import TestCase
+from api.utils.summarization_migration import SummarizationMigration
+import os
+import sqlalchemy
+import tempfile
+
+
+class UtilsUnitTest(TestCase):
+    def test_migrate_table(self):
+        tmp = tempfile.TemporaryDirectory()
+        engine = sqlalchemy.create_engine("sqlite:///" + os.path.join(tmp.name, "db"))
+        with engine.begin() as con:
+            # The old table is read while the new table is written
+            con.execute(sqlalchemy.text("PRAGMA journal_mode=WAL"))
+            # Schema of tables created by pandas to_sql
+            con.execute(
+                sqlalchemy.text(
+                    'CREATE TABLE test ("index" BIGINT, Gene TEXT, Sample TEXT, Value FLOAT)'
+                )
+            )
+            con.execute(
+                sqlalchemy.text(
+                    "INSERT INTO test VALUES (:index, :gene, :sample, :value)"
+                ),
+                [
+                    {
+                        "index": 0,
+                        "gene": "AT1G01010",
+                        "sample": "sample1",
+                        "value": 1.5,
+                    },
+                    {
+                        "index": 1,
+                        "gene": "AT1G01020",
+                        "sample": "sample1",
+                        "value": 2.5,
+                    },
+                    {
+                        "index": 1,
+                        "gene": "AT1G01010",
+                        "sample": "sample2",
+                        "value": 3.5,
+                    },
+                ],
+            )
+
+        self.assertEqual(SummarizationMigration.get_tables(engine), ["test"])
+        stats = SummarizationMigration.migrate_table(engine, "test")
+        self.assertEqual(stats["rows"], 3)
+        self.assertIsNotNone(stats["before_ms"])
+        self.assertIsNotNone(stats["after_ms"])
+
+        # Migrated tables are not migrated again
+        self.assertFalse(SummarizationMigration.needs_migration(engine, "test"))
+        self.assertEqual(sqlalchemy.inspect(engine).get_table_names(), ["test"])
+        with engine.connect() as con:
+            rows = con.execute(
+                sqlalchemy.text(
+                    'SELECT "index", Gene, Sample, Value FROM test ORDER BY "index"'
+                )
+            ).fetchall()
+        self.assertEqual(
+            rows,
+            [
+                (0, "AT1G01010", "sample1", 1.5),
+                (1, "AT1G01020", "sample1", 2.5),
+                (2, "AT1G01010", "sample2", 3.5),
+            ],
+        )
+
+        # Tables written to during the copy are not swapped
+        with engine.begin() as con:
+            con.execute(sqlalchemy.text("CREATE TABLE test_copy (Gene TEXT)"))
+        with self.assertRaises(RuntimeError):
+            SummarizationMigration.swap(engine, "test", "test_copy", "test_old", 2)
+        self.assertEqual(
+            sqlalchemy.inspect(engine).get_table_names(), ["test", "test_copy"]
+        )
+        engine.dispose()
+        tmp.cleanup()
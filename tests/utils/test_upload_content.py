@@ -0,0 +1,99 @@
+from unittest import TestCase
+from unittest.mock import patch
+from api.utils import upload_content
+from api.utils.cromwell_queue import CromwellQueue
+from api.utils.upload_content import UploadContent
+import hashlib
+import io
+import os
+import tempfile
+
+
+class UtilsUnitTest(TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.user_dir = self.tmp.name
+        self.data = b"target_id\tlength\teff_length\test_counts\ttpm\n"
+        self.digest = UploadContent.get_digest([hashlib.sha256(self.data).hexdigest()])
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def test_save(self):
+        digest, path = UploadContent.save_stream(
+            self.user_dir, io.BytesIO(self.data), "tsv"
+        )
+        self.assertEqual(digest, self.digest)
+        self.assertEqual(os.path.basename(path), self.digest + ".tsv")
+
+        # The same content is stored once
+        file_path = os.path.join(self.user_dir, "abundance.tsv")
+        with open(file_path, "wb") as f:
+            f.write(self.data)
+        self.assertEqual(
+            UploadContent.save_file(self.user_dir, file_path, "tsv", digest), path
+        )
+        self.assertFalse(os.path.exists(file_path))
+        self.assertEqual(
+            os.listdir(os.path.join(self.user_dir, "content")), [digest + ".tsv"]
+        )
+        with open(path, "rb") as f:
+            self.assertEqual(f.read(), self.data)
+
+    def test_digest(self):
+        # Streams are hashed in the chunks of chunked uploads
+        with patch.object(upload_content, "UPLOAD_CHUNK_SIZE", 16), patch.object(
+            upload_content, "HASH_BLOCK_SIZE", 7
+        ):
+            digest, path = UploadContent.save_stream(
+                self.user_dir, io.BytesIO(self.data), "tsv"
+            )
+        chunk_digests = [
+            hashlib.sha256(self.data[i : i + 16]).hexdigest()
+            for i in range(0, len(self.data), 16)
+        ]
+        self.assertEqual(digest, UploadContent.get_digest(chunk_digests))
+
+    def test_link(self):
+        digest, path = UploadContent.save_stream(
+            self.user_dir, io.BytesIO(self.data), "tsv"
+        )
+        link_path = UploadContent.link(path, "sample1.tsv")
+        self.assertEqual(os.path.basename(link_path), "sample1.tsv")
+        self.assertTrue(os.path.samefile(link_path, path))
+        self.assertEqual(UploadContent.link(path, "sample1.tsv"), link_path)
+        self.assertEqual(UploadContent.link(path, ""), path)
+
+    def test_processed(self):
+        table_id = "test_upload_content"
+        UploadContent.forget(table_id)
+        self.assertIsNone(
+            UploadContent.get_processed(table_id, self.digest, "tsv", "append")
+        )
+
+        with patch.object(CromwellQueue, "get_status", return_value="Running"):
+            UploadContent.record(table_id, self.digest, "tsv", "append", "job1")
+            self.assertEqual(
+                UploadContent.get_processed(table_id, self.digest, "tsv", "append"),
+                "job1",
+            )
+            self.assertEqual(
+                UploadContent.get_processed(table_id, self.digest, "tsv", "replace"),
+                "job1",
+            )
+            self.assertIsNone(
+                UploadContent.get_processed(table_id, self.digest, "csv", "append")
+            )
+
+            # Replacing a table with more content runs again
+            UploadContent.record(table_id, "0" * 64, "tsv", "append", "job2")
+            self.assertIsNone(
+                UploadContent.get_processed(table_id, self.digest, "tsv", "replace")
+            )
+
+        # Failed jobs are run again
+        with patch.object(CromwellQueue, "get_status", return_value="Failed"):
+            self.assertIsNone(
+                UploadContent.get_processed(table_id, self.digest, "tsv", "append")
+            )
+        UploadContent.forget(table_id)
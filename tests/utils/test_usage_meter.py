@@ -0,0 +1,83 @@
+from api import app, summarization_db as db
+from api.models.summarization import Users
+from api.utils.bar_utils import BARUtils
+from api.utils.usage_meter import (
+    UsageMeter,
+    PENDING_KEY,
+    FLUSHING_KEY,
+    FLUSH_LOCK_KEY,
+    START_FLUSH_SCRIPT,
+)
+from datetime import date
+from unittest import TestCase
+import time
+
+
+class UtilsUnitTest(TestCase):
+    def test_consume(self):
+        key = "bb5a52387069485486b2f4861c2826dd"
+        with app.app_context():
+            left = UsageMeter.get_remaining(key)
+            self.assertTrue(UsageMeter.consume(key))
+            self.assertEqual(UsageMeter.get_remaining(key), left - 1)
+
+            # Keys that do not exist are rejected
+            self.assertIsNone(UsageMeter.get_remaining("abc"))
+            self.assertFalse(UsageMeter.consume("abc"))
+            self.assertFalse(UsageMeter.consume(None))
+
+    def test_flush(self):
+        key = "bb5a52387069485486b2f4861c2826dd"
+        with app.app_context():
+            r = BARUtils.connect_redis()
+            UsageMeter.flush(r)
+            UsageMeter.reset(key)
+            left = UsageMeter.get_remaining(key)
+
+            # Uses in a batch that is being written are still counted
+            r.set(FLUSH_LOCK_KEY, 1, ex=60)
+            self.assertTrue(UsageMeter.consume(key))
+            batch_key = "%s_%d_test" % (PENDING_KEY, time.time() - 3600)
+            r.eval(START_FLUSH_SCRIPT, 3, PENDING_KEY, batch_key, FLUSHING_KEY)
+            UsageMeter.reset(key)
+            self.assertEqual(UsageMeter.get_remaining(key), left - 1)
+
+            # Batches left by a stopped worker are written by the next flush
+            self.assertEqual(UsageMeter.flush(r), 1)
+            self.assertFalse(r.sismember(FLUSHING_KEY, batch_key))
+            UsageMeter.reset(key)
+            self.assertEqual(UsageMeter.get_remaining(key), left - 1)
+            r.delete(FLUSH_LOCK_KEY)
+
+    def test_discard(self):
+        key = "usagemeterdiscardtest"
+        with app.app_context():
+            db.session.add(
+                Users(
+                    email="usage@example.com",
+                    api_key=key,
+                    status="user",
+                    date_added=date.today(),
+                    uses_left=3,
+                )
+            )
+            db.session.commit()
+            try:
+                r = BARUtils.connect_redis()
+                r.set(FLUSH_LOCK_KEY, 1, ex=60)
+                self.assertTrue(UsageMeter.consume(key))
+
+                # Discarded uses are not written
+                UsageMeter.discard(key)
+                self.assertIsNone(r.hget(PENDING_KEY, key))
+
+                # Quotas do not go below 0
+                r.hincrby(PENDING_KEY, key, 5)
+                UsageMeter.flush(r)
+                db.session.expire_all()
+                self.assertEqual(Users.query.get(key).uses_left, 0)
+            finally:
+                r.delete(FLUSH_LOCK_KEY)
+                UsageMeter.reset(key)
+                Users.query.filter_by(api_key=key).delete()
+                db.session.commit()
@@ -0,0 +1,94 @@
+from unittest import TestCase
+from api.utils.user_file_store import UserFileStore, COMPRESS_MIN_BYTES
+import gzip
+import hashlib
+import io
+import os
+import tempfile
+
+
+class UtilsUnitTest(TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.user_dir = os.path.join(self.tmp.name, "key")
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def test_save(self):
+        small = b"<svg/>"
+        large = b"<svg>" + b"<rect/>" * COMPRESS_MIN_BYTES + b"</svg>"
+
+        entry = UserFileStore.save(self.user_dir, "small.svg", io.BytesIO(small))
+        self.assertEqual(entry["stored"], "small.svg")
+        self.assertIsNone(entry["encoding"])
+        self.assertEqual(entry["sha256"], hashlib.sha256(small).hexdigest())
+
+        # Large files are stored compressed
+        entry = UserFileStore.save(self.user_dir, "large.svg", io.BytesIO(large))
+        self.assertEqual(entry["stored"], "large.svg.gz")
+        self.assertEqual(entry["encoding"], "gzip")
+        self.assertEqual(entry["size"], len(large))
+        with gzip.open(os.path.join(self.user_dir, "large.svg.gz")) as f:
+            self.assertEqual(f.read(), large)
+
+        self.assertEqual(
+            sorted(UserFileStore.load_index(self.user_dir)), ["large.svg", "small.svg"]
+        )
+        self.assertEqual(UserFileStore.get(self.user_dir, "large.svg"), entry)
+        self.assertIsNone(UserFileStore.get(self.user_dir, "missing.svg"))
+
+        # A file saved again replaces the stored file of the other encoding
+        UserFileStore.save(self.user_dir, "large.svg", io.BytesIO(small))
+        self.assertFalse(os.path.exists(os.path.join(self.user_dir, "large.svg.gz")))
+        self.assertEqual(UserFileStore.get(self.user_dir, "large.svg")["size"], 6)
+
+    def test_load_index(self):
+        self.assertIsNone(UserFileStore.load_index(self.user_dir))
+
+        # Directories from before the index are indexed on first use
+        os.makedirs(self.user_dir)
+        with open(os.path.join(self.user_dir, "old.json"), "wb") as f:
+            f.write(b"{}")
+        entry = UserFileStore.get(self.user_dir, "old.json")
+        self.assertEqual(entry["size"], 2)
+        self.assertEqual(entry["sha256"], hashlib.sha256(b"{}").hexdigest())
+        self.assertEqual(list(UserFileStore.read_index(self.user_dir)), ["old.json"])
+
+    def test_list_files(self):
+        self.assertIsNone(UserFileStore.list_files(self.user_dir))
+
+        UserFileStore.save(self.user_dir, "saved.svg", io.BytesIO(b"<svg/>"))
+        self.assertEqual(UserFileStore.list_files(self.user_dir), [["saved.svg"]])
+
+        # Files and subdirectories written outside of the store are listed
+        os.makedirs(os.path.join(self.user_dir, "run1"))
+        with open(os.path.join(self.user_dir, "run1", "out.csv"), "wb") as f:
+            f.write(b"Gene\n")
+        with open(os.path.join(self.user_dir, "written.csv"), "wb") as f:
+            f.write(b"Gene\n")
+        self.assertEqual(
+            UserFileStore.list_files(self.user_dir),
+            [["saved.svg", "written.csv"], ["out.csv"]],
+        )
+        self.assertEqual(
+            sorted(UserFileStore.read_index(self.user_dir)),
+            ["saved.svg", "written.csv"],
+        )
+
+        # Files removed outside of the store are dropped from the index
+        os.remove(os.path.join(self.user_dir, "saved.svg"))
+        self.assertEqual(
+            UserFileStore.list_files(self.user_dir), [["written.csv"], ["out.csv"]]
+        )
+        self.assertIsNone(UserFileStore.get(self.user_dir, "saved.svg"))
+
+        # Files written outside of the store can be served
+        with open(os.path.join(self.user_dir, "late.csv"), "wb") as f:
+            f.write(b"Gene\n")
+        self.assertEqual(UserFileStore.get(self.user_dir, "late.csv")["size"], 5)
+
+    def test_is_valid_name(self):
+        self.assertTrue(UserFileStore.is_valid_name("my plot.svg"))
+        for name in ["", ".index.json", "../plot.svg", "a/b.svg", "plot.svg.gz"]:
+            self.assertFalse(UserFileStore.is_valid_name(name))